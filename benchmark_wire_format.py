@@ -0,0 +1,80 @@
+"""
+📦 BENCHMARK - FORMATO DE MENSAGENS (JSON x MessagePack compacto)
+Compara bytes por mensagem e custo de encode/decode dos formatos de
+src/backend/wire.py para frames de detecção e mensagens de sensores.
+
+Uso:
+  python benchmark_wire_format.py --iterations 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from backend import wire
+
+
+def make_frame(n):
+    detections = []
+    for i in range(n):
+        x1, y1 = random.randint(0, 1200), random.randint(0, 600)
+        detections.append({
+            'id': i,
+            'bbox': [x1, y1, x1 + random.randint(40, 120), y1 + random.randint(30, 90)],
+            'centroid': [x1 + 30, y1 + 20],
+            'class': random.choice(['motorcycle', 'person']),
+            'confidence': round(random.uniform(0.4, 0.99), 3),
+        })
+    return {'timestamp': time.time(), 'camera': 'cam_patio_01', 'detections': detections}
+
+
+def make_sensor():
+    return {
+        'timestamp': time.time(),
+        'sensor_id': 'sim01',
+        'gps': {'lat': -23.55 + random.random() * 0.001, 'lon': -46.63 + random.random() * 0.001},
+        'battery': random.randint(30, 100),
+        'status': random.choice(['ok', 'idle', 'moving']),
+    }
+
+
+def measure(payload, fmt, iterations):
+    data = wire.encode(payload, fmt)
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        wire.encode(payload, fmt)
+    encode_us = (time.perf_counter() - t0) / iterations * 1e6
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        wire.decode(data)
+    decode_us = (time.perf_counter() - t0) / iterations * 1e6
+    return len(data), encode_us, decode_us
+
+
+def main(args):
+    formats = wire.available_formats()
+    if wire.MSGPACK not in formats:
+        print("⚠️ msgpack não instalado: apenas JSON será medido (pip install msgpack)")
+
+    cases = [(f'frame {n} deteccoes', make_frame(n)) for n in (0, 1, 10, 50)]
+    cases.append(('sensor', make_sensor()))
+
+    print(f"{'mensagem':<22}{'formato':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    print("-" * 64)
+    for name, payload in cases:
+        baseline = None
+        for fmt in formats:
+            size, enc, dec = measure(payload, fmt, args.iterations)
+            baseline = baseline or size
+            ratio = f"  ({size / baseline:.0%})" if fmt != wire.JSON else ''
+            print(f"{name:<22}{fmt:<10}{size:>8}{enc:>12.1f}{dec:>12.1f}{ratio}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark dos formatos de mensagem')
+    parser.add_argument('--iterations', type=int, default=20000, help='repetições por medida')
+    main(parser.parse_args())
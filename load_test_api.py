@@ -0,0 +1,91 @@
+"""
+🔧 TESTE DE CARGA - BACKEND DE DETECÇÕES
+Dispara POST /detections/ concorrentes contra o backend FastAPI e reporta
+requisições por segundo e latências (p50/p95/p99).
+
+Uso:
+  uvicorn src.backend.api:app --port 8000
+  python load_test_api.py --url http://localhost:8000 --requests 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+
+
+def make_frame(n_detections, camera):
+    detections = []
+    for i in range(n_detections):
+        x1, y1 = random.randint(0, 600), random.randint(0, 400)
+        detections.append({
+            'id': i,
+            'bbox': [x1, y1, x1 + 60, y1 + 40],
+            'centroid': [x1 + 30, y1 + 20],
+            'class': 'motorcycle',
+            'confidence': round(random.uniform(0.4, 0.99), 3),
+        })
+    return {'timestamp': time.time(), 'camera': camera, 'detections': detections}
+
+
+async def worker(session, url, queue, latencies, errors, args):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        frame = make_frame(args.detections, args.camera)
+        t0 = time.perf_counter()
+        try:
+            async with session.post(url, json=frame) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors.append(resp.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+async def run(args):
+    url = args.url.rstrip('/') + '/detections/'
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(session, url, queue, latencies, errors, args)
+                               for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    print("📊 Resultado do teste de carga")
+    print("=" * 50)
+    print(f"Requisições OK:   {len(latencies)}  (erros: {len(errors)})")
+    print(f"Duração:          {elapsed:.2f}s")
+    print(f"Throughput:       {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        ms = [l * 1000 for l in latencies]
+        print(f"Latência média:   {statistics.mean(ms):.1f} ms")
+        print(f"p50 / p95 / p99:  {percentile(ms, 50):.1f} / {percentile(ms, 95):.1f} / {percentile(ms, 99):.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Teste de carga do backend de detecções')
+    parser.add_argument('--url', default='http://localhost:8000', help='URL base do backend')
+    parser.add_argument('--requests', type=int, default=5000, help='total de requisições')
+    parser.add_argument('--concurrency', type=int, default=64, help='requisições simultâneas')
+    parser.add_argument('--detections', type=int, default=5, help='detecções por frame')
+    parser.add_argument('--camera', default='loadtest', help='identificador da câmera')
+    asyncio.run(run(parser.parse_args()))
@@ -1,66 +1,397 @@
 import json
-import time
+import os
+import sys
 import threading
-from typing import List
+import time
+from typing import Optional
 
-from fastapi import FastAPI
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, Float, JSON as SA_JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 import paho.mqtt.client as mqtt
 
-DATABASE_URL = 'sqlite:///./detections.db'
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-Base = declarative_base()
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import metrics, wire
+from backend.live import LiveHub
+from backend.models import parse_frame
+from backend.shards import ShardSet
+from backend.storage import DEFAULT_BRANCH, query_telemetry
+from backend.telemetry import TelemetryIngest
+from backend.tsdb import AGGREGATES, TelemetryTSDB
+from backend.yard import YardState
+
+# Set to 0 when detection topics are consumed by separate ingest workers (ingest_worker.py);
+# the API then subscribes to sensor telemetry only
+MQTT_IN_API = os.environ.get('MOTTU_API_MQTT', '1') != '0'
+
+live = LiveHub()
+yard = YardState()
+
+registry = metrics.Registry()
+batch_size = registry.histogram('mottu_write_batch_size', 'Messages per committed write batch.',
+                                ('kind', 'branch'), metrics.BATCH_SIZE_BUCKETS)
+commit_seconds = registry.histogram('mottu_commit_duration_seconds', 'Time to persist one write batch.',
+                                    ('kind', 'branch'))
+e2e_seconds = registry.histogram('mottu_ingest_latency_seconds',
+                                 'Frame timestamp to commit of its detections (end-to-end ingest lag).',
+                                 ('branch',), metrics.E2E_BUCKETS)
+http_seconds = registry.histogram('mottu_http_request_duration_seconds', 'HTTP handler latency.',
+                                  ('method', 'route', 'status'))
 
-class Detection(Base):
-    __tablename__ = 'detections'
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(Float, index=True)
-    payload = Column(SA_JSON)  # SQLAlchemy will handle JSON for SQLite as text
+def on_commit(branch, payloads, acks, rollups):
+    now = time.time()
+    e2e_seconds.observe_many([now - p['timestamp'] for p, (_, created) in zip(payloads, acks)
+                              if created and isinstance(p.get('timestamp'), (int, float))], branch=branch)
+    yard.apply_batch(payloads, acks)
+    live.publish_batch(payloads, acks, rollups, branch)
 
-Base.metadata.create_all(bind=engine)
+def on_flush(branch, size, seconds, kind='detections'):
+    batch_size.observe(size, kind=kind, branch=branch)
+    commit_seconds.observe(seconds, kind=kind, branch=branch)
+
+# One store + group-commit writer per branch, shared by the HTTP endpoints and the MQTT bridge
+shards = ShardSet(on_commit, on_flush=on_flush)
+# Sensor readings go to the default branch database through their own writer
+telemetry = TelemetryIngest(tsdb=TelemetryTSDB())
+telemetry.writer.on_flush = lambda size, seconds: on_flush(DEFAULT_BRANCH, size, seconds, kind='telemetry')
+
+def _writer_stat(field, dedup=False):
+    """Scrape-time samples of one BatchWriter stat for every shard and the telemetry writer."""
+    def collect():
+        for branch, shard in list(shards.shards.items()):
+            value = shard.writer.stats()[field]
+            if dedup:
+                value += shard.recent.hits
+            yield {'kind': 'detections', 'branch': branch}, value
+        yield {'kind': 'telemetry', 'branch': DEFAULT_BRANCH}, telemetry.writer.stats()[field]
+    return collect
+
+registry.callback('mottu_messages_received_total', 'Messages that reached a writer, duplicates included.',
+                  _writer_stat('received', dedup=True), 'counter', ('kind', 'branch'))
+registry.callback('mottu_messages_persisted_total', 'Messages committed to storage.',
+                  _writer_stat('persisted'), 'counter', ('kind', 'branch'))
+registry.callback('mottu_messages_dropped_total', 'Messages dropped because the writer queue was full.',
+                  _writer_stat('dropped'), 'counter', ('kind', 'branch'))
+registry.callback('mottu_write_errors_total', 'Messages in batches that failed to persist.',
+                  _writer_stat('errors'), 'counter', ('kind', 'branch'))
+registry.callback('mottu_duplicates_total', 'Replayed frames answered from the recent-key cache.',
+                  lambda: (({'branch': b}, s.recent.hits) for b, s in list(shards.shards.items())),
+                  'counter', ('branch',))
+registry.callback('mottu_queue_depth', 'Messages waiting in the writer queue.',
+                  _writer_stat('queue_depth'), 'gauge', ('kind', 'branch'))
 
 app = FastAPI(title="Mottu - Detections API")
 
-class DetectionIn(BaseModel):
-    timestamp: float
-    detections: List[dict]
+@app.middleware('http')
+async def time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series bounded
+        route = request.scope.get('route')
+        http_seconds.observe(time.perf_counter() - t0, method=request.method,
+                             route=getattr(route, 'path', 'unmatched'), status=status)
+
+# Frames per insert transaction when consuming an NDJSON upload
+STREAM_CHUNK = 500
+
+def _shard(branch):
+    try:
+        shard = shards.get(branch, create=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if shard is None:
+        raise HTTPException(status_code=404, detail=f'unknown branch {branch!r}')
+    return shard
+
+async def decoded_body(request: Request):
+    """Request body as Python objects, decoded per Content-Type (JSON or MessagePack)."""
+    try:
+        return wire.decode(await request.body(), content_type=request.headers.get('content-type'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'could not decode body: {e}')
 
 @app.post('/detections/')
-def receive_detection(d: DetectionIn):
-    db = SessionLocal()
-    row = Detection(timestamp=d.timestamp, payload=d.dict())
-    db.add(row)
-    db.commit()
-    db.close()
-    return {'status': 'ok'}
+async def receive_detection(raw=Depends(decoded_body)):
+    try:
+        payload = parse_frame(raw)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    frame_id, created = await shards.get(payload['branch']).write(payload)
+    return {'status': 'ok', 'id': frame_id, 'duplicate': not created}
+
+async def _ingest_items(items):
+    """Persist validated ``(index, payload)`` pairs and build one ack per item."""
+    results = await shards.write_many([payload for _, payload in items])
+    return [
+        {'index': index, 'status': 'created' if created else 'duplicate', 'id': frame_id,
+         'idempotency_key': payload.get('idempotency_key')}
+        for (index, payload), (frame_id, created) in zip(items, results)
+    ]
+
+def _validate_item(index, raw):
+    """Returns ``(payload, None)`` or ``(None, error_ack)`` for one uploaded item."""
+    try:
+        return parse_frame(raw), None
+    except (TypeError, ValueError) as e:
+        key = raw.get('idempotency_key') if isinstance(raw, dict) else None
+        return None, {'index': index, 'status': 'error', 'idempotency_key': key, 'error': str(e)}
+
+def _summary(acks):
+    acks.sort(key=lambda a: a['index'])
+    counts = {'created': 0, 'duplicate': 0, 'error': 0}
+    for a in acks:
+        counts[a['status']] += 1
+    return {'status': 'ok', **counts, 'items': acks}
+
+@app.post('/detections/batch')
+async def receive_detection_batch(items=Depends(decoded_body)):
+    """Ingest an array of frames (JSON or MessagePack), acknowledging each item."""
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail='expected an array of frames')
+    acks, valid = [], []
+    for index, raw in enumerate(items):
+        payload, error = _validate_item(index, raw)
+        if error:
+            acks.append(error)
+        else:
+            valid.append((index, payload))
+    if valid:
+        acks.extend(await _ingest_items(valid))
+    return _summary(acks)
+
+@app.post('/detections/stream')
+async def receive_detection_stream(request: Request):
+    """Ingest an NDJSON body (one frame per line), inserting in chunks as it arrives."""
+    acks, pending = [], []
+    buffer = b''
+    index = 0
+
+    def take_line(line):
+        nonlocal index
+        line = line.strip()
+        if not line:
+            return
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            acks.append({'index': index, 'status': 'error', 'idempotency_key': None, 'error': str(e)})
+        else:
+            payload, error = _validate_item(index, raw)
+            if error:
+                acks.append(error)
+            else:
+                pending.append((index, payload))
+        index += 1
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            take_line(line)
+        if len(pending) >= STREAM_CHUNK:
+            acks.extend(await _ingest_items(pending))
+            pending = []
+    take_line(buffer)
+    if pending:
+        acks.extend(await _ingest_items(pending))
+    return _summary(acks)
+
+@app.get('/detections/')
+async def list_detections(branch: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                          camera: Optional[str] = None, zone: Optional[str] = None,
+                          track_id: Optional[str] = None, cursor: Optional[str] = None,
+                          limit: int = Query(500, ge=1, le=5000), fields: Optional[str] = None,
+                          order: str = Query('asc', pattern='^(asc|desc)$')):
+    """Detections in a time range, paged with an opaque ``cursor`` (keyset pagination).
+
+    ``fields`` is a comma-separated projection; pass the returned ``next_cursor``
+    back to get the following page until it comes back null. Without ``branch``
+    the query fans out to every branch and each row carries its ``branch``.
+    """
+    filters = dict(start=start, end=end, camera=camera, zone=zone, track_id=track_id, cursor=cursor,
+                   limit=limit, fields=fields.split(',') if fields else None, descending=order == 'desc')
+    try:
+        if branch is None:
+            rows, next_cursor = await shards.query_detections(**filters)
+        else:
+            rows, next_cursor = await _shard(branch).store.query_detections(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'items': rows, 'next_cursor': next_cursor}
+
+@app.get('/rollups')
+async def list_rollups(granularity: str = Query('minute', pattern='^(minute|hour)$'),
+                       branch: Optional[str] = None,
+                       start: Optional[float] = None, end: Optional[float] = None,
+                       camera: Optional[str] = None, zone: Optional[str] = None):
+    """Precomputed per-minute/per-hour counts by camera and zone (all branches unless ``branch``)."""
+    filters = dict(granularity=granularity, start=start, end=end, camera=camera, zone=zone)
+    if branch is None:
+        rows = await shards.query_rollups(**filters)
+    else:
+        rows = await _shard(branch).store.query_rollups(**filters)
+    return {'items': rows}
+
+@app.get('/heatmap')
+async def occupancy_heatmap(window: int = Query(3600, ge=60, le=7 * 86400),
+                            branch: str = DEFAULT_BRANCH, camera: Optional[str] = None,
+                            bins: int = Query(64, ge=1, le=256),
+                            width: int = Query(1280, ge=1), height: int = Query(720, ge=1)):
+    """Detection centroid counts on a ``bins`` x ``bins`` grid over the last ``window`` seconds."""
+    _require_local_ingest()
+    return await _shard(branch).heatmaps.get(time.time(), window, camera, bins, width, height)
+
+def _require_local_ingest():
+    """The heatmap, yard and live caches only see frames committed by this process.
+
+    With ingest workers (MOTTU_API_MQTT=0) most frames bypass them, so those
+    endpoints are disabled rather than serving stale data.
+    """
+    if not MQTT_IN_API:
+        raise HTTPException(status_code=503, detail='not available while MQTT is ingested by '
+                                                    'separate workers (MOTTU_API_MQTT=0)')
+
+# Seconds between SSE keep-alive comments when no event arrives
+SSE_KEEPALIVE = 15
+
+def _split(value):
+    return [v for v in value.split(',') if v] if value else None
+
+@app.get('/live')
+async def live_sse(request: Request, camera: Optional[str] = None, zone: Optional[str] = None,
+                   branch: Optional[str] = None):
+    """Server-Sent Events feed of new frames and rollup deltas (comma-separated filters)."""
+    _require_local_ingest()
+    sub = live.subscribe(_split(camera), _split(zone), _split(branch))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=SSE_KEEPALIVE)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            live.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+@app.websocket('/ws/live')
+async def live_ws(websocket: WebSocket, camera: Optional[str] = None, zone: Optional[str] = None,
+                  branch: Optional[str] = None):
+    """WebSocket variant of ``/live``: one JSON message per event."""
+    if not MQTT_IN_API:
+        # Same reason as _require_local_ingest; 1013 = try again later
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    sub = live.subscribe(_split(camera), _split(zone), _split(branch))
+    try:
+        while True:
+            event = await sub.get(timeout=SSE_KEEPALIVE)
+            await websocket.send_json(event or {'type': 'keepalive'})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live.unsubscribe(sub)
 
 @app.get('/health')
-def health():
+async def health():
     return {'status': 'running'}
 
-# MQTT bridge: subscribe to topic and persist messages into DB
+@app.get('/yard/{branch}/state')
+async def yard_state(branch: str):
+    """Current tracks per camera, zone occupancy and last-seen times, served from memory."""
+    _require_local_ingest()
+    state = yard.state(branch)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f'no data for branch {branch!r}')
+    return state
+
+@app.get('/telemetry/latest')
+async def telemetry_latest():
+    """Most recent reading of every sensor, from memory."""
+    return {'items': telemetry.latest()}
+
+@app.get('/telemetry/{sensor_id}/latest')
+async def telemetry_sensor_latest(sensor_id: str):
+    reading = telemetry.latest(sensor_id)
+    if reading is None:
+        raise HTTPException(status_code=404, detail=f'no readings for sensor {sensor_id!r}')
+    return reading
+
+@app.get('/telemetry/{sensor_id}/series')
+async def telemetry_series(sensor_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                           metrics: Optional[str] = None, step: Optional[float] = Query(None, gt=0),
+                           agg: str = Query('mean', pattern='^(' + '|'.join(AGGREGATES) + ')$')):
+    """Columnar readings of one sensor (``ts`` plus one array per metric), optionally downsampled."""
+    return telemetry.tsdb.query(sensor_id, start, end, _split(metrics), step, agg)
+
+@app.get('/telemetry/{sensor_id}')
+async def telemetry_history(sensor_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                            limit: int = Query(1000, ge=1, le=100000)):
+    """Readings of one sensor in a time range, oldest first."""
+    rows = await telemetry.store.read(query_telemetry, sensor_id, start, end, limit)
+    return {'items': rows}
+
+@app.get('/ingest/stats')
+async def ingest_stats():
+    return {**shards.stats(), 'live': live.stats(), 'yard': yard.stats(), 'telemetry': telemetry.stats()}
+
+@app.get('/metrics')
+async def prometheus_metrics():
+    """Prometheus text exposition of ingest and HTTP metrics."""
+    return Response(registry.render(), media_type=metrics.CONTENT_TYPE)
+
+# MQTT bridge: subscribe to topics and persist messages into the branch shards
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
+# Legacy single topic, stored in the default branch
 MQTT_TOPIC = "mottu/detections"
+# mottu/{branch}/{camera}/detections
+MQTT_BRANCH_TOPIC = wire.detections_topic('+', '+')
+MQTT_SENSORS_TOPIC = "mottu/sensors"
 
 def on_connect(client, userdata, flags, rc):
-    print("Connected to MQTT broker, subscribing to topic:", MQTT_TOPIC)
-    client.subscribe(MQTT_TOPIC)
+    # Telemetry always stays here: its latest-value cache and TSDB live in this process
+    topics = (MQTT_TOPIC, MQTT_BRANCH_TOPIC, MQTT_SENSORS_TOPIC) if MQTT_IN_API else (MQTT_SENSORS_TOPIC,)
+    print("Connected to MQTT broker, subscribing to topics:", *topics)
+    # Publishers using the compact wire format append wire.TOPIC_SUFFIX
+    client.subscribe([(topic + suffix, 0) for topic in topics for suffix in ('', wire.TOPIC_SUFFIX)])
 
 def on_message(client, userdata, msg):
     try:
-        payload = json.loads(msg.payload.decode())
-        db = SessionLocal()
-        row = Detection(timestamp=payload.get('timestamp', time.time()), payload=payload)
-        db.add(row)
-        db.commit()
-        db.close()
+        payload = wire.decode(msg.payload, topic=msg.topic)
     except Exception as e:
-        print("Error persisting MQTT message:", e)
+        print("Error decoding MQTT message:", e)
+        return
+    if msg.topic in (MQTT_SENSORS_TOPIC, MQTT_SENSORS_TOPIC + wire.TOPIC_SUFFIX):
+        # Publishers may also send a list of readings in one message
+        for reading in payload if isinstance(payload, list) else [payload]:
+            telemetry.submit_threadsafe(reading)
+        return
+    if not isinstance(payload, dict):
+        print("Ignoring MQTT message that is not a frame object on", msg.topic)
+        return
+    route = wire.parse_detections_topic(msg.topic)
+    if route is not None:
+        payload['branch'] = route[0]
+        payload.setdefault('camera', route[1])
+    # Same checks as the HTTP routes: one malformed frame must not reach (and sink) a write batch
+    try:
+        payload = parse_frame(payload)
+    except (ValueError, TypeError) as e:
+        print("Dropping invalid MQTT frame on", msg.topic + ":", e)
+        return
+    # paho runs this on its network thread; the writers live on the event loop
+    shards.submit_threadsafe(payload)
 
 mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_connect
@@ -70,5 +401,17 @@ def start_mqtt_loop():
     mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
     mqtt_client.loop_forever()
 
-# Start MQTT listener in background thread (daemon so process can exit)
-threading.Thread(target=start_mqtt_loop, daemon=True).start()
+@app.on_event('startup')
+async def start_ingest():
+    yard.load()
+    yard.start()
+    shards.start()
+    telemetry.start(shards.get(DEFAULT_BRANCH).store)
+    # Start MQTT listener in background thread (daemon so process can exit)
+    threading.Thread(target=start_mqtt_loop, daemon=True).start()
+
+@app.on_event('shutdown')
+async def flush_writer():
+    await telemetry.stop()
+    await shards.stop()
+    await yard.stop()
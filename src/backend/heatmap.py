@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.storage import DEFAULT_CAMERA, centroids_since, detection_to_row
+
+# Image-space extent the centroids are binned over, in pixels
+DEFAULT_WIDTH = 1280
+DEFAULT_HEIGHT = 720
+MAX_BINS = 256
+# A window is split into at most this many time buckets, each at least MIN_BUCKET_S long
+MAX_BUCKETS = 60
+MIN_BUCKET_S = 60
+
+
+def histogram(timestamps, cx, cy, bucket_s, bins, width, height, start, end):
+    """Per-time-bucket 2D occupancy counts in one vectorized pass.
+
+    Only timestamps in ``[start, end]`` are counted, and the time axis spans
+    that range rather than the batch, so a stray old or future timestamp can't
+    blow up the histogram. Returns ``{bucket_start: counts}`` with
+    ``counts[row, col]`` indexed as (y bin, x bin), i.e. ready to draw as an
+    image of the frame.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    inside = (timestamps >= start) & (timestamps <= end)
+    if not inside.any():
+        return {}
+    buckets = (timestamps[inside] // bucket_s).astype(np.int64)
+    first, last = int(start // bucket_s), int(end // bucket_s)
+    counts, _ = np.histogramdd(
+        (buckets, np.asarray(cy, dtype=np.float64)[inside], np.asarray(cx, dtype=np.float64)[inside]),
+        bins=(last - first + 1, bins, bins),
+        range=((first - 0.5, last + 0.5), (0, height), (0, width)))
+    counts = counts.astype(np.int32)
+    return {int(b) * bucket_s: counts[b - first] for b in range(first, last + 1) if counts[b - first].any()}
+
+
+class _Entry:
+    def __init__(self, camera, window, bins, width, height):
+        self.camera = camera
+        self.window = window
+        self.bins = bins
+        self.width = width
+        self.height = height
+        self.bucket_s = max(MIN_BUCKET_S, math.ceil(window / MAX_BUCKETS))
+        self.buckets = {}
+        self.loading = True
+        self.ready = asyncio.Event()
+        self.pending = []
+        self.watermark = None
+
+    def add(self, timestamps, cx, cy, now):
+        # Frames from a camera clock running ahead land in future buckets, which get()
+        # skips until they start; only frames more than a window ahead are dropped
+        hists = histogram(timestamps, cx, cy, self.bucket_s, self.bins, self.width, self.height,
+                          self.first_bucket(now), now + self.window)
+        for bucket, counts in hists.items():
+            current = self.buckets.get(bucket)
+            if current is None:
+                self.buckets[bucket] = counts
+            else:
+                current += counts
+
+    def first_bucket(self, now):
+        return int((now - self.window) // self.bucket_s) * self.bucket_s
+
+
+class HeatmapCache:
+    """Occupancy heatmaps over trailing windows, kept current as detections arrive.
+
+    An entry per (camera, window, bins, extent) holds one histogram per time
+    bucket of the window. The first request loads the window's centroids from
+    storage; after that ``apply_batch`` (called by the ingest writer after each
+    commit) adds the new detections to the matching buckets, and buckets that
+    slide out of the window are dropped, so a request only sums at most
+    MAX_BUCKETS small arrays. The window start is rounded down to a bucket.
+    """
+
+    def __init__(self, store, max_entries=32):
+        self.store = store
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    async def get(self, now, window, camera=None, bins=64, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+        bins = max(1, min(bins, MAX_BINS))
+        key = (camera, window, bins, width, height)
+        entry = self.entries.get(key)
+        if entry is None:
+            self._stats['misses'] += 1
+            entry = await self._load(key, now)
+        else:
+            self._stats['hits'] += 1
+            self.entries.move_to_end(key)
+            if entry.loading:
+                await entry.ready.wait()
+                if entry.loading:  # the load failed; try again
+                    return await self.get(now, window, camera, bins, width, height)
+        start = entry.first_bucket(now)
+        for bucket in [b for b in entry.buckets if b < start]:
+            del entry.buckets[bucket]
+        counts = np.zeros((bins, bins), dtype=np.int64)
+        for bucket, hist in entry.buckets.items():
+            if bucket <= now:
+                counts += hist
+        return {
+            'camera': camera,
+            'start': start,
+            'end': now,
+            'bins': bins,
+            'width': width,
+            'height': height,
+            'total': int(counts.sum()),
+            'max': int(counts.max()),
+            'counts': counts.tolist(),
+        }
+
+    async def _load(self, key, now):
+        # Registered before the read so batches committed meanwhile are queued, not lost
+        entry = self.entries[key] = _Entry(*key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self._stats['evictions'] += 1
+        try:
+            rows, entry.watermark = await self.store.read(centroids_since, entry.first_bucket(now), entry.camera)
+        except Exception:
+            self.entries.pop(key, None)
+            entry.ready.set()
+            raise
+        if rows:
+            ts, cx, cy = np.asarray(rows, dtype=np.float64).T
+            entry.add(ts, cx, cy, now)
+        now = time.time()
+        for frame_ids, ts, cx, cy in entry.pending:
+            newer = frame_ids > entry.watermark
+            entry.add(ts[newer], cx[newer], cy[newer], now)
+        entry.pending = None
+        entry.loading = False
+        entry.ready.set()
+        return entry
+
+    def apply_batch(self, payloads, acks):
+        if not self.entries:
+            return
+        by_camera = {}
+        for payload, (frame_id, created) in zip(payloads, acks):
+            if not created:
+                continue
+            camera = payload.get('camera') or DEFAULT_CAMERA
+            timestamp = payload.get('timestamp', time.time())
+            for det in payload.get('detections') or []:
+                row = detection_to_row(det, frame_id, camera, timestamp)
+                if row['cx'] is not None:
+                    by_camera.setdefault(camera, []).append((frame_id, timestamp, row['cx'], row['cy']))
+        if not by_camera:
+            return
+        now = time.time()
+        arrays = {c: np.asarray(rows, dtype=np.float64).T for c, rows in by_camera.items()}
+        every = np.concatenate(list(arrays.values()), axis=1)
+        for entry in self.entries.values():
+            data = every if entry.camera is None else arrays.get(entry.camera)
+            if data is None:
+                continue
+            if entry.loading:
+                entry.pending.append(data)
+            else:
+                entry.add(data[1], data[2], data[3], now)
+
+    def stats(self) -> dict:
+        return dict(self._stats, entries=len(self.entries))
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class BatchWriter:
+    """Group-commit writer: drains queued payloads and persists them in batches.
+
+    Runs as a single task on the backend's event loop. Producers either await
+    the outcome of their own payload (HTTP handlers, through ``write``) or
+    fire and forget (the paho callback thread, through ``submit_threadsafe``).
+    The writer takes everything already queued, lingers at most ``max_delay``
+    seconds for more up to ``max_batch`` items, then hands the whole batch to
+    the async ``write_batch`` callable which persists it in one transaction.
+    If a batch fails, its payloads are retried one at a time, so a single bad
+    payload only fails itself.
+    ``on_flush(batch_size, seconds)``, if set, is told about every committed batch.
+    """
+
+    def __init__(self, write_batch, max_batch=500, max_delay=0.005, max_queue=50000, on_flush=None):
+        self.write_batch = write_batch
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.loop = None
+        self.queue = None
+        self._task = None
+        self._stats = {
+            'received': 0,
+            'persisted': 0,
+            'dropped': 0,
+            'errors': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_commit_ms': 0.0,
+            'max_commit_ms': 0.0,
+            'total_commit_ms': 0.0,
+        }
+
+    def start(self):
+        """Start the writer task; must be called from the running event loop."""
+        if self._task is None or self._task.done():
+            self.loop = asyncio.get_running_loop()
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = self.loop.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, payload) -> bool:
+        """Enqueue a payload without waiting for it; returns False if the queue is full."""
+        try:
+            self.queue.put_nowait((payload, None))
+        except asyncio.QueueFull:
+            self._stats['dropped'] += 1
+            return False
+        self._stats['received'] += 1
+        return True
+
+    def submit_threadsafe(self, payload):
+        """Hand a payload over from another thread (e.g. the paho network loop)."""
+        self.loop.call_soon_threadsafe(self.submit, payload)
+
+    async def write(self, payload):
+        """Enqueue a payload and wait until its batch is committed.
+
+        Waits for room when the queue is full, so HTTP clients get backpressure
+        instead of dropped data. Returns whatever ``write_batch`` produced for it.
+        """
+        future = self.loop.create_future()
+        await self.queue.put((payload, future))
+        self._stats['received'] += 1
+        return await future
+
+    async def write_many(self, payloads):
+        futures = []
+        for payload in payloads:
+            future = self.loop.create_future()
+            await self.queue.put((payload, future))
+            futures.append(future)
+        self._stats['received'] += len(payloads)
+        return await asyncio.gather(*futures)
+
+    async def _collect(self):
+        first = await self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = self.loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, 0.001))
+                continue
+            if item is None:
+                # Stop requested: flush this batch, then exit on the next pass
+                self.queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch is None:
+                break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        payloads = [payload for payload, _ in batch]
+        t0 = time.perf_counter()
+        try:
+            results = await self.write_batch(payloads)
+        except Exception as e:
+            if len(batch) > 1:
+                print("Error persisting batch of", len(batch), "messages, retrying one at a time:", e)
+                for item in batch:
+                    await self._flush([item])
+                return
+            print("Error persisting message:", e)
+            self._stats['errors'] += 1
+            _, future = batch[0]
+            if future is not None and not future.done():
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - t0
+        elapsed_ms = elapsed * 1000.0
+        for (_, future), result in zip(batch, results):
+            if future is not None and not future.done():
+                future.set_result(result)
+        s = self._stats
+        s['persisted'] += len(batch)
+        s['batches'] += 1
+        s['last_batch_size'] = len(batch)
+        s['max_batch_size'] = max(s['max_batch_size'], len(batch))
+        s['last_commit_ms'] = elapsed_ms
+        s['max_commit_ms'] = max(s['max_commit_ms'], elapsed_ms)
+        s['total_commit_ms'] += elapsed_ms
+        if self.on_flush is not None:
+            self.on_flush(len(batch), elapsed)
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        batches = s.pop('batches')
+        total_ms = s.pop('total_commit_ms')
+        s['queue_depth'] = self.queue.qsize() if self.queue is not None else 0
+        s['batches'] = batches
+        s['avg_batch_size'] = s['persisted'] / batches if batches else 0.0
+        s['avg_commit_ms'] = total_ms / batches if batches else 0.0
+        return s
+
+
+class RecentKeys:
+    """Bounded LRU of recently ingested message keys, checked before the write path.
+
+    Maps each key to its frame id once committed (None while still in
+    flight), so a replay is answered without a database round trip. Keys that
+    fell out of the LRU are still caught by the store's ``frame_keys`` table.
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+        self.hits = 0
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def hit(self, key):
+        self.hits += 1
+        self.keys.move_to_end(key)
+
+    def add(self, key, frame_id=None):
+        self.keys[key] = frame_id
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.capacity:
+            self.keys.popitem(last=False)
+
+    def discard(self, key):
+        self.keys.pop(key, None)
+
+    def stats(self) -> dict:
+        return {'size': len(self.keys), 'capacity': self.capacity, 'hits': self.hits}
@@ -0,0 +1,208 @@
+"""Standalone MQTT ingest workers.
+
+Runs the MQTT -> shard pipeline in separate processes so ingest scales past
+one core and no longer competes with the HTTP handlers. Start the API with
+``MOTTU_API_MQTT=0`` so it leaves MQTT to the workers.
+
+Two ways to spread messages over ``--workers`` processes:
+
+* ``hash`` (default): every worker subscribes to all detection topics and
+  keeps only the branches whose CRC32 maps to its index. A branch (and so
+  every camera in it) is always handled by the same process, which keeps
+  per-camera order and gives each branch shard a single writing process.
+  Per-branch topics are claimed from the topic; a legacy-topic frame only
+  after decoding, since its branch comes from the payload.
+* ``shared``: workers join the ``$share/<group>/...`` subscriptions and the
+  broker hands each message to one of them. No duplicate delivery, but two
+  frames of the same camera may be persisted by different workers, so
+  ordering across workers is not guaranteed.
+
+Each worker prints messages per second and ingest lag (commit time minus
+the frame's own timestamp) every ``--report-interval`` seconds. Workers only
+persist; retention stays with the API process, which picks up shards the
+workers create when it next queries them. The API's in-memory yard state,
+heatmaps and live feed would only see what is ingested through the API, so
+with ``MOTTU_API_MQTT=0`` those endpoints answer 503. Sensor telemetry
+(``mottu/sensors``) is not handled here: the API keeps subscribing to it in
+either mode, since its latest-value cache and TSDB live in that process.
+
+Usage:
+  python src/backend/ingest_worker.py --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zlib
+
+import paho.mqtt.client as mqtt
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import wire
+from backend.models import parse_frame
+from backend.shards import ShardSet
+from backend.storage import DEFAULT_BRANCH
+
+LEGACY_TOPIC = 'mottu/detections'
+BRANCH_TOPIC = wire.detections_topic('+', '+')
+SHARE_GROUP = 'mottu-ingest'
+
+
+def worker_for(branch, workers):
+    """Index of the worker that owns ``branch``; stable across processes and restarts."""
+    return zlib.crc32((branch or DEFAULT_BRANCH).encode()) % workers
+
+
+def route(topic, payload):
+    """Stamp the branch/camera from a per-branch topic onto the payload; returns its branch."""
+    parsed = wire.parse_detections_topic(topic)
+    if parsed is not None:
+        payload['branch'] = parsed[0]
+        payload.setdefault('camera', parsed[1])
+    return payload.get('branch') or DEFAULT_BRANCH
+
+
+class WorkerStats:
+    """Per-interval throughput and lag of one worker; reset at every report."""
+
+    def __init__(self):
+        self.totals = {'received': 0, 'skipped': 0, 'errors': 0, 'persisted': 0}
+        self._reset()
+
+    def _reset(self):
+        self.window_start = time.time()
+        self.received = 0
+        self.persisted = 0
+        self.lags = []
+
+    def on_commit(self, branch, payloads, acks, rollups):
+        now = time.time()
+        self.persisted += len(acks)
+        self.totals['persisted'] += len(acks)
+        self.lags.extend(now - p['timestamp'] for p in payloads if isinstance(p.get('timestamp'), (int, float)))
+
+    def accept(self, shards, payload):
+        self.received += 1
+        self.totals['received'] += 1
+        shards.submit(payload)
+
+    def report(self, shards) -> dict:
+        elapsed = max(time.time() - self.window_start, 1e-9)
+        lags = sorted(self.lags)
+        queued = sum(s.writer.stats()['queue_depth'] for s in shards.shards.values())
+        out = {
+            'msgs_per_s': round(self.received / elapsed, 1),
+            'persisted_per_s': round(self.persisted / elapsed, 1),
+            'lag_ms_p50': _percentile_ms(lags, 0.5),
+            'lag_ms_p99': _percentile_ms(lags, 0.99),
+            'lag_ms_max': _percentile_ms(lags, 1.0),
+            'queue_depth': queued,
+            'branches': sorted(shards.shards),
+            **self.totals,
+        }
+        self._reset()
+        return out
+
+
+def _percentile_ms(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000.0, 1)
+
+
+async def run_worker(index, args):
+    stats = WorkerStats()
+    shards = ShardSet(stats.on_commit, retention=False)
+    if args.mode == 'hash':
+        shards.start(owned=lambda branch: worker_for(branch, args.workers) == index)
+    else:
+        shards.start()
+    loop = asyncio.get_running_loop()
+    tag = f'[worker {index + 1}/{args.workers}]'
+
+    def on_connect(client, userdata, flags, rc):
+        topics = [t + suffix for t in (LEGACY_TOPIC, BRANCH_TOPIC) for suffix in ('', wire.TOPIC_SUFFIX)]
+        if args.mode == 'shared':
+            topics = [f'$share/{args.group}/{t}' for t in topics]
+        client.subscribe([(t, args.qos) for t in topics])
+        print(tag, 'subscribed to', ', '.join(topics))
+
+    def on_message(client, userdata, msg):
+        parsed = wire.parse_detections_topic(msg.topic)
+        # A per-branch topic names the branch, so ownership is decided before paying for decoding
+        if args.mode == 'hash' and parsed is not None and worker_for(parsed[0], args.workers) != index:
+            stats.totals['skipped'] += 1
+            return
+        try:
+            payload = wire.decode(msg.payload, topic=msg.topic)
+            if not isinstance(payload, dict):
+                raise TypeError('not a frame object')
+            route(msg.topic, payload)
+            # Same checks as the API: a malformed frame must not reach (and sink) a write batch
+            payload = parse_frame(payload)
+        except Exception as e:
+            print(tag, 'error decoding message on', msg.topic, ':', e)
+            stats.totals['errors'] += 1
+            return
+        # On the legacy topic the branch comes from the payload; only its owner may write that shard
+        if args.mode == 'hash' and parsed is None and worker_for(payload['branch'], args.workers) != index:
+            stats.totals['skipped'] += 1
+            return
+        # paho delivers in order on this one thread and the hand-off is FIFO, so per-camera order holds
+        loop.call_soon_threadsafe(stats.accept, shards, payload)
+
+    client = mqtt.Client(client_id=f'mottu-ingest-{os.getpid()}')
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.mqtt_host, args.mqtt_port, 60)
+    threading.Thread(target=client.loop_forever, daemon=True).start()
+
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print(tag, json.dumps(stats.report(shards)), flush=True)
+    finally:
+        client.disconnect()
+        await shards.stop()
+
+
+def worker_main(index, args):
+    try:
+        asyncio.run(run_worker(index, args))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(args):
+    if args.workers == 1:
+        worker_main(0, args)
+        return
+    processes = [multiprocessing.Process(target=worker_main, args=(i, args), name=f'ingest-{i}')
+                 for i in range(args.workers)]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MQTT ingest workers for the Mottu detections backend')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--mode', choices=['hash', 'shared'], default='hash',
+                        help='hash: branch-affine workers (ordered); shared: broker load balancing')
+    parser.add_argument('--group', default=SHARE_GROUP, help='shared subscription group name')
+    parser.add_argument('--mqtt_host', default='localhost', help='MQTT broker host')
+    parser.add_argument('--mqtt_port', type=int, default=1883, help='MQTT broker port')
+    parser.add_argument('--qos', type=int, default=0, choices=[0, 1, 2], help='subscription QoS')
+    parser.add_argument('--report-interval', type=float, default=5.0, help='seconds between stats lines')
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+import asyncio
+
+from backend.storage import DEFAULT_BRANCH, DEFAULT_CAMERA
+
+
+class Subscription:
+    """One live-feed client: optional branch/camera/zone filters and a bounded buffer.
+
+    When the client falls behind, the oldest buffered events are discarded so
+    that publishing never waits on a slow consumer; the client is told how
+    many events it missed with an ``overflow`` event.
+    """
+
+    def __init__(self, cameras=None, zones=None, buffer_size=256, branches=None):
+        self.branches = set(branches) if branches else None
+        self.cameras = set(cameras) if cameras else None
+        self.zones = set(zones) if zones else None
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self._reported = 0
+
+    def filter(self, event):
+        """Returns the event as this subscriber should see it, or None to skip it."""
+        if self.branches is not None and event.get('branch') not in self.branches:
+            return None
+        if self.cameras is not None and event.get('camera') not in self.cameras:
+            return None
+        if self.zones is None:
+            return event
+        if event['type'] == 'frame':
+            dets = [d for d in event['detections'] if d.get('zone', d.get('zona_patio')) in self.zones]
+            return dict(event, detections=dets) if dets else None
+        return event if event.get('zone') in self.zones else None
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next event for this client; returns None if ``timeout`` elapses first."""
+        if self.dropped > self._reported:
+            missed = self.dropped - self._reported
+            self._reported = self.dropped
+            return {'type': 'overflow', 'dropped': missed}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveHub:
+    """Fans out newly persisted frames and rollup deltas to live subscribers.
+
+    ``publish_batch`` is called by the ingest writer on the event loop right
+    after each commit; it only enqueues into per-client buffers and never awaits.
+    """
+
+    def __init__(self, buffer_size=256):
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+        self.published = 0
+
+    def subscribe(self, cameras=None, zones=None, branches=None):
+        sub = Subscription(cameras, zones, self.buffer_size, branches)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def publish(self, event):
+        self.published += 1
+        for sub in self.subscribers:
+            filtered = sub.filter(event)
+            if filtered is not None:
+                sub.offer(filtered)
+
+    def publish_batch(self, payloads, acks, rollups, branch=DEFAULT_BRANCH):
+        if not self.subscribers:
+            return
+        for payload, (frame_id, created) in zip(payloads, acks):
+            if created:
+                self.publish({
+                    'type': 'frame',
+                    'branch': branch,
+                    'id': frame_id,
+                    'camera': payload.get('camera') or DEFAULT_CAMERA,
+                    'timestamp': payload.get('timestamp'),
+                    'detections': payload.get('detections') or [],
+                })
+        for row in rollups:
+            self.publish(dict(row, type='rollup', branch=branch))
+
+    def stats(self) -> dict:
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped': sum(s.dropped for s in self.subscribers),
+        }
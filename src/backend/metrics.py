@@ -0,0 +1,140 @@
+"""Minimal Prometheus metrics registry for the backend.
+
+Counters and histograms are updated in place by the ingest path (all on
+the event loop, so no locking). Values that already live in component
+``stats()`` (queue depth, received/persisted totals) are read at scrape
+time through ``CallbackMetric`` instead of being counted twice.
+``Registry.render`` produces the text exposition format served at
+``/metrics``.
+"""
+
+import bisect
+import math
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers a sub-millisecond SQLite commit up to a stalled writer
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds from the sender's timestamp to commit, including network and queueing
+E2E_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name + _labels(self.label_names, key), value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum]
+        self.series = {}
+
+    def observe(self, value, **labels):
+        self.observe_many((value,), **labels)
+
+    def observe_many(self, values, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.bounds) + 1), 0.0]
+        counts = series[0]
+        for value in values:
+            counts[bisect.bisect_left(self.bounds, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        for key, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                yield self.name + '_bucket' + _labels(self.label_names, key, [('le', _number(bound))]), cumulative
+            yield self.name + '_sum' + _labels(self.label_names, key), total
+            yield self.name + '_count' + _labels(self.label_names, key), cumulative
+
+
+class CallbackMetric(_Metric):
+    """A counter or gauge read at scrape time; ``fn()`` returns ``[(labels dict, value), ...]``."""
+
+    def __init__(self, name, help, fn, kind='gauge', labels=()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in self.fn():
+            yield self.name + _labels(self.label_names, self._key(labels)), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, fn, kind='gauge', labels=()):
+        return self.register(CallbackMetric(name, help, fn, kind, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(f'{name} {_number(value)}' for name, value in metric.samples())
+        return '\n'.join(lines) + '\n'
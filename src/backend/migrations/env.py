@@ -0,0 +1,27 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations(connection):
+    # render_as_batch lets ALTER-style operations work on SQLite
+    context.configure(connection=connection, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# DetectionStore passes its write connection in; the alembic CLI builds its own engine
+connection = config.attributes.get('connection')
+if connection is not None:
+    run_migrations(connection)
+else:
+    engine = engine_from_config(config.get_section(config.config_ini_section, {}),
+                                prefix='sqlalchemy.', poolclass=pool.NullPool)
+    with engine.connect() as conn:
+        run_migrations(conn)
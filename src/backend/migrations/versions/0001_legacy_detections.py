@@ -0,0 +1,31 @@
+"""Legacy detections table (one JSON payload per frame)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created before migrations existed already have this table
+    if sa.inspect(op.get_bind()).has_table('detections'):
+        return
+    op.create_table(
+        'detections',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('timestamp', sa.Float),
+        sa.Column('payload', sa.JSON),
+    )
+    op.create_index('ix_detections_id', 'detections', ['id'])
+    op.create_index('ix_detections_timestamp', 'detections', ['timestamp'])
+
+
+def downgrade():
+    op.drop_table('detections')
@@ -0,0 +1,136 @@
+"""Normalize detections into frames + per-detection rows
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+import json
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+CHUNK = 5000
+
+
+def _flatten(det, frame_id, camera, timestamp):
+    # Frozen copy of storage.detection_to_row as of this revision
+    bbox = det.get('bbox') or [None, None, None, None]
+    centroid = det.get('centroid') or det.get('center')
+    if centroid is None and None not in bbox:
+        centroid = [int((bbox[0] + bbox[2]) / 2), int((bbox[1] + bbox[3]) / 2)]
+    centroid = centroid or [None, None]
+    track_id = det.get('track_id', det.get('id'))
+    return {
+        'frame_id': frame_id, 'camera': camera, 'timestamp': timestamp,
+        'track_id': str(track_id) if track_id is not None else None,
+        'zone': det.get('zone', det.get('zona_patio')),
+        'class_name': det.get('class', det.get('class_name')),
+        'confidence': det.get('confidence', det.get('conf')),
+        'x1': bbox[0], 'y1': bbox[1], 'x2': bbox[2], 'y2': bbox[3],
+        'cx': centroid[0], 'cy': centroid[1],
+    }
+
+
+def upgrade():
+    op.rename_table('detections', 'detections_legacy')
+
+    frames = op.create_table(
+        'frames',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('camera', sa.String(64), nullable=False),
+        sa.Column('timestamp', sa.Float, nullable=False),
+        sa.Column('received_at', sa.Float, nullable=False),
+        sa.Column('n_detections', sa.Integer, nullable=False),
+    )
+    op.create_index('ix_frames_camera_timestamp', 'frames', ['camera', 'timestamp'])
+    op.create_index('ix_frames_timestamp', 'frames', ['timestamp'])
+
+    detections = op.create_table(
+        'detections',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('frame_id', sa.Integer, sa.ForeignKey('frames.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('camera', sa.String(64), nullable=False),
+        sa.Column('timestamp', sa.Float, nullable=False),
+        sa.Column('track_id', sa.String(64)),
+        sa.Column('zone', sa.String(32)),
+        sa.Column('class_name', sa.String(32)),
+        sa.Column('confidence', sa.Float),
+        sa.Column('x1', sa.Integer),
+        sa.Column('y1', sa.Integer),
+        sa.Column('x2', sa.Integer),
+        sa.Column('y2', sa.Integer),
+        sa.Column('cx', sa.Integer),
+        sa.Column('cy', sa.Integer),
+    )
+
+    # Backfill before creating the detection indexes so the bulk load stays cheap.
+    # Legacy ids are kept as frame ids.
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, timestamp, payload FROM detections_legacy WHERE id > :last ORDER BY id LIMIT :n'),
+            {'last': last_id, 'n': CHUNK}).fetchall()
+        if not rows:
+            break
+        frame_rows, det_rows = [], []
+        for row_id, ts, payload in rows:
+            payload = json.loads(payload) if isinstance(payload, str) else (payload or {})
+            camera = payload.get('camera') or 'default'
+            ts = ts if ts is not None else payload.get('timestamp', time.time())
+            dets = payload.get('detections') or []
+            frame_rows.append({'id': row_id, 'camera': camera, 'timestamp': ts,
+                               'received_at': ts, 'n_detections': len(dets)})
+            det_rows.extend(_flatten(d, row_id, camera, ts) for d in dets)
+        bind.execute(frames.insert(), frame_rows)
+        if det_rows:
+            bind.execute(detections.insert(), det_rows)
+        last_id = rows[-1][0]
+
+    op.create_index('ix_detections_camera_timestamp', 'detections', ['camera', 'timestamp'])
+    op.create_index('ix_detections_track_timestamp', 'detections', ['track_id', 'timestamp'])
+    op.create_index('ix_detections_frame_id', 'detections', ['frame_id'])
+    op.drop_table('detections_legacy')
+
+
+def downgrade():
+    # Rebuild one JSON payload per frame from the normalized rows
+    op.rename_table('detections', 'detections_rows')
+    legacy = op.create_table(
+        'detections',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('timestamp', sa.Float),
+        sa.Column('payload', sa.JSON),
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        frame_rows = bind.execute(sa.text(
+            'SELECT id, camera, timestamp FROM frames WHERE id > :last ORDER BY id LIMIT :n'),
+            {'last': last_id, 'n': CHUNK}).fetchall()
+        if not frame_rows:
+            break
+        ids = [f[0] for f in frame_rows]
+        by_frame = {i: [] for i in ids}
+        dets = bind.execute(sa.text(
+            'SELECT frame_id, track_id, zone, class_name, confidence, x1, y1, x2, y2, cx, cy '
+            'FROM detections_rows WHERE frame_id BETWEEN :lo AND :hi'),
+            {'lo': ids[0], 'hi': ids[-1]}).fetchall()
+        for fid, track, zone, cls, conf, x1, y1, x2, y2, cx, cy in dets:
+            by_frame[fid].append({'id': track, 'zone': zone, 'class': cls, 'confidence': conf,
+                                  'bbox': [x1, y1, x2, y2], 'centroid': [cx, cy]})
+        bind.execute(legacy.insert(), [
+            {'id': fid, 'timestamp': ts,
+             'payload': {'timestamp': ts, 'camera': camera, 'detections': by_frame[fid]}}
+            for fid, camera, ts in frame_rows])
+        last_id = ids[-1]
+    op.create_index('ix_detections_id', 'detections', ['id'])
+    op.create_index('ix_detections_timestamp', 'detections', ['timestamp'])
+    op.drop_table('detections_rows')
+    op.drop_table('frames')
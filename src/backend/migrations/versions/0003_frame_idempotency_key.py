@@ -0,0 +1,26 @@
+"""Idempotency key on frames so replayed uploads are not stored twice
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('frames') as batch:
+        batch.add_column(sa.Column('idempotency_key', sa.String(128)))
+    # NULL keys are never considered equal, so frames without a key are unaffected
+    op.create_index('ux_frames_idempotency_key', 'frames', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_frames_idempotency_key', 'frames')
+    with op.batch_alter_table('frames') as batch:
+        batch.drop_column('idempotency_key')
@@ -0,0 +1,20 @@
+"""Index detections by (zone, timestamp) for zone range queries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_detections_zone_timestamp', 'detections', ['zone', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_detections_zone_timestamp', 'detections')
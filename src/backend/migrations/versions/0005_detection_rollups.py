@@ -0,0 +1,55 @@
+"""Minute/hour detection rollups by camera and zone
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+BUCKETS = (60, 3600)
+
+
+def upgrade():
+    op.create_table(
+        'detection_rollups',
+        sa.Column('bucket_s', sa.Integer, primary_key=True),
+        sa.Column('camera', sa.String(64), primary_key=True),
+        sa.Column('zone', sa.String(32), primary_key=True),
+        sa.Column('bucket', sa.Integer, primary_key=True),
+        sa.Column('detections', sa.Integer, nullable=False),
+        sa.Column('confidence_sum', sa.Float, nullable=False),
+        sa.Column('confidence_n', sa.Integer, nullable=False),
+        sa.Column('tracks', sa.Integer, nullable=False),
+    )
+    op.create_table(
+        'rollup_tracks',
+        sa.Column('bucket_s', sa.Integer, primary_key=True),
+        sa.Column('camera', sa.String(64), primary_key=True),
+        sa.Column('zone', sa.String(32), primary_key=True),
+        sa.Column('bucket', sa.Integer, primary_key=True),
+        sa.Column('track_id', sa.String(64), primary_key=True),
+        sqlite_with_rowid=False,
+    )
+    # Backfill from existing rows in one aggregate pass per bucket size
+    for size in BUCKETS:
+        bucket = f'CAST(timestamp / {size} AS INTEGER) * {size}'
+        op.execute(
+            f"INSERT INTO detection_rollups "
+            f"SELECT {size}, camera, COALESCE(zone, ''), {bucket}, COUNT(*), "
+            f"COALESCE(SUM(confidence), 0), COUNT(confidence), COUNT(DISTINCT track_id) "
+            f"FROM detections GROUP BY camera, COALESCE(zone, ''), {bucket}")
+        op.execute(
+            f"INSERT INTO rollup_tracks "
+            f"SELECT DISTINCT {size}, camera, COALESCE(zone, ''), {bucket}, track_id "
+            f"FROM detections WHERE track_id IS NOT NULL")
+
+
+def downgrade():
+    op.drop_table('rollup_tracks')
+    op.drop_table('detection_rollups')
@@ -0,0 +1,127 @@
+"""Split frames/detections into day partitions behind UNION ALL views
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+DAY_SECONDS = 86400
+FRAME_COLS = 'id, camera, timestamp, received_at, n_detections, idempotency_key'
+DETECTION_COLS = ('id, frame_id, camera, timestamp, track_id, zone, class_name, confidence, '
+                  'x1, y1, x2, y2, cx, cy')
+
+# Partition DDL is frozen here so later changes to partitions.py don't rewrite history
+FRAMES_DDL = [
+    'CREATE TABLE "frames_p{s}" (id INTEGER NOT NULL, camera VARCHAR(64) NOT NULL, '
+    'timestamp FLOAT NOT NULL, received_at FLOAT NOT NULL, n_detections INTEGER NOT NULL, '
+    'idempotency_key VARCHAR(128), PRIMARY KEY (id))',
+    'CREATE INDEX "ix_frames_p{s}_camera_timestamp" ON "frames_p{s}" (camera, timestamp)',
+    'CREATE INDEX "ix_frames_p{s}_timestamp" ON "frames_p{s}" (timestamp)',
+    'CREATE UNIQUE INDEX "ux_frames_p{s}_idempotency_key" ON "frames_p{s}" (idempotency_key)',
+]
+DETECTIONS_DDL = [
+    'CREATE TABLE "detections_p{s}" (id INTEGER NOT NULL, frame_id INTEGER NOT NULL, '
+    'camera VARCHAR(64) NOT NULL, timestamp FLOAT NOT NULL, track_id VARCHAR(64), zone VARCHAR(32), '
+    'class_name VARCHAR(32), confidence FLOAT, x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER, '
+    'cx INTEGER, cy INTEGER, PRIMARY KEY (id))',
+    'CREATE INDEX "ix_detections_p{s}_camera_timestamp" ON "detections_p{s}" (camera, timestamp)',
+    'CREATE INDEX "ix_detections_p{s}_track_timestamp" ON "detections_p{s}" (track_id, timestamp)',
+    'CREATE INDEX "ix_detections_p{s}_zone_timestamp" ON "detections_p{s}" (zone, timestamp)',
+    'CREATE INDEX "ix_detections_p{s}_frame_id" ON "detections_p{s}" (frame_id)',
+]
+
+
+def _suffix(day):
+    return time.strftime('%Y%m%d', time.gmtime(day * DAY_SECONDS))
+
+
+def _create_views(suffixes):
+    for view, prefix, cols in (('frames', 'frames_p', FRAME_COLS), ('detections', 'detections_p', DETECTION_COLS)):
+        if suffixes:
+            body = ' UNION ALL '.join(f'SELECT {cols} FROM "{prefix}{s}"' for s in suffixes)
+        else:
+            body = 'SELECT ' + ', '.join(f'NULL AS {c.strip()}' for c in cols.split(',')) + ' WHERE 0'
+        op.execute(f'CREATE VIEW {view} AS {body}')
+
+
+def upgrade():
+    conn = op.get_bind()
+    op.create_table(
+        'id_sequences',
+        sa.Column('name', sa.String(32), primary_key=True),
+        sa.Column('next_id', sa.Integer, nullable=False),
+    )
+    op.execute("INSERT INTO id_sequences SELECT 'frames', COALESCE(MAX(id), 0) + 1 FROM frames")
+    op.execute("INSERT INTO id_sequences SELECT 'detections', COALESCE(MAX(id), 0) + 1 FROM detections")
+
+    days = [r[0] for r in conn.execute(sa.text(
+        f'SELECT DISTINCT CAST(timestamp / {DAY_SECONDS} AS INTEGER) FROM frames ORDER BY 1'))]
+    for day in days:
+        s = _suffix(day)
+        for ddl in FRAMES_DDL + DETECTIONS_DDL:
+            op.execute(ddl.format(s=s))
+        lo, hi = day * DAY_SECONDS, (day + 1) * DAY_SECONDS
+        op.execute(f'INSERT INTO "frames_p{s}" ({FRAME_COLS}) SELECT {FRAME_COLS} FROM frames '
+                   f'WHERE timestamp >= {lo} AND timestamp < {hi}')
+        op.execute(f'INSERT INTO "detections_p{s}" ({DETECTION_COLS}) SELECT {DETECTION_COLS} FROM detections '
+                   f'WHERE timestamp >= {lo} AND timestamp < {hi}')
+
+    op.drop_table('detections')
+    op.drop_table('frames')
+    _create_views([_suffix(d) for d in days])
+
+
+def downgrade():
+    conn = op.get_bind()
+    suffixes = [r[0][len('frames_p'):] for r in conn.execute(sa.text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'frames_p%' ORDER BY name"))]
+    op.execute('DROP VIEW detections')
+    op.execute('DROP VIEW frames')
+    op.create_table(
+        'frames',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('camera', sa.String(64), nullable=False),
+        sa.Column('timestamp', sa.Float, nullable=False),
+        sa.Column('received_at', sa.Float, nullable=False),
+        sa.Column('n_detections', sa.Integer, nullable=False),
+        sa.Column('idempotency_key', sa.String(128)),
+    )
+    op.create_table(
+        'detections',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('frame_id', sa.Integer, sa.ForeignKey('frames.id'), nullable=False),
+        sa.Column('camera', sa.String(64), nullable=False),
+        sa.Column('timestamp', sa.Float, nullable=False),
+        sa.Column('track_id', sa.String(64)),
+        sa.Column('zone', sa.String(32)),
+        sa.Column('class_name', sa.String(32)),
+        sa.Column('confidence', sa.Float),
+        sa.Column('x1', sa.Integer),
+        sa.Column('y1', sa.Integer),
+        sa.Column('x2', sa.Integer),
+        sa.Column('y2', sa.Integer),
+        sa.Column('cx', sa.Integer),
+        sa.Column('cy', sa.Integer),
+    )
+    for s in suffixes:
+        op.execute(f'INSERT INTO frames ({FRAME_COLS}) SELECT {FRAME_COLS} FROM "frames_p{s}"')
+        op.execute(f'INSERT INTO detections ({DETECTION_COLS}) SELECT {DETECTION_COLS} FROM "detections_p{s}"')
+        op.execute(f'DROP TABLE "detections_p{s}"')
+        op.execute(f'DROP TABLE "frames_p{s}"')
+    op.create_index('ix_frames_camera_timestamp', 'frames', ['camera', 'timestamp'])
+    op.create_index('ix_frames_timestamp', 'frames', ['timestamp'])
+    op.create_index('ux_frames_idempotency_key', 'frames', ['idempotency_key'], unique=True)
+    op.create_index('ix_detections_camera_timestamp', 'detections', ['camera', 'timestamp'])
+    op.create_index('ix_detections_track_timestamp', 'detections', ['track_id', 'timestamp'])
+    op.create_index('ix_detections_zone_timestamp', 'detections', ['zone', 'timestamp'])
+    op.create_index('ix_detections_frame_id', 'detections', ['frame_id'])
+    op.drop_table('id_sequences')
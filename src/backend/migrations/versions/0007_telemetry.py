@@ -0,0 +1,30 @@
+"""Sensor telemetry time series keyed by (sensor_id, ts)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'telemetry',
+        sa.Column('sensor_id', sa.String(64), primary_key=True),
+        sa.Column('ts', sa.Float, primary_key=True),
+        sa.Column('lat', sa.Float),
+        sa.Column('lon', sa.Float),
+        sa.Column('battery', sa.Float),
+        sa.Column('status', sa.String(32)),
+        sqlite_with_rowid=False,
+    )
+
+
+def downgrade():
+    op.drop_table('telemetry')
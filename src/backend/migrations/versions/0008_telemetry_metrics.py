@@ -0,0 +1,27 @@
+"""Fuel, engine temperature and speed columns on telemetry
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('telemetry') as batch:
+        batch.add_column(sa.Column('fuel', sa.Float))
+        batch.add_column(sa.Column('engine_temp', sa.Float))
+        batch.add_column(sa.Column('speed', sa.Float))
+
+
+def downgrade():
+    with op.batch_alter_table('telemetry') as batch:
+        batch.drop_column('speed')
+        batch.drop_column('engine_temp')
+        batch.drop_column('fuel')
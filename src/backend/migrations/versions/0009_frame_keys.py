@@ -0,0 +1,39 @@
+"""Global idempotency key table for frames across day partitions
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+DAY_SECONDS = 86400
+
+
+def upgrade():
+    conn = op.get_bind()
+    op.create_table(
+        'frame_keys',
+        sa.Column('idempotency_key', sa.String(128), primary_key=True),
+        sa.Column('frame_id', sa.Integer, nullable=False),
+        sa.Column('day', sa.Integer, nullable=False),
+        sqlite_with_rowid=False,
+    )
+    op.create_index('ix_frame_keys_day', 'frame_keys', ['day'])
+    partitions = [r[0] for r in conn.execute(sa.text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'frames_p%' ORDER BY name"))]
+    # A key already stored on two days keeps its oldest frame
+    for name in partitions:
+        op.execute(f'INSERT OR IGNORE INTO frame_keys (idempotency_key, frame_id, day) '
+                   f'SELECT idempotency_key, id, CAST(timestamp / {DAY_SECONDS} AS INTEGER) FROM "{name}" '
+                   f'WHERE idempotency_key IS NOT NULL ORDER BY id')
+
+
+def downgrade():
+    op.drop_index('ix_frame_keys_day', 'frame_keys')
+    op.drop_table('frame_keys')
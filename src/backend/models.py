@@ -0,0 +1,28 @@
+"""Validation of incoming detection frames, shared by the HTTP routes and the MQTT consumers."""
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from backend.shards import valid_branch
+
+
+class DetectionIn(BaseModel):
+    timestamp: float
+    detections: List[dict]
+    camera: Optional[str] = None
+    branch: Optional[str] = None
+    # Per-camera frame sequence number; camera + seq + timestamp identify a frame
+    seq: Optional[int] = None
+    # Set by the sender so that replays of the same frame are stored only once
+    idempotency_key: Optional[str] = None
+
+
+def parse_frame(raw):
+    """Validated payload dict; raises ValueError/TypeError on bad input."""
+    if not isinstance(raw, dict):
+        raise TypeError(f'expected a frame object, got {type(raw).__name__}')
+    payload = DetectionIn(**raw).dict()
+    if payload['branch'] is not None and not valid_branch(payload['branch']):
+        raise ValueError(f"invalid branch name: {payload['branch']!r}")
+    return payload
@@ -0,0 +1,139 @@
+"""Day partitions for raw frames and detections.
+
+Raw rows live in one pair of tables per UTC day (``frames_pYYYYMMDD`` and
+``detections_pYYYYMMDD``) inside the same SQLite file. ``frames`` and
+``detections`` are UNION ALL views over every partition, so ad hoc SQL keeps
+working, while the storage layer routes writes and range queries straight to
+the partitions that cover the requested days. Expiring a day is a DROP TABLE
+instead of a DELETE of millions of indexed rows.
+"""
+
+import calendar
+import time
+
+from sqlalchemy import MetaData, Table, Column, Index, Integer, Float, String, text
+
+DAY_SECONDS = 86400
+FRAMES_PREFIX = 'frames_p'
+DETECTIONS_PREFIX = 'detections_p'
+
+_metadata = MetaData()
+_tables = {}
+
+
+def frame_columns():
+    return [
+        Column('id', Integer, primary_key=True),
+        Column('camera', String(64), nullable=False),
+        Column('timestamp', Float, nullable=False),
+        Column('received_at', Float, nullable=False),
+        Column('n_detections', Integer, nullable=False),
+        Column('idempotency_key', String(128)),
+    ]
+
+
+def detection_columns():
+    return [
+        Column('id', Integer, primary_key=True),
+        Column('frame_id', Integer, nullable=False),
+        Column('camera', String(64), nullable=False),
+        Column('timestamp', Float, nullable=False),
+        Column('track_id', String(64)),
+        Column('zone', String(32)),
+        Column('class_name', String(32)),
+        Column('confidence', Float),
+        Column('x1', Integer),
+        Column('y1', Integer),
+        Column('x2', Integer),
+        Column('y2', Integer),
+        Column('cx', Integer),
+        Column('cy', Integer),
+    ]
+
+
+FRAME_FIELDS = [c.name for c in frame_columns()]
+DETECTION_FIELDS = [c.name for c in detection_columns()]
+
+
+def day_of(timestamp):
+    """UTC day number (days since the epoch) a timestamp belongs to."""
+    return int(timestamp // DAY_SECONDS)
+
+
+def day_bounds(day):
+    return day * DAY_SECONDS, (day + 1) * DAY_SECONDS
+
+
+def day_suffix(day):
+    return time.strftime('%Y%m%d', time.gmtime(day * DAY_SECONDS))
+
+
+def suffix_day(suffix):
+    return day_of(calendar.timegm(time.strptime(suffix, '%Y%m%d')))
+
+
+def partition_tables(day):
+    """``(frames, detections)`` Table objects for one day partition."""
+    tables = _tables.get(day)
+    if tables is None:
+        s = day_suffix(day)
+        f = Table(
+            FRAMES_PREFIX + s, _metadata, *frame_columns(),
+            Index(f'ix_{FRAMES_PREFIX}{s}_camera_timestamp', 'camera', 'timestamp'),
+            Index(f'ix_{FRAMES_PREFIX}{s}_timestamp', 'timestamp'),
+            Index(f'ux_{FRAMES_PREFIX}{s}_idempotency_key', 'idempotency_key', unique=True),
+        )
+        d = Table(
+            DETECTIONS_PREFIX + s, _metadata, *detection_columns(),
+            Index(f'ix_{DETECTIONS_PREFIX}{s}_camera_timestamp', 'camera', 'timestamp'),
+            Index(f'ix_{DETECTIONS_PREFIX}{s}_track_timestamp', 'track_id', 'timestamp'),
+            Index(f'ix_{DETECTIONS_PREFIX}{s}_zone_timestamp', 'zone', 'timestamp'),
+            Index(f'ix_{DETECTIONS_PREFIX}{s}_frame_id', 'frame_id'),
+        )
+        tables = _tables[day] = (f, d)
+    return tables
+
+
+def list_partitions(conn):
+    """Sorted day numbers of the partitions present in the database."""
+    names = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :p"),
+        {'p': FRAMES_PREFIX + '%'}).scalars()
+    return sorted(suffix_day(n[len(FRAMES_PREFIX):]) for n in names)
+
+
+def ensure_partitions(conn, days):
+    """Create any missing partitions for ``days``; rebuilds the views if one was added."""
+    existing = set(list_partitions(conn))
+    missing = [d for d in days if d not in existing]
+    for day in missing:
+        for table in partition_tables(day):
+            table.create(conn, checkfirst=True)
+    if missing:
+        rebuild_views(conn)
+    return missing
+
+
+def drop_partition(conn, day):
+    for table in partition_tables(day):
+        conn.execute(text(f'DROP TABLE IF EXISTS "{table.name}"'))
+    rebuild_views(conn)
+
+
+def rebuild_views(conn):
+    """Point the ``frames`` / ``detections`` views at the current set of partitions.
+
+    SQLite caps a compound SELECT at 500 terms, which bounds the number of
+    days kept online; retention keeps it far below that.
+    """
+    days = list_partitions(conn)
+    for view, prefix, fields in (('frames', FRAMES_PREFIX, FRAME_FIELDS),
+                                 ('detections', DETECTIONS_PREFIX, DETECTION_FIELDS)):
+        cols = ', '.join(fields)
+        if days:
+            body = ' UNION ALL '.join(f'SELECT {cols} FROM "{prefix}{day_suffix(d)}"' for d in days)
+        else:
+            # Empty view with the right columns until the first partition exists
+            body = 'SELECT ' + ', '.join(f'NULL AS {c}' for c in fields) + ' WHERE 0'
+        conn.execute(text(f'DROP VIEW IF EXISTS {view}'))
+        conn.execute(text(f'CREATE VIEW {view} AS {body}'))
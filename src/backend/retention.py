@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+
+from backend.partitions import DAY_SECONDS
+from backend.storage import expire_partition, expired_partitions, prune_rollup_tracks, prune_rollups
+
+RAW_RETENTION_DAYS = int(os.environ.get('MOTTU_RAW_RETENTION_DAYS', '7'))
+MINUTE_ROLLUP_RETENTION_DAYS = int(os.environ.get('MOTTU_MINUTE_ROLLUP_RETENTION_DAYS', '90'))
+RETENTION_INTERVAL_S = 3600
+PRUNE_BATCH = 5000
+
+
+class RetentionJob:
+    """Periodically expires raw partitions and downsamples old rollups.
+
+    Raw frames/detections are kept for ``raw_days``; older day partitions are
+    dropped whole. Minute rollups are kept for ``minute_days`` and hour
+    rollups indefinitely, so history stays queryable at hour resolution.
+    Every step is its own short write transaction and the task yields between
+    them, so the ingest writer is never blocked for long.
+    """
+
+    def __init__(self, store, raw_days=RAW_RETENTION_DAYS, minute_days=MINUTE_ROLLUP_RETENTION_DAYS,
+                 interval=RETENTION_INTERVAL_S, batch=PRUNE_BATCH):
+        self.store = store
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.interval = interval
+        self.batch = batch
+        self._task = None
+        self._stats = {
+            'runs': 0,
+            'errors': 0,
+            'partitions_dropped': 0,
+            'rollups_pruned': 0,
+            'rollup_tracks_pruned': 0,
+            'last_run_ms': 0.0,
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print("Retention run failed:", e)
+                self._stats['errors'] += 1
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now=None):
+        now = time.time() if now is None else now
+        t0 = time.perf_counter()
+        raw_horizon = now - self.raw_days * DAY_SECONDS
+        for day in await self.store.read(expired_partitions, raw_horizon):
+            await self.store.write(expire_partition, day)
+            self._stats['partitions_dropped'] += 1
+            await asyncio.sleep(0)
+        # Track membership only matters while late detections can still land in a bucket
+        self._stats['rollup_tracks_pruned'] += await self._prune(prune_rollup_tracks, raw_horizon)
+        self._stats['rollups_pruned'] += await self._prune(
+            prune_rollups, 'minute', now - self.minute_days * DAY_SECONDS)
+        self._stats['runs'] += 1
+        self._stats['last_run_ms'] = (time.perf_counter() - t0) * 1000.0
+
+    async def _prune(self, fn, *args):
+        total = 0
+        while True:
+            n = await self.store.write(fn, *args, self.batch)
+            total += n
+            if n < self.batch:
+                return total
+            await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        return dict(self._stats, raw_days=self.raw_days, minute_days=self.minute_days)
@@ -0,0 +1,312 @@
+"""Per-branch storage shards.
+
+Every branch (yard) gets its own SQLite file, store, group-commit writer,
+heatmap cache and retention job, so branches never contend for the same
+write lock and a shard can be moved or dropped on its own. The default
+branch keeps using ``DATABASE_PATH``; other branches live under
+``SHARD_DIR`` as ``<branch>.db``. Queries without a branch fan out to all
+shards and merge the results, including shards created since startup by
+other processes (ingest workers).
+"""
+
+import asyncio
+import base64
+import json
+import os
+import re
+
+from backend.heatmap import HeatmapCache
+from backend.ingest import BatchWriter, RecentKeys
+from backend.retention import RetentionJob
+from backend.storage import DATABASE_PATH, DEFAULT_BRANCH, AsyncDetectionStore, encode_cursor, message_key
+
+SHARD_DIR = os.environ.get('MOTTU_SHARD_DIR', os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'shards'))
+# Branch names become file names, so keep them to a safe alphabet
+BRANCH_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Sorts after any real detection id; used to build per-shard cursors
+_MAX_ID = 2 ** 62
+# Recent message keys remembered per shard for in-memory dedup
+DEDUP_KEYS = int(os.environ.get('MOTTU_DEDUP_KEYS', '100000'))
+
+
+def valid_branch(name) -> bool:
+    return isinstance(name, str) and bool(BRANCH_PATTERN.match(name))
+
+
+class Shard:
+    """One branch's store and writer.
+
+    Replays (QoS 1 redelivery, edge retries) are dropped against ``recent``,
+    an LRU of message keys (see ``storage.message_key``), before they reach
+    the writer queue; the store's ``frame_keys`` table catches the ones that
+    already fell out of it.
+    """
+
+    def __init__(self, branch, path, on_commit, retention=True, dedup_keys=DEDUP_KEYS, on_flush=None):
+        self.branch = branch
+        self.path = path
+        self.on_commit = on_commit
+        self.store = AsyncDetectionStore(path)
+        self.heatmaps = HeatmapCache(self.store)
+        self.retention = RetentionJob(self.store) if retention else None
+        self.writer = BatchWriter(self._persist)
+        if on_flush is not None:
+            self.writer.on_flush = lambda size, seconds: on_flush(branch, size, seconds)
+        self.recent = RecentKeys(dedup_keys)
+
+    async def _persist(self, payloads):
+        try:
+            acks, rollups = await self.store.insert_payloads(payloads)
+        except Exception:
+            # Forget the in-flight keys so a redelivery can be written
+            for payload in payloads:
+                key = message_key(payload)
+                if key is not None and self.recent.get(key) is None:
+                    self.recent.discard(key)
+            raise
+        for payload, (frame_id, _) in zip(payloads, acks):
+            key = message_key(payload)
+            if key is not None:
+                self.recent.add(key, frame_id)
+        # The batch is committed: a failing cache or subscriber must not report it as lost
+        try:
+            self.heatmaps.apply_batch(payloads, acks)
+        except Exception as e:
+            print("Heatmap update failed for branch", self.branch + ":", e)
+        try:
+            self.on_commit(self.branch, payloads, acks, rollups)
+        except Exception as e:
+            print("Post-commit hook failed for branch", self.branch + ":", e)
+        return acks
+
+    def _fresh(self, payload):
+        """True unless ``payload`` repeats a recently seen key; marks new keys as in flight."""
+        key = message_key(payload)
+        if key is None:
+            return True
+        if key in self.recent:
+            self.recent.hit(key)
+            return False
+        self.recent.add(key)
+        return True
+
+    def submit(self, payload):
+        """Fire-and-forget enqueue; a replay is dropped without touching the database."""
+        if not self._fresh(payload):
+            return False
+        return self.writer.submit(payload)
+
+    async def write(self, payload):
+        """Persist one payload; returns (frame_id, created)."""
+        key = message_key(payload)
+        frame_id = self.recent.get(key) if key is not None else None
+        if frame_id is not None:
+            self.recent.hit(key)
+            return frame_id, False
+        # A copy still in flight is resolved by the batch's own dedup
+        return await self.writer.write(payload)
+
+    async def write_many(self, payloads):
+        results = [None] * len(payloads)
+        todo = []
+        for i, payload in enumerate(payloads):
+            key = message_key(payload)
+            frame_id = self.recent.get(key) if key is not None else None
+            if frame_id is not None:
+                self.recent.hit(key)
+                results[i] = (frame_id, False)
+            else:
+                todo.append(i)
+        if todo:
+            acks = await self.writer.write_many([payloads[i] for i in todo])
+            for i, ack in zip(todo, acks):
+                results[i] = ack
+        return results
+
+    def start(self):
+        self.writer.start()
+        if self.retention is not None:
+            self.retention.start()
+
+    async def stop(self):
+        if self.retention is not None:
+            await self.retention.stop()
+        await self.writer.stop()
+        await self.store.close()
+
+    def stats(self) -> dict:
+        retention = self.retention.stats() if self.retention is not None else None
+        return {**self.writer.stats(), 'retention': retention, 'heatmaps': self.heatmaps.stats(),
+                'dedup': self.recent.stats()}
+
+
+def encode_global_cursor(timestamp, branch, row_id):
+    raw = json.dumps([timestamp, branch, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_global_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, branch, row_id = json.loads(raw)
+        return float(timestamp), str(branch), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'invalid cursor: {cursor!r}') from e
+
+
+class ShardSet:
+    """All branch shards of this backend, opened lazily on first use.
+
+    ``on_commit(branch, payloads, acks, rollups)`` runs on the event loop
+    after every committed batch of any shard (yard state, live feed), and
+    ``on_flush(branch, batch_size, seconds)`` with its commit timing (metrics).
+    With ``retention=False`` the shards only ingest and leave expiry to
+    another process (see ingest_worker.py).
+    """
+
+    def __init__(self, on_commit, shard_dir=SHARD_DIR, default_path=DATABASE_PATH, retention=True, on_flush=None):
+        self.on_commit = on_commit
+        self.on_flush = on_flush
+        self.retention = retention
+        self.shard_dir = shard_dir
+        self.default_path = default_path
+        self.shards = {}
+        self.loop = None
+        self.rejected = 0
+        # mtime of shard_dir at the last scan; a new shard file changes it
+        self._scanned = None
+
+    def path_for(self, branch):
+        if branch == DEFAULT_BRANCH:
+            return self.default_path
+        return os.path.join(self.shard_dir, branch + '.db')
+
+    def get(self, branch, create=True):
+        """The shard of ``branch`` (started if the loop is running), or None if it does not exist."""
+        branch = branch or DEFAULT_BRANCH
+        shard = self.shards.get(branch)
+        if shard is None:
+            if not valid_branch(branch):
+                raise ValueError(f'invalid branch name: {branch!r}')
+            path = self.path_for(branch)
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # Opening runs the migrations synchronously; it only happens once per branch
+            shard = self.shards[branch] = Shard(branch, path, self.on_commit, self.retention, on_flush=self.on_flush)
+            if self.loop is not None:
+                shard.start()
+        return shard
+
+    def start(self, owned=None):
+        """Open the default shard and every shard already on disk, and start their tasks.
+
+        ``owned`` optionally restricts which of those branches are opened up front.
+        """
+        self.loop = asyncio.get_running_loop()
+        for branch in [DEFAULT_BRANCH] + self._on_disk():
+            if owned is None or owned(branch):
+                self.get(branch)
+        for shard in self.shards.values():
+            shard.start()
+
+    def _on_disk(self):
+        self._scanned = self._dir_mtime()
+        if self._scanned is None:
+            return []
+        branches = []
+        for name in sorted(os.listdir(self.shard_dir)):
+            branch, ext = os.path.splitext(name)
+            if ext == '.db' and valid_branch(branch):
+                branches.append(branch)
+        return branches
+
+    def _dir_mtime(self):
+        try:
+            return os.stat(self.shard_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def discover(self):
+        """Open shards created on disk since the last scan (e.g. by ingest workers); cheap when none were."""
+        if self._dir_mtime() == self._scanned:
+            return
+        for branch in self._on_disk():
+            if branch not in self.shards:
+                self.get(branch)
+
+    async def stop(self):
+        await asyncio.gather(*(shard.stop() for shard in self.shards.values()))
+        self.loop = None
+
+    def submit(self, payload):
+        """Fire-and-forget enqueue on the payload's branch writer (event loop only)."""
+        try:
+            shard = self.get(payload.get('branch'))
+        except ValueError as e:
+            print("Dropping message:", e)
+            self.rejected += 1
+            return False
+        return shard.submit(payload)
+
+    def submit_threadsafe(self, payload):
+        """Hand a payload over from another thread (e.g. the paho network loop)."""
+        self.loop.call_soon_threadsafe(self.submit, payload)
+
+    async def write_many(self, payloads):
+        """Persist payloads through their branch writers; results come back in input order."""
+        groups = {}
+        for i, payload in enumerate(payloads):
+            groups.setdefault(payload.get('branch') or DEFAULT_BRANCH, []).append(i)
+        shards = {branch: self.get(branch) for branch in groups}
+        outcomes = await asyncio.gather(*(
+            shards[branch].write_many([payloads[i] for i in indexes])
+            for branch, indexes in groups.items()))
+        results = [None] * len(payloads)
+        for indexes, acks in zip(groups.values(), outcomes):
+            for i, ack in zip(indexes, acks):
+                results[i] = ack
+        return results
+
+    async def query_detections(self, limit=1000, cursor=None, descending=False, **filters):
+        """One page across all shards, ordered by (timestamp, branch, id).
+
+        Each shard is asked for a full page starting after the global cursor,
+        translated into that shard's own (timestamp, id) cursor; for shards
+        other than the cursor's, the id is set past whichever end keeps the
+        (timestamp, branch, id) order. The pages are merged and cut to ``limit``.
+        """
+        after = decode_global_cursor(cursor) if cursor is not None else None
+        self.discover()
+        branches = sorted(self.shards)
+
+        def shard_cursor(branch):
+            if after is None:
+                return None
+            ts, cursor_branch, row_id = after
+            if branch == cursor_branch:
+                return encode_cursor(ts, row_id)
+            return encode_cursor(ts, _MAX_ID if branch < cursor_branch else -1)
+
+        pages = await asyncio.gather(*(
+            self.shards[b].store.query_detections(limit=limit, cursor=shard_cursor(b),
+                                                  descending=descending, **filters)
+            for b in branches))
+        rows = [dict(row, branch=b) for b, (page, _) in zip(branches, pages) for row in page]
+        rows.sort(key=lambda r: (r['timestamp'], r['branch'], r['id']), reverse=descending)
+        more = len(rows) > limit or any(next_cursor for _, next_cursor in pages)
+        rows = rows[:limit]
+        next_cursor = None
+        if more and rows:
+            last = rows[-1]
+            next_cursor = encode_global_cursor(last['timestamp'], last['branch'], last['id'])
+        return rows, next_cursor
+
+    async def query_rollups(self, **filters):
+        self.discover()
+        branches = sorted(self.shards)
+        results = await asyncio.gather(*(self.shards[b].store.query_rollups(**filters) for b in branches))
+        return [dict(row, branch=b) for b, rows in zip(branches, results) for row in rows]
+
+    def stats(self) -> dict:
+        return {'rejected': self.rejected, 'branches': {b: s.stats() for b, s in self.shards.items()}}
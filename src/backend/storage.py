@@ -0,0 +1,683 @@
+import base64
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import (create_engine, event, func, select, text, tuple_, MetaData, Table, Column,
+                        Integer, Float, String)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.partitions import (DETECTION_FIELDS, day_bounds, day_of, detection_columns, drop_partition,
+                                ensure_partitions, frame_columns, list_partitions, partition_tables)
+
+DATABASE_PATH = os.environ.get('MOTTU_DB_PATH', './detections.db')
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# Pragmas applied to every connection. WAL lets the dashboard read while the
+# ingest path writes; synchronous=NORMAL is durable across process crashes in WAL mode.
+CACHE_SIZE_KB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+# Stay well below SQLite's bound-parameter limit in IN (...) lookups
+MAX_IN_PARAMS = 500
+
+DEFAULT_CAMERA = 'default'
+DEFAULT_BRANCH = 'default'
+MAX_PAGE_SIZE = 5000
+
+metadata = MetaData()
+
+# Raw rows are stored in day partitions (see partitions.py). ``frames`` and
+# ``detections`` are the UNION ALL views over them, used for reads that span days.
+
+# One row per published frame (including empty heartbeat frames)
+frames = Table('frames', metadata, *frame_columns())
+
+# One row per detected object; camera/timestamp are copied from the frame so
+# range and aggregate queries never need a join.
+detections = Table('detections', metadata, *detection_columns())
+
+# Frame and detection ids are allocated here so they stay unique across partitions
+id_sequences = Table(
+    'id_sequences', metadata,
+    Column('name', String(32), primary_key=True),
+    Column('next_id', Integer, nullable=False),
+)
+
+# Idempotency keys of stored frames across every day partition: a retried frame
+# may carry a new timestamp and so route to another day. A key is forgotten when
+# its frame's partition expires.
+frame_keys = Table(
+    'frame_keys', metadata,
+    Column('idempotency_key', String(128), primary_key=True),
+    Column('frame_id', Integer, nullable=False),
+    Column('day', Integer, nullable=False, index=True),
+    sqlite_with_rowid=False,
+)
+
+# Rollup bucket sizes in seconds
+ROLLUP_BUCKETS = {'minute': 60, 'hour': 3600}
+
+# Per-bucket aggregates by camera and zone, maintained by insert_payloads in
+# the same transaction as the raw rows. Missing zones are stored as ''.
+detection_rollups = Table(
+    'detection_rollups', metadata,
+    Column('bucket_s', Integer, primary_key=True),
+    Column('camera', String(64), primary_key=True),
+    Column('zone', String(32), primary_key=True),
+    Column('bucket', Integer, primary_key=True),
+    Column('detections', Integer, nullable=False),
+    Column('confidence_sum', Float, nullable=False),
+    Column('confidence_n', Integer, nullable=False),
+    Column('tracks', Integer, nullable=False),
+)
+
+# Distinct track ids seen per rollup bucket, used to keep ``tracks`` exact
+rollup_tracks = Table(
+    'rollup_tracks', metadata,
+    Column('bucket_s', Integer, primary_key=True),
+    Column('camera', String(64), primary_key=True),
+    Column('zone', String(32), primary_key=True),
+    Column('bucket', Integer, primary_key=True),
+    Column('track_id', String(64), primary_key=True),
+    sqlite_with_rowid=False,
+)
+
+# Sensor telemetry (mottu/sensors), one narrow row per reading
+telemetry = Table(
+    'telemetry', metadata,
+    Column('sensor_id', String(64), primary_key=True),
+    Column('ts', Float, primary_key=True),
+    Column('lat', Float),
+    Column('lon', Float),
+    Column('battery', Float),
+    Column('status', String(32)),
+    Column('fuel', Float),
+    Column('engine_temp', Float),
+    Column('speed', Float),
+    sqlite_with_rowid=False,
+)
+
+
+def _configure_connection(dbapi_conn, readonly):
+    cur = dbapi_conn.cursor()
+    if not readonly:
+        cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute('PRAGMA synchronous=NORMAL')
+    cur.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    cur.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    cur.execute('PRAGMA temp_store=MEMORY')
+    cur.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    if readonly:
+        cur.execute('PRAGMA query_only=1')
+    cur.close()
+
+
+def _sqlite_engine(path, readonly=False, **kwargs):
+    engine = create_engine(f'sqlite:///{path}', connect_args={"check_same_thread": False}, **kwargs)
+    event.listen(engine, 'connect', lambda conn, _: _configure_connection(conn, readonly))
+    return engine
+
+
+def _async_sqlite_engine(path, readonly=False, **kwargs):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{path}', **kwargs)
+    event.listen(engine.sync_engine, 'connect', lambda conn, _: _configure_connection(conn, readonly))
+    return engine
+
+
+def run_migrations(engine):
+    """Upgrade the database behind ``engine`` to the latest Alembic revision."""
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config()
+    cfg.set_main_option('script_location', MIGRATIONS_DIR)
+    with engine.begin() as conn:
+        cfg.attributes['connection'] = conn
+        command.upgrade(cfg, 'head')
+
+
+def detection_to_row(det, frame_id, camera, timestamp):
+    """Flatten one detection dict from a frame payload into a ``detections`` row."""
+    bbox = det.get('bbox') or [None, None, None, None]
+    centroid = det.get('centroid') or det.get('center')
+    if centroid is None and None not in bbox:
+        centroid = [int((bbox[0] + bbox[2]) / 2), int((bbox[1] + bbox[3]) / 2)]
+    centroid = centroid or [None, None]
+    track_id = det.get('track_id', det.get('id'))
+    return {
+        'frame_id': frame_id,
+        'camera': camera,
+        'timestamp': timestamp,
+        'track_id': str(track_id) if track_id is not None else None,
+        'zone': det.get('zone', det.get('zona_patio')),
+        'class_name': det.get('class', det.get('class_name')),
+        'confidence': det.get('confidence', det.get('conf')),
+        'x1': bbox[0], 'y1': bbox[1], 'x2': bbox[2], 'y2': bbox[3],
+        'cx': centroid[0], 'cy': centroid[1],
+    }
+
+
+def message_key(payload):
+    """Dedup key of a frame: the sender's ``idempotency_key``, else camera + seq + timestamp.
+
+    Frames with neither an explicit key nor a sequence number get None and
+    are never deduplicated.
+    """
+    key = payload.get('idempotency_key')
+    if key is None and payload.get('seq') is not None and payload.get('timestamp') is not None:
+        key = f"{payload.get('camera') or DEFAULT_CAMERA}:{payload['seq']}:{payload['timestamp']!r}"
+    return key
+
+
+def payload_to_frame(payload, received_at):
+    return {
+        'camera': payload.get('camera') or DEFAULT_CAMERA,
+        'timestamp': payload.get('timestamp', received_at),
+        'received_at': received_at,
+        'n_detections': len(payload.get('detections') or []),
+        'idempotency_key': message_key(payload),
+    }
+
+
+def telemetry_to_row(msg, received_at):
+    """Flatten one sensor message into a ``telemetry`` row, or None if it has no sensor id.
+
+    Accepts the mqtt_publisher shape (sensor_id, gps lat/lon, battery) and the
+    MottuIoTSimulator one (moto_id, ISO timestamp, sensor_data with battery,
+    fuel, engine_temp and speed).
+    """
+    sensor_id = msg.get('sensor_id', msg.get('moto_id'))
+    if sensor_id is None:
+        return None
+    data = msg.get('sensor_data') or msg
+    ts = msg.get('timestamp', received_at)
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts).timestamp()
+    gps = data.get('gps') or {}
+    return {
+        'sensor_id': str(sensor_id),
+        'ts': float(ts),
+        'lat': gps.get('lat'),
+        'lon': gps.get('lon'),
+        'battery': data.get('battery', data.get('battery_level')),
+        'status': data.get('status', msg.get('status')),
+        'fuel': data.get('fuel', data.get('fuel_level')),
+        'engine_temp': data.get('engine_temp'),
+        'speed': data.get('speed'),
+    }
+
+
+# Operations below take a sync Connection so the same code serves both
+# DetectionStore and AsyncDetectionStore (through AsyncConnection.run_sync).
+
+def insert_payloads(conn, payloads):
+    """Persist many frame payloads within the caller's transaction.
+
+    Rows are routed to the day partition of their timestamp; each partition
+    gets one executemany for its frames and one for their detections, with
+    ids allocated up front from ``id_sequences``. Payloads whose
+    ``idempotency_key`` is already in ``frame_keys`` (on any day, or repeated
+    earlier in the same batch) are skipped. Keys are claimed with ON CONFLICT
+    DO NOTHING before the frames are written, so a copy committed meanwhile
+    by another process sharing the file is skipped too instead of failing the
+    batch. Returns one ``(frame_id, created)`` pair per payload, plus the
+    rollup rows the batch changed.
+    """
+    if not payloads:
+        return [], []
+    now = time.time()
+    frame_rows = [payload_to_frame(p, now) for p in payloads]
+    for f in frame_rows:
+        f['day'] = day_of(f['timestamp'])
+    ensure_partitions(conn, sorted({f['day'] for f in frame_rows}))
+    known = _existing_keys(conn, frame_rows)
+    new = []
+    for i, frame in enumerate(frame_rows):
+        key = frame['idempotency_key']
+        if key is None or key not in known:
+            new.append(i)
+            if key is not None:
+                known[key] = None  # resolved to the new id below
+    results = [None] * len(frame_rows)
+    rollups = []
+    if new:
+        next_id = allocate_ids(conn, 'frames', len(new))
+        for i in new:
+            frame_rows[i]['id'] = next_id
+            next_id += 1
+        claims = [{'idempotency_key': frame_rows[i]['idempotency_key'], 'frame_id': frame_rows[i]['id'],
+                   'day': frame_rows[i]['day']} for i in new if frame_rows[i]['idempotency_key'] is not None]
+        if claims:
+            stmt = sqlite_insert(frame_keys).on_conflict_do_nothing().returning(frame_keys.c.idempotency_key)
+            claimed = set(conn.execute(stmt, claims).scalars())
+            if len(claimed) < len(claims):
+                # Committed by another writer since _existing_keys looked
+                known.update(_existing_keys(conn, [c for c in claims if c['idempotency_key'] not in claimed]))
+                new = [i for i in new
+                       if frame_rows[i]['idempotency_key'] is None or frame_rows[i]['idempotency_key'] in claimed]
+        by_day = {}
+        for i in new:
+            results[i] = (frame_rows[i]['id'], True)
+            if frame_rows[i]['idempotency_key'] is not None:
+                known[frame_rows[i]['idempotency_key']] = frame_rows[i]['id']
+            by_day.setdefault(frame_rows[i].pop('day'), []).append(frame_rows[i])
+        for day, day_frames in by_day.items():
+            conn.execute(partition_tables(day)[0].insert(), day_frames)
+        det_rows = [
+            detection_to_row(det, frame_rows[i]['id'], frame_rows[i]['camera'], frame_rows[i]['timestamp'])
+            for i in new
+            for det in payloads[i].get('detections') or []
+        ]
+        next_id = allocate_ids(conn, 'detections', len(det_rows))
+        for offset, row in enumerate(det_rows):
+            row['id'] = next_id + offset
+        by_day = {}
+        for row in det_rows:
+            by_day.setdefault(day_of(row['timestamp']), []).append(row)
+        for day, day_dets in by_day.items():
+            conn.execute(partition_tables(day)[1].insert(), day_dets)
+        if det_rows:
+            rollups = update_rollups(conn, det_rows)
+    for i, frame in enumerate(frame_rows):
+        if results[i] is None:
+            results[i] = (known[frame['idempotency_key']], False)
+    return results, rollups
+
+
+def allocate_ids(conn, name, n):
+    """Reserve ``n`` consecutive ids for ``name``; returns the first one."""
+    if n == 0:
+        return 0
+    next_id = conn.execute(
+        text('UPDATE id_sequences SET next_id = next_id + :n WHERE name = :name RETURNING next_id'),
+        {'n': n, 'name': name}).scalar_one()
+    return next_id - n
+
+
+def update_rollups(conn, det_rows):
+    """Fold a batch of detection rows into the minute/hour rollups.
+
+    The batch is pre-aggregated in Python so each touched bucket costs one
+    upsert; distinct track counts are refreshed only for touched buckets.
+    Returns the updated rollup rows.
+    """
+    agg = {}
+    members = set()
+    for r in det_rows:
+        for size in ROLLUP_BUCKETS.values():
+            key = (size, r['camera'], r['zone'] or '', int(r['timestamp'] // size) * size)
+            a = agg.get(key)
+            if a is None:
+                a = agg[key] = [0, 0.0, 0]
+            a[0] += 1
+            if r['confidence'] is not None:
+                a[1] += r['confidence']
+                a[2] += 1
+            if r['track_id'] is not None:
+                members.add(key + (r['track_id'],))
+    if not agg:
+        return []
+    keys = ('bucket_s', 'camera', 'zone', 'bucket')
+    upsert = sqlite_insert(detection_rollups)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            'detections': detection_rollups.c.detections + upsert.excluded.detections,
+            'confidence_sum': detection_rollups.c.confidence_sum + upsert.excluded.confidence_sum,
+            'confidence_n': detection_rollups.c.confidence_n + upsert.excluded.confidence_n,
+        })
+    conn.execute(upsert, [
+        dict(zip(keys, key), detections=n, confidence_sum=conf_sum, confidence_n=conf_n, tracks=0)
+        for key, (n, conf_sum, conf_n) in agg.items()])
+    if members:
+        conn.execute(sqlite_insert(rollup_tracks).on_conflict_do_nothing(),
+                     [dict(zip(keys + ('track_id',), m)) for m in members])
+    conn.execute(text(
+        'UPDATE detection_rollups SET tracks = (SELECT COUNT(*) FROM rollup_tracks t '
+        'WHERE t.bucket_s = :bucket_s AND t.camera = :camera AND t.zone = :zone AND t.bucket = :bucket) '
+        'WHERE bucket_s = :bucket_s AND camera = :camera AND zone = :zone AND bucket = :bucket'),
+        [dict(zip(keys, key)) for key in agg])
+    return _rollup_rows(conn, list(agg))
+
+
+def _rollup_rows(conn, keys):
+    r = detection_rollups.c
+    rows = []
+    for start in range(0, len(keys), MAX_IN_PARAMS // 4):
+        chunk = keys[start:start + MAX_IN_PARAMS // 4]
+        q = select(detection_rollups).where(tuple_(r.bucket_s, r.camera, r.zone, r.bucket).in_(chunk))
+        rows.extend(_rollup_out(row) for row in conn.execute(q))
+    return rows
+
+
+def _rollup_out(row):
+    d = dict(row._mapping)
+    d['granularity'] = 'minute' if d['bucket_s'] == 60 else 'hour'
+    d['zone'] = d['zone'] or None
+    d['avg_confidence'] = d['confidence_sum'] / d['confidence_n'] if d['confidence_n'] else None
+    return d
+
+
+def query_rollups(conn, granularity='minute', start=None, end=None, camera=None, zone=None):
+    """Precomputed per-bucket counts, distinct tracks and average confidence."""
+    r = detection_rollups.c
+    q = select(detection_rollups).where(r.bucket_s == ROLLUP_BUCKETS[granularity])
+    if camera is not None:
+        q = q.where(r.camera == camera)
+    if zone is not None:
+        q = q.where(r.zone == zone)
+    if start is not None:
+        q = q.where(r.bucket >= int(start // ROLLUP_BUCKETS[granularity]) * ROLLUP_BUCKETS[granularity])
+    if end is not None:
+        q = q.where(r.bucket < end)
+    return [_rollup_out(row) for row in conn.execute(q.order_by(r.bucket, r.camera, r.zone))]
+
+
+def _existing_keys(conn, rows):
+    """``{idempotency_key: frame_id}`` for the keys of ``rows`` that are already stored."""
+    keys = list({r['idempotency_key'] for r in rows if r['idempotency_key'] is not None})
+    k = frame_keys.c
+    found = {}
+    for start in range(0, len(keys), MAX_IN_PARAMS):
+        chunk = keys[start:start + MAX_IN_PARAMS]
+        q = select(k.idempotency_key, k.frame_id).where(k.idempotency_key.in_(chunk))
+        found.update((key, i) for key, i in conn.execute(q))
+    return found
+
+
+def _partitions_between(conn, start=None, end=None, descending=False):
+    days = list_partitions(conn)
+    if start is not None:
+        days = [d for d in days if d >= day_of(start)]
+    if end is not None:
+        days = [d for d in days if day_bounds(d)[0] < end]
+    return days[::-1] if descending else days
+
+
+# Aggregates below run entirely inside SQLite using the composite indexes
+
+def insert_telemetry(conn, rows):
+    """Insert telemetry rows; a repeated (sensor_id, ts) reading is ignored.
+
+    Returns the rows that were actually inserted (the first of any repeats).
+    """
+    if not rows:
+        return []
+    stmt = sqlite_insert(telemetry).on_conflict_do_nothing().returning(telemetry.c.sensor_id, telemetry.c.ts)
+    inserted = {(r.sensor_id, r.ts) for r in conn.execute(stmt, rows)}
+    out = []
+    for row in rows:
+        key = (row['sensor_id'], row['ts'])
+        if key in inserted:
+            inserted.discard(key)
+            out.append(row)
+    return out
+
+
+def query_telemetry(conn, sensor_id, start=None, end=None, limit=1000):
+    """Readings of one sensor in ``[start, end)``, oldest first."""
+    t = telemetry.c
+    q = select(telemetry).where(t.sensor_id == sensor_id)
+    if start is not None:
+        q = q.where(t.ts >= start)
+    if end is not None:
+        q = q.where(t.ts < end)
+    return [dict(r._mapping) for r in conn.execute(q.order_by(t.ts).limit(limit))]
+
+
+def recent_frames(conn, limit=200):
+    """Most recent frames by timestamp, reading partitions newest first."""
+    rows = []
+    for day in _partitions_between(conn, descending=True):
+        f = partition_tables(day)[0]
+        q = (select(f.c.id, f.c.camera, f.c.timestamp, f.c.n_detections)
+             .order_by(f.c.timestamp.desc()).limit(limit - len(rows)))
+        rows.extend(dict(r._mapping) for r in conn.execute(q))
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def count_frames(conn):
+    return conn.execute(select(func.count()).select_from(frames)).scalar_one()
+
+
+def counts_per_zone(conn, start=None, end=None, camera=None):
+    q = select(detections.c.zone, func.count().label('detections'),
+               func.count(detections.c.track_id.distinct()).label('tracks'))
+    q = _time_filter(q, detections, start, end, camera).group_by(detections.c.zone)
+    return [dict(r._mapping) for r in conn.execute(q)]
+
+
+def counts_per_track(conn, start=None, end=None, camera=None, limit=100):
+    q = select(detections.c.track_id, func.count().label('detections'),
+               func.min(detections.c.timestamp).label('first_seen'),
+               func.max(detections.c.timestamp).label('last_seen'))
+    q = (_time_filter(q, detections, start, end, camera).group_by(detections.c.track_id)
+         .order_by(func.count().desc()).limit(limit))
+    return [dict(r._mapping) for r in conn.execute(q)]
+
+
+def centroids_since(conn, start, camera=None):
+    """``(rows, watermark)``: ``(timestamp, cx, cy)`` of detections from ``start`` on.
+
+    Only frames up to ``watermark`` (the last frame id committed when the read
+    began) are returned, so a caller that also applies live batches can add
+    exactly the frames above it.
+    """
+    watermark = conn.execute(
+        text("SELECT next_id - 1 FROM id_sequences WHERE name = 'frames'")).scalar_one()
+    rows = []
+    for day in _partitions_between(conn, start):
+        t = partition_tables(day)[1]
+        q = select(t.c.timestamp, t.c.cx, t.c.cy).where(t.c.timestamp >= start, t.c.frame_id <= watermark,
+                                                         t.c.cx.is_not(None))
+        if camera is not None:
+            q = q.where(t.c.camera == camera)
+        rows.extend(conn.execute(q).all())
+    return rows, watermark
+
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns ``(timestamp, id)``; raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f'invalid cursor: {cursor!r}') from e
+
+
+def query_detections(conn, start=None, end=None, camera=None, zone=None, track_id=None,
+                     cursor=None, limit=500, fields=None, descending=False):
+    """One page of detections ordered by (timestamp, id), using keyset pagination.
+
+    The cursor encodes the (timestamp, id) of the last row returned, so every
+    page is a range seek on one of the (camera|zone|track_id, timestamp)
+    indexes instead of an OFFSET scan. Day partitions are visited in order
+    until the page is full. Returns ``(rows, next_cursor)``.
+    """
+    # Columns a client may project; id and timestamp always come back since they form the cursor
+    if fields:
+        unknown = set(fields) - set(DETECTION_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        names = ['id', 'timestamp'] + [f for f in fields if f not in ('id', 'timestamp')]
+    else:
+        names = DETECTION_FIELDS
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor is not None else None
+    # The cursor bounds which partitions can still hold rows for this page; ``hi`` is
+    # exclusive, so it must lie past the cursor's timestamp to keep the cursor's own day
+    lo, hi = start, end
+    if after is not None:
+        if descending:
+            hi = after[0] + 1 if hi is None else min(hi, after[0] + 1)
+        else:
+            lo = after[0] if lo is None else max(lo, after[0])
+
+    rows = []
+    for day in _partitions_between(conn, lo, hi, descending):
+        t = partition_tables(day)[1]
+        q = select(*[t.c[n] for n in names])
+        q = _time_filter(q, t, start, end, camera)
+        if zone is not None:
+            q = q.where(t.c.zone == zone)
+        if track_id is not None:
+            q = q.where(t.c.track_id == str(track_id))
+        key = tuple_(t.c.timestamp, t.c.id)
+        if after is not None:
+            q = q.where(key < after if descending else key > after)
+        if descending:
+            q = q.order_by(t.c.timestamp.desc(), t.c.id.desc())
+        else:
+            q = q.order_by(t.c.timestamp, t.c.id)
+        rows.extend(dict(r._mapping) for r in conn.execute(q.limit(limit + 1 - len(rows))))
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def _time_filter(q, table, start, end, camera):
+    if camera is not None:
+        q = q.where(table.c.camera == camera)
+    if start is not None:
+        q = q.where(table.c.timestamp >= start)
+    if end is not None:
+        q = q.where(table.c.timestamp < end)
+    return q
+
+
+# Retention: raw partitions expire after a number of days. Their detections are
+# already folded into the rollups at ingest, so expiring a day only drops the
+# partition and the per-track membership rows that kept distinct counts exact.
+
+def expired_partitions(conn, horizon):
+    """Partitions whose whole day lies before ``horizon`` (a timestamp)."""
+    return [d for d in list_partitions(conn) if day_bounds(d)[1] <= horizon]
+
+
+def expire_partition(conn, day):
+    """Drop one day partition along with the idempotency keys of its frames."""
+    drop_partition(conn, day)
+    conn.execute(frame_keys.delete().where(frame_keys.c.day == day))
+
+
+def prune_rollup_tracks(conn, before, limit):
+    """Delete up to ``limit`` track-membership rows for buckets before ``before``."""
+    return conn.execute(text(
+        'DELETE FROM rollup_tracks WHERE (bucket_s, camera, zone, bucket, track_id) IN ('
+        'SELECT bucket_s, camera, zone, bucket, track_id FROM rollup_tracks WHERE bucket < :before LIMIT :n)'),
+        {'before': before, 'n': limit}).rowcount
+
+
+def prune_rollups(conn, granularity, before, limit):
+    """Delete up to ``limit`` rollup rows of ``granularity`` for buckets before ``before``."""
+    return conn.execute(text(
+        'DELETE FROM detection_rollups WHERE rowid IN ('
+        'SELECT rowid FROM detection_rollups WHERE bucket_s = :s AND bucket < :before LIMIT :n)'),
+        {'s': ROLLUP_BUCKETS[granularity], 'before': before, 'n': limit}).rowcount
+
+
+class DetectionStore:
+    """SQLite storage shared by the backend and the dashboards.
+
+    Writes go through a single pooled connection so they never contend with
+    each other; reads use a separate read-only pool so dashboard queries run
+    against WAL snapshots without blocking ingest.
+    """
+
+    def __init__(self, path=DATABASE_PATH, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.write_engine = None
+        if not readonly:
+            self.write_engine = _sqlite_engine(path, pool_size=1, max_overflow=0)
+            run_migrations(self.write_engine)
+        self.read_engine = _sqlite_engine(path, readonly=True, pool_size=4, max_overflow=4)
+
+    def write(self, fn, *args, **kwargs):
+        """Run ``fn(conn, ...)`` in one write transaction."""
+        with self.write_engine.begin() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def read(self, fn, *args, **kwargs):
+        with self.read_engine.connect() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def insert_payloads(self, payloads):
+        return self.write(insert_payloads, payloads)
+
+    def recent_frames(self, limit=200):
+        return self.read(recent_frames, limit)
+
+    def count_frames(self):
+        return self.read(count_frames)
+
+    def counts_per_zone(self, start=None, end=None, camera=None):
+        return self.read(counts_per_zone, start, end, camera)
+
+    def counts_per_track(self, start=None, end=None, camera=None, limit=100):
+        return self.read(counts_per_track, start, end, camera, limit)
+
+    def query_detections(self, **filters):
+        return self.read(query_detections, **filters)
+
+    def query_rollups(self, **filters):
+        return self.read(query_rollups, **filters)
+
+    def close(self):
+        if self.write_engine is not None:
+            self.write_engine.dispose()
+        self.read_engine.dispose()
+
+
+class AsyncDetectionStore:
+    """Non-blocking counterpart of DetectionStore for the FastAPI backend.
+
+    Uses SQLAlchemy's async engine over aiosqlite with the same pragmas and
+    the same write/read pool split; each operation runs on the aiosqlite worker
+    thread so the event loop is never blocked by SQLite locks or fsyncs.
+    """
+
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        migrate_engine = _sqlite_engine(path, poolclass=NullPool)
+        run_migrations(migrate_engine)
+        migrate_engine.dispose()
+        self.write_engine = _async_sqlite_engine(path, pool_size=1, max_overflow=0)
+        self.read_engine = _async_sqlite_engine(path, readonly=True, pool_size=4, max_overflow=4)
+
+    async def write(self, fn, *args, **kwargs):
+        async with self.write_engine.begin() as conn:
+            return await conn.run_sync(fn, *args, **kwargs)
+
+    async def read(self, fn, *args, **kwargs):
+        async with self.read_engine.connect() as conn:
+            return await conn.run_sync(fn, *args, **kwargs)
+
+    async def insert_payloads(self, payloads):
+        return await self.write(insert_payloads, payloads)
+
+    async def query_detections(self, **filters):
+        return await self.read(query_detections, **filters)
+
+    async def query_rollups(self, **filters):
+        return await self.read(query_rollups, **filters)
+
+    async def close(self):
+        await self.write_engine.dispose()
+        await self.read_engine.dispose()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from backend.ingest import BatchWriter
+from backend.storage import insert_telemetry, telemetry_to_row
+from backend.tsdb import TelemetryTSDB
+
+# Sensor readings are tiny, so batches can be much larger than detection frames
+TELEMETRY_BATCH = 5000
+TELEMETRY_QUEUE = 200000
+
+
+class TelemetryIngest:
+    """Batched persistence of sensor readings plus a latest-value cache per sensor.
+
+    Readings are normalized on arrival and queued on their own group-commit
+    writer, so a burst of sensor traffic never delays detection frames. After
+    each commit the newest reading of every sensor in the batch replaces the
+    cached one, which is what ``latest`` serves without touching the database,
+    and the batch is appended to the columnar ``tsdb`` used for long ranges.
+    """
+
+    def __init__(self, max_batch=TELEMETRY_BATCH, max_queue=TELEMETRY_QUEUE, tsdb=None):
+        self.store = None
+        self.tsdb = tsdb
+        self.writer = BatchWriter(self._persist, max_batch=max_batch, max_queue=max_queue)
+        self.latest_values = {}
+        self.rejected = 0
+
+    async def _persist(self, rows):
+        inserted = await self.store.write(insert_telemetry, rows)
+        if self.tsdb is not None and inserted:
+            # Replays ignored by the database must not be counted twice in the TSDB
+            full = self.tsdb.append(inserted)
+            if full:
+                # Chunk files are written in a worker thread, not on the event loop
+                await asyncio.to_thread(self.tsdb.seal, full)
+        latest = self.latest_values
+        for row in rows:
+            current = latest.get(row['sensor_id'])
+            if current is None or row['ts'] >= current['ts']:
+                latest[row['sensor_id']] = row
+        return [None] * len(rows)
+
+    def start(self, store):
+        """Start writing into ``store``; must be called from the running event loop."""
+        self.store = store
+        self.writer.start()
+
+    async def stop(self):
+        await self.writer.stop()
+        if self.tsdb is not None:
+            await asyncio.to_thread(self.tsdb.flush)
+
+    def submit(self, msg):
+        """Normalize and enqueue one sensor message (event loop only)."""
+        try:
+            row = telemetry_to_row(msg, time.time())
+        except (AttributeError, TypeError, ValueError):
+            row = None
+        if row is None:
+            self.rejected += 1
+            return False
+        return self.writer.submit(row)
+
+    def submit_threadsafe(self, msg):
+        self.writer.loop.call_soon_threadsafe(self.submit, msg)
+
+    def latest(self, sensor_id=None):
+        if sensor_id is not None:
+            return self.latest_values.get(sensor_id)
+        return list(self.latest_values.values())
+
+    def stats(self) -> dict:
+        tsdb = self.tsdb.stats() if self.tsdb is not None else None
+        return {**self.writer.stats(), 'rejected': self.rejected, 'sensors': len(self.latest_values), 'tsdb': tsdb}
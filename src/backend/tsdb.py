@@ -0,0 +1,336 @@
+"""Compressed columnar store for numeric sensor telemetry.
+
+Readings are buffered per sensor and sealed into immutable chunks of up to
+``CHUNK_POINTS`` points. A chunk stores its timestamps (in ms) as
+delta-of-deltas and each metric as fixed-point deltas, every array in the
+narrowest integer type that fits. Slowly changing signals (battery, fuel,
+a 1 Hz clock) therefore cost one or two bytes per point per column.
+
+Each sensor has an append-only ``<sensor>.seg`` file with the chunk bodies
+and a ``<sensor>.idx`` file of fixed-size records (time range, point count,
+offset). Range queries read the index, memory-map the segment and decode
+only the chunks that overlap, straight from the mapped pages with
+``np.frombuffer`` + ``np.cumsum``; optional downsampling is a vectorized
+group-by on ``ts // step``.
+
+Buffering happens on the event loop; a full head is detached and handed to
+``seal``, which does the file writes and is meant to run in a worker thread
+(``asyncio.to_thread``). Detached heads stay visible to reads until their
+chunk is indexed.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+from backend.storage import DATABASE_PATH
+
+TSDB_DIR = os.environ.get('MOTTU_TSDB_DIR', os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'tsdb'))
+# Points per sealed chunk; also bounds the unsealed buffer to CHUNK_POINTS x 7 float64 per sensor
+# (allocated on a sensor's first reading after each seal, so idle sensors hold none)
+CHUNK_POINTS = 256
+# Column -> fixed-point scale (value * scale is stored as an integer)
+METRICS = {
+    'battery': 100,
+    'fuel': 100,
+    'engine_temp': 100,
+    'speed': 100,
+    'lat': 10 ** 7,
+    'lon': 10 ** 7,
+}
+AGGREGATES = ('mean', 'min', 'max', 'last')
+
+INDEX_DTYPE = np.dtype([('t0', '<f8'), ('t1', '<f8'), ('n', '<u4'), ('offset', '<u8'), ('size', '<u4')])
+_INT_TYPES = [np.dtype('<i1'), np.dtype('<i2'), np.dtype('<i4'), np.dtype('<i8')]
+# n, t0 (ms), first delta (ms), delta-of-delta width
+_TS_HEADER = struct.Struct('<Iqqb')
+# first value, delta width (-1: column absent), has validity mask
+_COL_HEADER = struct.Struct('<qbb')
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def _narrow(values):
+    """``values`` (int64) as the smallest signed integer array that holds them; returns (code, array)."""
+    if not len(values):
+        return 0, values.astype(_INT_TYPES[0])
+    lo, hi = values.min(), values.max()
+    for code, dtype in enumerate(_INT_TYPES):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return code, values.astype(dtype)
+    return 3, values
+
+
+def encode_chunk(ts, columns):
+    """Serialize one chunk: ``ts`` in seconds (sorted) and ``{metric: float array with NaN for missing}``."""
+    n = len(ts)
+    ms = np.round(np.asarray(ts, dtype=np.float64) * 1000.0).astype(np.int64)
+    deltas = np.diff(ms)
+    first_delta = int(deltas[0]) if n > 1 else 0
+    code, dod = _narrow(np.diff(deltas))
+    parts = [_TS_HEADER.pack(n, int(ms[0]), first_delta, code)]
+    bodies = [dod.tobytes()]
+    for metric, scale in METRICS.items():
+        values = columns.get(metric)
+        if values is None or np.isnan(values).all():
+            parts.append(_COL_HEADER.pack(0, -1, 0))
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        if missing.any():
+            # Forward-fill gaps so they cost a zero delta; the mask restores them
+            idx = np.where(missing, 0, np.arange(n))
+            np.maximum.accumulate(idx, out=idx)
+            first = np.flatnonzero(~missing)[0]
+            values = values[np.maximum(idx, first)]
+        fixed = np.round(values * scale).astype(np.int64)
+        code, diffs = _narrow(np.diff(fixed))
+        parts.append(_COL_HEADER.pack(int(fixed[0]), code, int(missing.any())))
+        bodies.append(diffs.tobytes())
+        if missing.any():
+            bodies.append(np.packbits(missing).tobytes())
+    return b''.join(parts) + b''.join(bodies)
+
+
+def decode_chunk(buf, metrics=None):
+    """Inverse of ``encode_chunk``; ``buf`` may be a slice of a memory map. Returns (ts, columns)."""
+    n, t0, first_delta, ts_code = _TS_HEADER.unpack_from(buf, 0)
+    pos = _TS_HEADER.size
+    headers = []
+    for metric in METRICS:
+        headers.append((metric,) + _COL_HEADER.unpack_from(buf, pos))
+        pos += _COL_HEADER.size
+
+    dod = np.frombuffer(buf, dtype=_INT_TYPES[ts_code], count=max(n - 2, 0), offset=pos)
+    pos += dod.nbytes
+    ms = np.empty(n, dtype=np.int64)
+    ms[0] = t0
+    if n > 1:
+        deltas = np.empty(n - 1, dtype=np.int64)
+        deltas[0] = first_delta
+        np.cumsum(dod, dtype=np.int64, out=deltas[1:])
+        deltas[1:] += first_delta
+        np.cumsum(deltas, dtype=np.int64, out=ms[1:])
+        ms[1:] += t0
+    ts = ms / 1000.0
+
+    columns = {}
+    for metric, first, code, has_mask in headers:
+        if code < 0:
+            continue
+        diffs = np.frombuffer(buf, dtype=_INT_TYPES[code], count=n - 1, offset=pos)
+        pos += diffs.nbytes
+        mask = None
+        if has_mask:
+            mask_len = (n + 7) // 8
+            mask = np.unpackbits(np.frombuffer(buf, dtype=np.uint8, count=mask_len, offset=pos))[:n].astype(bool)
+            pos += mask_len
+        if metrics is not None and metric not in metrics:
+            continue
+        fixed = np.empty(n, dtype=np.int64)
+        fixed[0] = first
+        np.cumsum(diffs, dtype=np.int64, out=fixed[1:])
+        fixed[1:] += first
+        values = fixed / METRICS[metric]
+        if mask is not None:
+            values[mask] = np.nan
+        columns[metric] = values
+    return ts, columns
+
+
+def downsample(ts, columns, step, agg='mean'):
+    """Aggregate sorted points into ``step``-second buckets (NaNs are ignored)."""
+    buckets = np.floor(ts / step).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    out = {}
+    for metric, values in columns.items():
+        valid = ~np.isnan(values)
+        if agg == 'mean':
+            sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            counts = np.add.reduceat(valid.astype(np.int64), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[metric] = sums / counts
+        elif agg == 'min':
+            out[metric] = np.fmin.reduceat(values, starts)
+        elif agg == 'max':
+            out[metric] = np.fmax.reduceat(values, starts)
+        else:
+            ends = np.r_[starts[1:], len(values)] - 1
+            out[metric] = values[ends]
+    return buckets[starts] * step, out
+
+
+class _Series:
+    """On-disk chunks plus the unsealed head buffer of one sensor.
+
+    The head is a (chunk_points, 1 + len(METRICS)) array: ts, then one column per metric,
+    allocated on the first reading (None while empty).
+    """
+
+    def __init__(self, stem, directory, chunk_points):
+        self.seg_path = os.path.join(directory, stem + '.seg')
+        self.idx_path = os.path.join(directory, stem + '.idx')
+        self.index = np.fromfile(self.idx_path, dtype=INDEX_DTYPE) if os.path.exists(self.idx_path) \
+            else np.empty(0, dtype=INDEX_DTYPE)
+        self.chunk_points = chunk_points
+        self.seg_size = os.path.getsize(self.seg_path) if os.path.exists(self.seg_path) else 0
+        self.head = None
+        self.count = 0
+        # Detached heads not yet written; index/sealing/_map change together under _lock
+        self.sealing = []
+        self._map = None
+        self._lock = threading.Lock()
+
+    def add(self, row):
+        """Buffer one reading; returns True when the head is full."""
+        if self.head is None:
+            self.head = np.empty((self.chunk_points, 1 + len(METRICS)))
+        line = self.head[self.count]
+        line[0] = row['ts']
+        for i, metric in enumerate(METRICS, 1):
+            value = row.get(metric)
+            line[i] = np.nan if value is None else value
+        self.count += 1
+        return self.count == len(self.head)
+
+    def detach(self):
+        """Take the buffered points out of the head for ``write_chunk``; new readings start a new head."""
+        head = self.head[:self.count]
+        with self._lock:
+            self.sealing.append(head)
+            self.head = None
+            self.count = 0
+        return head
+
+    def write_chunk(self, head):
+        """Append ``head`` (from ``detach``) as a chunk; blocking file I/O. Returns the bytes written."""
+        points = head[np.argsort(head[:, 0], kind='stable')]
+        ts = points[:, 0]
+        columns = {m: points[:, i] for i, m in enumerate(METRICS, 1)}
+        body = encode_chunk(ts, columns)
+        with open(self.seg_path, 'ab') as f:
+            f.write(body)
+        record = np.array([(ts[0], ts[-1], len(ts), self.seg_size, len(body))], dtype=INDEX_DTYPE)
+        self.seg_size += len(body)
+        # Index after data: a crash between the two leaves only unreferenced bytes
+        with open(self.idx_path, 'ab') as f:
+            f.write(record.tobytes())
+        with self._lock:
+            self.index = np.concatenate([self.index, record])
+            self.sealing = [h for h in self.sealing if h is not head]
+            self._map = None
+        return len(body) + record.nbytes
+
+    def segment(self):
+        if self._map is None:
+            self._map = np.memmap(self.seg_path, dtype=np.uint8, mode='r')
+        return self._map
+
+    def read(self, start, end, metrics):
+        ts_parts, col_parts = [], {m: [] for m in metrics}
+        with self._lock:
+            index, sealing = self.index, list(self.sealing)
+            seg = self.segment() if len(index) else None
+        hits = index[(index['t1'] >= start) & (index['t0'] < end)]
+        if len(hits):
+            for rec in hits:
+                ts, cols = decode_chunk(seg[rec['offset']:rec['offset'] + rec['size']], metrics)
+                ts_parts.append(ts)
+                for m in metrics:
+                    col_parts[m].append(cols.get(m, np.full(len(ts), np.nan)))
+        heads = sealing + ([self.head[:self.count]] if self.count else [])
+        for head in heads:
+            ts_parts.append(head[:, 0])
+            for m in metrics:
+                col_parts[m].append(head[:, 1 + list(METRICS).index(m)])
+        if not ts_parts:
+            return np.empty(0), {m: np.empty(0) for m in metrics}
+        ts = np.concatenate(ts_parts)
+        keep = (ts >= start) & (ts < end)
+        ts = ts[keep]
+        columns = {m: np.concatenate(col_parts[m])[keep] for m in metrics}
+        # Chunks are normally sealed in time order; only late data needs a sort
+        if len(ts) > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind='stable')
+            ts = ts[order]
+            columns = {m: v[order] for m, v in columns.items()}
+        return ts, columns
+
+
+class TelemetryTSDB:
+    """Per-sensor columnar telemetry with a range + downsampling query API."""
+
+    def __init__(self, directory=TSDB_DIR, chunk_points=CHUNK_POINTS):
+        self.directory = directory
+        self.chunk_points = chunk_points
+        self.series = {}
+        os.makedirs(directory, exist_ok=True)
+        # Listed once here, then kept current by seal
+        self._disk_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        self._seal_lock = threading.Lock()
+
+    def _series(self, sensor_id, create=True):
+        """The series of ``sensor_id``; with ``create=False``, None unless it has data in memory or on disk."""
+        series = self.series.get(sensor_id)
+        if series is None:
+            # Sensor ids become file names; anything unusual is hashed
+            stem = sensor_id if _SAFE_NAME.match(sensor_id) else 'h' + hashlib.sha1(sensor_id.encode()).hexdigest()
+            if not create and not os.path.exists(os.path.join(self.directory, stem + '.idx')):
+                return None
+            series = self.series[sensor_id] = _Series(stem, self.directory, self.chunk_points)
+        return series
+
+    def append(self, rows):
+        """Buffer telemetry rows (dicts with sensor_id, ts and metric columns).
+
+        Returns the heads that filled up, detached and ready for ``seal``.
+        """
+        full = []
+        for row in rows:
+            series = self._series(row['sensor_id'])
+            if series.add(row):
+                full.append((series, series.detach()))
+        return full
+
+    def seal(self, full):
+        """Write detached heads as chunks; blocking, so run it off the event loop."""
+        with self._seal_lock:
+            for series, head in full:
+                self._disk_bytes += series.write_chunk(head)
+
+    def flush(self):
+        """Seal every head buffer, e.g. on shutdown."""
+        self.seal([(series, series.detach()) for series in list(self.series.values()) if series.count])
+
+    def query(self, sensor_id, start=None, end=None, metrics=None, step=None, agg='mean'):
+        """Points of one sensor in ``[start, end)``, optionally downsampled to ``step`` seconds.
+
+        Returns ``{'ts': [...], metric: [...]}`` with None for missing values.
+        """
+        metrics = [m for m in (metrics or METRICS) if m in METRICS]
+        # Reads never register a sensor: unknown ids (e.g. typos, scans) cost nothing
+        series = self._series(sensor_id, create=False)
+        if series is None:
+            return {'ts': [], **{m: [] for m in metrics}}
+        ts, columns = series.read(-np.inf if start is None else start, np.inf if end is None else end, metrics)
+        if step and len(ts):
+            ts, columns = downsample(ts, columns, step, agg)
+        out = {'ts': ts.tolist()}
+        for m, values in columns.items():
+            out[m] = np.where(np.isnan(values), None, values).tolist()
+        return out
+
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    def stats(self) -> dict:
+        return {
+            'sensors': len(self.series),
+            'chunks': int(sum(len(s.index) for s in self.series.values())),
+            'buffered_points': sum(s.count for s in self.series.values()),
+            'disk_bytes': self.disk_bytes(),
+        }
@@ -0,0 +1,204 @@
+"""Wire formats for detection frames and sensor messages.
+
+JSON stays the default and the fallback. The compact format is MessagePack
+with the per-detection fields of a frame stored column-wise: ids, bboxes,
+centroids and confidences as little-endian fixed-width arrays, and class /
+zone names dictionary-encoded. Key names are therefore sent once per frame
+instead of once per box. Non-frame payloads (e.g. sensor telemetry) are sent
+as plain MessagePack maps.
+
+Publishers pick a format and mark it with ``TOPIC_SUFFIX`` on MQTT or with
+``CONTENT_TYPES`` over HTTP; ``decode`` also sniffs the first byte when
+neither is given.
+"""
+
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # optional: without it everything is JSON
+    msgpack = None
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+CONTENT_TYPES = {JSON: 'application/json', MSGPACK: 'application/x-msgpack'}
+TOPIC_SUFFIX = '/mpk'
+
+FORMAT_VERSION = 1
+# Confidences travel as uint16 in units of 1/CONF_SCALE
+CONF_SCALE = 10000
+_DETECTION_KEYS = {'id', 'bbox', 'centroid', 'class', 'confidence', 'zone'}
+
+
+def available_formats():
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def resolve_format(fmt):
+    """The format that will actually be used for ``fmt`` (JSON if msgpack is missing)."""
+    return MSGPACK if fmt == MSGPACK and msgpack is not None else JSON
+
+
+def topic_for(topic, fmt):
+    return topic + TOPIC_SUFFIX if resolve_format(fmt) == MSGPACK else topic
+
+
+# Detection topics: mottu/{branch}/{camera}/detections (plus TOPIC_SUFFIX when compact)
+TOPIC_ROOT = 'mottu'
+DETECTIONS_LEAF = 'detections'
+
+
+def detections_topic(branch, camera):
+    return f'{TOPIC_ROOT}/{branch}/{camera}/{DETECTIONS_LEAF}'
+
+
+def parse_detections_topic(topic):
+    """``(branch, camera)`` from a per-branch detections topic, or None for any other topic."""
+    if topic.endswith(TOPIC_SUFFIX):
+        topic = topic[:-len(TOPIC_SUFFIX)]
+    parts = topic.split('/')
+    if len(parts) == 4 and parts[0] == TOPIC_ROOT and parts[3] == DETECTIONS_LEAF:
+        return parts[1], parts[2]
+    return None
+
+
+def encode(payload, fmt=MSGPACK) -> bytes:
+    if resolve_format(fmt) == JSON:
+        return json.dumps(payload).encode()
+    if isinstance(payload, list):
+        payload = [_pack_frame(p) if _is_frame(p) else p for p in payload]
+    elif _is_frame(payload):
+        payload = _pack_frame(payload)
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def decode(data, content_type=None, topic=None):
+    """Decode a message body; the format comes from content type, topic suffix or the first byte."""
+    if _is_msgpack(data, content_type, topic):
+        if msgpack is None:
+            raise ValueError('received a MessagePack message but msgpack is not installed')
+        obj = msgpack.unpackb(data, raw=False)
+        try:
+            if isinstance(obj, list):
+                return [_unpack_frame(o) if _is_packed_frame(o) else o for o in obj]
+            return _unpack_frame(obj) if _is_packed_frame(obj) else obj
+        except (KeyError, IndexError, TypeError, AttributeError, struct.error) as e:
+            # Missing or mistyped columns are bad client input, like invalid JSON
+            raise ValueError(f'malformed packed frame: {e!r}') from e
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode()
+    return json.loads(data)
+
+
+def _is_msgpack(data, content_type, topic):
+    if content_type:
+        return content_type.split(';')[0].strip() in ('application/x-msgpack', 'application/msgpack')
+    if topic is not None:
+        return topic.endswith(TOPIC_SUFFIX)
+    head = data[:1]
+    return bool(head) and head not in (b'{', b'[', b' ', b'\t', b'\r', b'\n')
+
+
+def _is_frame(payload):
+    return isinstance(payload, dict) and isinstance(payload.get('detections'), list)
+
+
+def _is_packed_frame(obj):
+    return isinstance(obj, dict) and obj.get('_v') == FORMAT_VERSION
+
+
+def _int_array(values):
+    """Pack ints as int16 when they fit, else int32; returns (typecode, bytes)."""
+    code = 'h' if all(-32768 <= v <= 32767 for v in values) else 'i'
+    return code, struct.pack(f'<{len(values)}{code}', *values)
+
+
+def _int_list(value, length):
+    return isinstance(value, list) and len(value) == length and all(isinstance(v, int) for v in value)
+
+
+def _dictionary(values):
+    index = {}
+    codes = bytes(index.setdefault(v, len(index)) % 256 for v in values)
+    return list(index), codes
+
+
+def _pack_frame(payload):
+    dets = payload['detections']
+    frame = {k: v for k, v in payload.items() if k != 'detections'}
+    frame['_v'] = FORMAT_VERSION
+    frame['n'] = len(dets)
+
+    # Only regular detections are packed column-wise: every detection has the same
+    # keys (so absent fields stay absent) and integer boxes/centroids. Anything else
+    # is sent as is.
+    keys = set(dets[0]) if dets else set()
+    regular = 'bbox' in keys and keys <= _DETECTION_KEYS and all(
+        set(d) == keys and _int_list(d['bbox'], 4) and ('centroid' not in keys or _int_list(d['centroid'], 2))
+        for d in dets)
+    if not regular:
+        frame['detections'] = dets
+        return frame
+
+    if 'id' in keys:
+        ids = [d['id'] for d in dets]
+        frame['ids'] = _int_array(ids) if all(isinstance(i, int) for i in ids) else ids
+    frame['box'] = _int_array([v for d in dets for v in d['bbox']])
+    if 'centroid' in keys:
+        frame['cen'] = _int_array([v for d in dets for v in d['centroid']])
+    if 'confidence' in keys:
+        confs = [d['confidence'] for d in dets]
+        if all(isinstance(c, (int, float)) and 0 <= c <= 1 for c in confs):
+            frame['cf'] = struct.pack(f'<{len(confs)}H', *(round(c * CONF_SCALE) for c in confs))
+        else:
+            frame['cfl'] = confs
+    for key, short in (('class', 'cls'), ('zone', 'zn')):
+        if key in keys:
+            names, index = _dictionary([d[key] for d in dets])
+            frame[short] = [names, index] if len(names) <= 256 else [d.get(key) for d in dets]
+    return frame
+
+
+def _unpack_int_array(packed):
+    code, raw = packed
+    return list(struct.unpack(f'<{len(raw) // struct.calcsize(code)}{code}', raw))
+
+
+def _unpack_names(packed):
+    if len(packed) == 2 and isinstance(packed[1], (bytes, bytearray)):
+        names, index = packed
+        return [names[i] for i in index]
+    return packed
+
+
+def _unpack_frame(frame):
+    n = frame.pop('n')
+    frame.pop('_v')
+    if 'detections' in frame:
+        return frame
+    box = _unpack_int_array(frame.pop('box'))
+    dets = [{'bbox': box[4 * i:4 * i + 4]} for i in range(n)]
+    # Frames whose detections carry no id have no 'ids' column
+    ids = frame.pop('ids', None)
+    if ids is not None:
+        ids = _unpack_int_array(ids) if len(ids) == 2 and isinstance(ids[1], bytes) else ids
+        for d, i in zip(dets, ids):
+            d['id'] = i
+    if 'cen' in frame:
+        cen = _unpack_int_array(frame.pop('cen'))
+        for i, d in enumerate(dets):
+            d['centroid'] = cen[2 * i:2 * i + 2]
+    if 'cf' in frame:
+        confs = [c / CONF_SCALE for c in struct.unpack(f'<{n}H', frame.pop('cf'))]
+    else:
+        confs = frame.pop('cfl', None)
+    if confs is not None:
+        for d, c in zip(dets, confs):
+            d['confidence'] = c
+    for key, short in (('class', 'cls'), ('zone', 'zn')):
+        if short in frame:
+            for d, v in zip(dets, _unpack_names(frame.pop(short))):
+                d[key] = v
+    frame['detections'] = dets
+    return frame
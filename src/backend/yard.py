@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import time
+
+from backend.storage import DEFAULT_BRANCH, DEFAULT_CAMERA, DATABASE_PATH
+
+SNAPSHOT_PATH = os.environ.get('MOTTU_YARD_SNAPSHOT',
+                               os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'yard_state.json'))
+SNAPSHOT_INTERVAL_S = 30
+# Motos not seen for this long are forgotten
+LAST_SEEN_TTL_S = 7 * 86400
+
+
+class YardState:
+    """In-memory "what is in the yard right now" model, one entry per branch.
+
+    Each camera's current tracks are the detections of its latest frame; zone
+    occupancy is kept as running counts that are adjusted by the difference
+    between a camera's previous and new frame, and every track keeps its
+    last-seen time, camera and zone. ``apply_batch`` is called by the ingest
+    writer on the event loop after each commit, so reads never take a lock.
+    The rendered state of a branch is cached until the branch changes again.
+    """
+
+    def __init__(self, snapshot_path=SNAPSHOT_PATH, snapshot_interval=SNAPSHOT_INTERVAL_S,
+                 last_seen_ttl=LAST_SEEN_TTL_S):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.last_seen_ttl = last_seen_ttl
+        self.branches = {}
+        self._views = {}
+        self._task = None
+        self._stats = {'frames': 0, 'stale_frames': 0, 'snapshots': 0, 'snapshot_ms': 0.0}
+
+    def _branch(self, name):
+        branch = self.branches.get(name)
+        if branch is None:
+            branch = self.branches[name] = {'cameras': {}, 'zones': {}, 'last_seen': {}, 'updated_at': None}
+        return branch
+
+    def apply(self, payload):
+        """Fold one frame into its branch; frames older than the camera's current one are ignored."""
+        branch_name = payload.get('branch') or DEFAULT_BRANCH
+        camera_name = payload.get('camera') or DEFAULT_CAMERA
+        timestamp = payload.get('timestamp', time.time())
+        branch = self._branch(branch_name)
+        camera = branch['cameras'].get(camera_name)
+        if camera is not None and timestamp < camera['timestamp']:
+            self._stats['stale_frames'] += 1
+            return
+
+        tracks = {}
+        for det in payload.get('detections') or []:
+            # Same identity rule as storage.detection_to_row: track_id first, then id
+            track_id = det.get('track_id', det.get('id'))
+            if track_id is None:
+                continue
+            tracks[str(track_id)] = {
+                'zone': det.get('zone', det.get('zona_patio')),
+                'class': det.get('class', det.get('class_name')),
+                'confidence': det.get('confidence', det.get('conf')),
+                'bbox': det.get('bbox'),
+            }
+
+        zones = branch['zones']
+        if camera is not None:
+            for t in camera['tracks'].values():
+                zones[t['zone']] -= 1
+                if not zones[t['zone']]:
+                    del zones[t['zone']]
+        for track_id, t in tracks.items():
+            zones[t['zone']] = zones.get(t['zone'], 0) + 1
+            branch['last_seen'][track_id] = {'timestamp': timestamp, 'camera': camera_name, 'zone': t['zone']}
+        branch['cameras'][camera_name] = {'timestamp': timestamp, 'tracks': tracks}
+        branch['updated_at'] = timestamp
+        self._views.pop(branch_name, None)
+        self._stats['frames'] += 1
+
+    def apply_batch(self, payloads, acks):
+        for payload, (_, created) in zip(payloads, acks):
+            if created:
+                self.apply(payload)
+
+    def state(self, branch_name):
+        """JSON-ready state of one branch, or None if nothing was seen for it."""
+        view = self._views.get(branch_name)
+        if view is None:
+            branch = self.branches.get(branch_name)
+            if branch is None:
+                return None
+            view = self._views[branch_name] = {
+                'branch': branch_name,
+                'updated_at': branch['updated_at'],
+                'cameras': {name: {'timestamp': c['timestamp'], 'tracks': c['tracks']}
+                            for name, c in branch['cameras'].items()},
+                # JSON object keys must be strings: detections without a zone count under ''
+                'zones': {('' if z is None else z): n for z, n in branch['zones'].items()},
+                'occupancy': sum(branch['zones'].values()),
+                'last_seen': branch['last_seen'],
+            }
+        return view
+
+    def expire(self, now=None):
+        """Forget tracks that have not been seen for ``last_seen_ttl`` seconds."""
+        horizon = (time.time() if now is None else now) - self.last_seen_ttl
+        for name, branch in self.branches.items():
+            stale = [t for t, seen in branch['last_seen'].items() if seen['timestamp'] < horizon]
+            for t in stale:
+                del branch['last_seen'][t]
+            if stale:
+                self._views.pop(name, None)
+
+    # Snapshots: the whole model is written as one JSON file, replaced atomically
+
+    def to_dict(self):
+        return {name: {'cameras': b['cameras'], 'last_seen': b['last_seen'], 'updated_at': b['updated_at']}
+                for name, b in self.branches.items()}
+
+    def load(self):
+        """Warm-start from the last snapshot, if there is one."""
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            print("Ignoring unreadable yard snapshot:", e)
+            return False
+        self.branches = {}
+        self._views = {}
+        for name, b in data.items():
+            branch = self._branch(name)
+            branch.update(cameras=b['cameras'], last_seen=b['last_seen'], updated_at=b['updated_at'])
+            for camera in b['cameras'].values():
+                for t in camera['tracks'].values():
+                    branch['zones'][t['zone']] = branch['zones'].get(t['zone'], 0) + 1
+        return True
+
+    async def snapshot(self):
+        # Serialize on the loop so the model cannot change underneath, write off it
+        t0 = time.perf_counter()
+        data = json.dumps(self.to_dict())
+        await asyncio.to_thread(self._write_snapshot, data)
+        self._stats['snapshots'] += 1
+        self._stats['snapshot_ms'] = (time.perf_counter() - t0) * 1000.0
+
+    def _write_snapshot(self, data):
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.snapshot_path)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop periodic snapshots and write a final one."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.snapshot()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                self.expire()
+                await self.snapshot()
+            except Exception as e:
+                print("Yard snapshot failed:", e)
+
+    def stats(self) -> dict:
+        return dict(self._stats, branches=len(self.branches),
+                    tracks=sum(len(b['last_seen']) for b in self.branches.values()))
@@ -1,11 +1,23 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
+import sys
+import os
 import time
+import plotly.express as px
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.heatmap import DEFAULT_HEIGHT, DEFAULT_WIDTH, histogram
+from backend.storage import DetectionStore, centroids_since
 
 st.set_page_config(layout='wide', page_title='Mottu - Dashboard')
 
-engine = create_engine('sqlite:///./detections.db', connect_args={"check_same_thread": False})
+@st.cache_resource
+def get_store():
+    # Read-only pool on the same tuned store the backend writes through
+    return DetectionStore(readonly=True)
+
+store = get_store()
 
 st.title('Mottu - Live Detections Dashboard')
 
@@ -18,8 +30,7 @@ with col1:
     @st.cache_data(ttl=2)
     def load_recent(n=200):
         try:
-            df = pd.read_sql(f'SELECT id, timestamp, payload FROM detections ORDER BY id DESC LIMIT {n}', engine)
-            return df
+            return pd.DataFrame(store.recent_frames(n))
         except Exception as e:
             st.error("Error reading DB: " + str(e))
             return pd.DataFrame()
@@ -33,18 +44,52 @@ with col1:
         # show summary fields to be more readable
         df_display = df.copy()
         df_display['time'] = pd.to_datetime(df_display['timestamp'], unit='s')
-        df_display['n_detections'] = df_display['payload'].apply(lambda p: len(p.get('detections', [])) if isinstance(p, dict) else 0)
-        st.dataframe(df_display[['id','time','n_detections']].set_index('id'))
+        st.dataframe(df_display[['id','time','camera','n_detections']].set_index('id'))
+
+    @st.cache_data(ttl=2)
+    def load_stats(window_s=3600):
+        # Read precomputed minute rollups: cost depends on the window, not on history size
+        rollups = pd.DataFrame(store.query_rollups(granularity='minute', start=time.time() - window_s))
+        if rollups.empty:
+            return pd.Series(dtype=int), pd.DataFrame(), store.count_frames()
+        per_minute = rollups.groupby('bucket')['detections'].sum()
+        per_minute.index = pd.to_datetime(per_minute.index, unit='s')
+        per_zone = rollups.fillna({'zone': '(no zone)'}).groupby('zone')['detections'].sum()
+        return per_minute, per_zone, store.count_frames()
 
 with col2:
     st.subheader('Stats')
     if not df.empty:
-        times = pd.to_datetime(df['timestamp'], unit='s')
-        counts = times.dt.floor('T').value_counts().sort_index()
-        st.line_chart(counts)
-        st.write("Total persisted detections rows:", len(df))
+        per_minute, per_zone, total_frames = load_stats()
+        if not per_minute.empty:
+            st.line_chart(per_minute)
+        if not per_zone.empty:
+            st.dataframe(per_zone)
+        st.write("Total persisted frames:", total_frames)
     else:
         st.write("Waiting for data...")
 
+@st.cache_data(ttl=10)
+def load_heatmap(window_s=3600, bins=48):
+    # One vectorized binning pass over the window's centroids
+    now = time.time()
+    try:
+        rows, _ = store.read(centroids_since, now - window_s)
+    except Exception as e:
+        st.error("Error reading DB: " + str(e))
+        return pd.DataFrame()
+    if not rows:
+        return pd.DataFrame()
+    ts, cx, cy = zip(*rows)
+    hists = histogram(ts, cx, cy, window_s, bins, DEFAULT_WIDTH, DEFAULT_HEIGHT, now - window_s, now)
+    return pd.DataFrame(sum(hists.values())) if hists else pd.DataFrame()
+
+st.subheader('Yard occupancy heatmap (last hour)')
+heat = load_heatmap()
+if heat.empty:
+    st.write("Waiting for data...")
+else:
+    st.plotly_chart(px.imshow(heat, color_continuous_scale='Inferno', aspect='auto'), use_container_width=True)
+
 st.markdown("---")
-st.write("Tip: to collect metrics, check the detector console (FPS) and measurement of latency by comparing the detection timestamp with persistence time stored in DB.")
+st.write("Tip: the backend exposes Prometheus metrics at /metrics (ingest latency from detection timestamp to commit, commit time, batch sizes, queue depth, HTTP latency); detector FPS is printed on its console.")
@@ -1,5 +1,6 @@
+import os
+import sys
 import time
-import json
 import argparse
 from ultralytics import YOLO
 import cv2
@@ -8,6 +9,10 @@ import paho.mqtt.client as mqtt
 from collections import OrderedDict
 from typing import List, Tuple
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import wire
+
 class CentroidTracker:
     def __init__(self, max_disappeared=50):
         self.next_object_id = 0
@@ -77,8 +82,9 @@ class CentroidTracker:
 
         return self.objects
 
-def publish_mqtt(client, topic: str, payload: dict):
-    client.publish(topic, json.dumps(payload))
+def publish_mqtt(client, topic: str, payload: dict, fmt: str = wire.JSON):
+    # compact formats are announced with a topic suffix so the bridge knows how to decode
+    client.publish(wire.topic_for(topic, fmt), wire.encode(payload, fmt))
 
 def main(args):
     model = YOLO(args.model)
@@ -91,6 +97,11 @@ def main(args):
 
     last_print = time.time()
     frames = 0
+    # Per-run frame sequence; with camera + timestamp it keys the frame for dedup on the backend
+    seq = 0
+
+    # With --branch, frames go to mottu/{branch}/{camera}/detections and land in that branch's shard
+    topic = wire.detections_topic(args.branch, args.camera) if args.branch else args.mqtt_topic
 
     while True:
         ret, frame = cap.read()
@@ -101,29 +112,36 @@ def main(args):
         results = model(frame)[0]
 
         bboxes = []
+        box_info = {}  # bbox -> (class name, confidence)
         # results.boxes.data is tensor-like: [x1,y1,x2,y2,conf,class]
         if hasattr(results, 'boxes') and len(results.boxes) > 0:
             for r in results.boxes.data.tolist():
                 x1, y1, x2, y2, conf, cls = r
                 # Optionally filter by class (e.g., motorbike). For generality we include all detections.
-                bboxes.append((int(x1), int(y1), int(x2), int(y2)))
+                bbox = (int(x1), int(y1), int(x2), int(y2))
+                bboxes.append(bbox)
+                box_info[bbox] = (model.names.get(int(cls), str(int(cls))), round(float(conf), 3))
 
         objects = tracker.update(bboxes)
 
-        detections_payload = {"timestamp": time.time(), "detections": []}
+        seq += 1
+        detections_payload = {"timestamp": time.time(), "camera": args.camera, "seq": seq, "detections": []}
         for oid, (centroid, bbox) in objects.items():
             x1, y1, x2, y2 = bbox
+            class_name, conf = box_info.get(tuple(bbox), (None, None))
             detections_payload["detections"].append({
                 "id": int(oid),
                 "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                "centroid": [int(centroid[0]), int(centroid[1])]
+                "centroid": [int(centroid[0]), int(centroid[1])],
+                "class": class_name,
+                "confidence": conf
             })
             # draw on frame
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             cv2.putText(frame, f"ID {oid}", (x1, max(y1-10,0)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,0), 2)
 
         # publish detections if any (or publish empty to indicate heartbeat)
-        publish_mqtt(mqtt_client, args.mqtt_topic, detections_payload)
+        publish_mqtt(mqtt_client, topic, detections_payload, args.wire)
 
         # display FPS occasionally
         if time.time() - last_print >= 1.0:
@@ -145,5 +163,8 @@ if __name__ == '__main__':
     parser.add_argument('--mqtt_host', default='localhost', help='MQTT broker host')
     parser.add_argument('--mqtt_port', type=int, default=1883, help='MQTT broker port')
     parser.add_argument('--mqtt_topic', default='mottu/detections', help='MQTT topic to publish detections')
+    parser.add_argument('--camera', default='default', help='camera identifier sent with each frame')
+    parser.add_argument('--branch', default=None, help='branch (yard) id; publishes to mottu/<branch>/<camera>/detections')
+    parser.add_argument('--wire', default='json', choices=['json', 'msgpack'], help='payload encoding (msgpack is compact, needs the msgpack package)')
     args = parser.parse_args()
     main(args)
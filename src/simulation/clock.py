@@ -0,0 +1,94 @@
+"""Relógio de simulação e escalonador de eventos discretos.
+
+O tempo simulado só avança de evento em evento. No modo ``realtime`` cada
+evento espera até a hora de parede correspondente; em ``scaled`` a espera é
+dividida por ``speed`` (ex.: 60 = uma hora simulada por minuto); em ``fast``
+não há espera nenhuma, e semanas de operação do pátio são geradas no tempo
+que a CPU levar para processar os eventos.
+"""
+
+import heapq
+import itertools
+import time
+from typing import Callable, Optional
+
+MODES = ('realtime', 'scaled', 'fast')
+# Maior cochilo entre checagens de parada enquanto espera o próximo evento
+MAX_SLEEP_S = 0.25
+
+
+class SimulationClock:
+    def __init__(self, mode: str = 'realtime', speed: float = 1.0, start: Optional[float] = None):
+        if mode not in MODES:
+            raise ValueError(f'modo de relógio inválido: {mode!r} (use {", ".join(MODES)})')
+        if speed <= 0:
+            raise ValueError('speed deve ser positivo')
+        self.mode = mode
+        self.speed = 1.0 if mode == 'realtime' else speed
+        self._now = time.time() if start is None else start
+        self._anchor()
+
+    def _anchor(self):
+        self._sim0 = self._now
+        self._wall0 = time.monotonic()
+
+    def now(self) -> float:
+        """Tempo simulado atual (epoch em segundos)."""
+        return self._now
+
+    def restart(self):
+        """Reancora o relógio no início de uma execução; em ``realtime`` volta a seguir a hora atual."""
+        if self.mode == 'realtime':
+            self._now = max(self._now, time.time())
+        self._anchor()
+
+    def wait_until(self, when: float, active: Callable[[], bool] = lambda: True) -> bool:
+        """Avança o relógio até ``when``, esperando o tempo de parede do modo; False se ``active`` virar False."""
+        if self.mode != 'fast':
+            target = self._wall0 + (when - self._sim0) / self.speed
+            while True:
+                remaining = target - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not active():
+                    return False
+                time.sleep(min(remaining, MAX_SLEEP_S))
+        self._now = max(self._now, when)
+        return True
+
+
+class EventScheduler:
+    """Fila de eventos por tempo simulado.
+
+    Uma ação recebe o tempo do evento e pode devolver o horário da próxima
+    ocorrência (eventos recorrentes) ou None para encerrar. Empates saem na
+    ordem de agendamento.
+    """
+
+    def __init__(self, clock: SimulationClock):
+        self.clock = clock
+        self.queue = []
+        self._seq = itertools.count()
+        self.processed = 0
+
+    def at(self, when: float, action: Callable[[float], Optional[float]]):
+        heapq.heappush(self.queue, (when, next(self._seq), action))
+
+    def run(self, until: float, active: Callable[[], bool] = lambda: True) -> int:
+        """Processa eventos até o tempo simulado ``until``; retorna quantos foram executados."""
+        processed = 0
+        while self.queue and active():
+            when, _, action = self.queue[0]
+            if when > until:
+                break
+            if not self.clock.wait_until(when, active):
+                break
+            heapq.heappop(self.queue)
+            following = action(when)
+            processed += 1
+            if following is not None:
+                self.at(following, action)
+        if active():
+            self.clock.wait_until(until, active)
+        self.processed += processed
+        return processed
@@ -0,0 +1,316 @@
+"""Estado vetorizado da frota simulada.
+
+Cada atributo da frota (bateria, combustível, posição, zona, status...) é um
+array NumPy com uma posição por moto, e avançar a frota inteira custa meia
+dúzia de operações vetorizadas — 100 mil motos avançam em poucos
+milissegundos. Dicionários por moto só são montados quando alguém pede
+(dashboard, relatórios).
+
+A dinâmica é em tempo simulado contínuo: consumo, recarga e deslocamento são
+taxas por segundo integradas em ``advance_to`` desde a última atualização
+de cada moto (só as motos pedidas, ou a frota toda), e cada moto tem o
+horário da sua próxima troca de status (permanência exponencial com média
+por status), processado em ``transition``. Bateria baixa em uso manda a
+moto recarregar; recarga completa a libera.
+
+Contagens por status e por zona e as somas de bateria e combustível são
+mantidas a cada alteração (custo proporcional às motos alteradas), então
+``summary`` responde em O(1); ``version`` muda a cada alteração da frota.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+STATUSES = ['disponivel', 'em_uso', 'manutencao', 'carregando']
+MODELS = ['Mottu Sport 110i', 'Mottu Urban', 'Mottu Delivery']
+ZONES = ['ZONA_A', 'ZONA_B', 'ZONA_C']
+
+DISPONIVEL, EM_USO, MANUTENCAO, CARREGANDO = range(len(STATUSES))
+
+# Taxas por segundo simulado (% de bateria/combustível)
+BATTERY_DRAIN_PER_S = 0.01   # carga cheia dura ~2h45 em uso
+FUEL_DRAIN_PER_S = 0.005
+CHARGE_PER_S = 0.02          # 0 a 100% em ~1h25
+LOW_BATTERY = 15
+# Passeio aleatório no pátio: desvio padrão em px por raiz de segundo
+MOVE_PX = 4.0
+YARD_X = (0, 800)
+YARD_Y = (0, 600)
+# Permanência média em cada status (s), na ordem de STATUSES
+DWELL_S = np.array([1200.0, 1800.0, 14400.0, 5400.0])
+# Próximo status ao fim da permanência (linha: status atual)
+TRANSITIONS = np.array([
+    [0.00, 0.80, 0.05, 0.15],  # disponivel
+    [0.85, 0.00, 0.05, 0.10],  # em_uso
+    [1.00, 0.00, 0.00, 0.00],  # manutencao
+    [1.00, 0.00, 0.00, 0.00],  # carregando
+])
+_CUMULATIVE = TRANSITIONS.cumsum(axis=1)
+
+# Uma linha por mensagem IoT (moto x tick) e por troca de status, para os ColumnRing do simulador
+MESSAGE_DTYPE = np.dtype([
+    ('timestamp', 'f8'), ('moto', 'i4'), ('status', 'i1'), ('zone', 'i1'), ('battery', 'f8'),
+    ('fuel', 'f8'), ('x', 'i4'), ('y', 'i4'), ('engine_temp', 'i2'), ('speed', 'i2'),
+])
+LOG_DTYPE = np.dtype([('timestamp', 'f8'), ('moto', 'i4'), ('status', 'i1')])
+
+
+def moto_id(index: int) -> str:
+    return f'MOTTU_{index + 1:03d}'
+
+
+class FleetViews:
+    """Visões por moto montadas a partir das colunas (``FleetState`` e snapshots)."""
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def to_dicts(self, indices=None) -> List[Dict]:
+        """Visão por moto no formato histórico (``position`` aninhado), montada sob demanda."""
+        idx = np.arange(len(self)) if indices is None else np.asarray(indices)
+        columns = zip(idx.tolist(), self.model[idx].tolist(), self.status[idx].tolist(),
+                      np.round(self.battery[idx], 1).tolist(), self.x[idx].tolist(), self.y[idx].tolist(),
+                      self.zone[idx].tolist(), self.last_maintenance[idx].tolist(),
+                      self.odometer[idx].astype(np.int64).tolist(), np.round(self.fuel[idx], 1).tolist())
+        return [
+            {
+                'id': moto_id(i),
+                'model': MODELS[model],
+                'status': STATUSES[status],
+                'battery_level': battery,
+                'position': {'x': x, 'y': y, 'zone': ZONES[zone]},
+                'last_maintenance': datetime.fromtimestamp(maintenance).isoformat(),
+                'odometer': odometer,
+                'fuel_level': fuel,
+            }
+            for i, model, status, battery, x, y, zone, maintenance, odometer, fuel in columns
+        ]
+
+    def to_rows(self, indices=None) -> List[Dict]:
+        """Linhas planas (x/y/zone no topo) para tabelas do dashboard."""
+        idx = np.arange(len(self)) if indices is None else np.asarray(indices)
+        columns = zip(idx.tolist(), self.model[idx].tolist(), np.round(self.battery[idx], 1).tolist(),
+                      np.round(self.fuel[idx], 1).tolist(), self.status[idx].tolist(), self.zone[idx].tolist(),
+                      self.x[idx].tolist(), self.y[idx].tolist())
+        return [
+            {
+                'moto_id': moto_id(i),
+                'model': MODELS[model],
+                'battery_level': battery,
+                'fuel_level': fuel,
+                'status': STATUSES[status],
+                'zone': ZONES[zone],
+                'x': x,
+                'y': y,
+            }
+            for i, model, battery, fuel, status, zone, x, y in columns
+        ]
+
+
+class FleetState(FleetViews):
+    """Frota em arrays NumPy; o índice i de cada array é a moto ``moto_id(i)``."""
+
+    def __init__(self, size: int, rng: Optional[np.random.Generator] = None, now: Optional[float] = None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.now = time.time() if now is None else now
+        self.status = np.empty(0, dtype=np.int8)
+        self.model = np.empty(0, dtype=np.int8)
+        self.zone = np.empty(0, dtype=np.int8)
+        self.battery = np.empty(0, dtype=np.float64)
+        self.fuel = np.empty(0, dtype=np.float64)
+        self.x = np.empty(0, dtype=np.int32)
+        self.y = np.empty(0, dtype=np.int32)
+        self.odometer = np.empty(0, dtype=np.float64)
+        self.last_maintenance = np.empty(0, dtype=np.float64)
+        self.next_change = np.empty(0, dtype=np.float64)
+        self.updated_at = np.empty(0, dtype=np.float64)
+        self.engine_temp = np.empty(0, dtype=np.int16)
+        self.speed = np.empty(0, dtype=np.int16)
+        # Trocas de status ainda não consumidas: [(índices, horário, novo status)]
+        self.changes = []
+        self.version = 0
+        self.resize(size)
+
+    def _new(self, n: int) -> Dict[str, np.ndarray]:
+        """Atributos iniciais de ``n`` motos novas (mesmas faixas do simulador original)."""
+        rng = self.rng
+        status = rng.integers(0, len(STATUSES), n).astype(np.int8)
+        return {
+            'status': status,
+            'model': rng.integers(0, len(MODELS), n).astype(np.int8),
+            'zone': rng.integers(0, len(ZONES), n).astype(np.int8),
+            'battery': rng.integers(20, 101, n).astype(np.float64),
+            'fuel': rng.integers(30, 101, n).astype(np.float64),
+            'x': rng.integers(50, 751, n).astype(np.int32),  # Coordenadas do pátio
+            'y': rng.integers(100, 501, n).astype(np.int32),
+            'odometer': rng.integers(1000, 15001, n).astype(np.float64),
+            'last_maintenance': self.now - rng.integers(1, 31, n) * 86400.0,
+            'next_change': self.now + rng.exponential(DWELL_S[status]),
+            'updated_at': np.full(n, self.now),
+            'engine_temp': np.zeros(n, dtype=np.int16),
+            'speed': np.zeros(n, dtype=np.int16),
+        }
+
+    def resize(self, size: int):
+        """Mantém as primeiras ``size`` motos e gera as que faltarem."""
+        n = len(self)
+        if size <= n:
+            for name in self._new(0):
+                setattr(self, name, getattr(self, name)[:size].copy())
+        else:
+            for name, values in self._new(size - n).items():
+                setattr(self, name, np.concatenate([getattr(self, name), values]))
+        self._recount()
+
+    def _recount(self):
+        """Recalcula do zero os agregados mantidos incrementalmente."""
+        self.status_totals = np.bincount(self.status, minlength=len(STATUSES)).astype(np.int64)
+        self.zone_totals = np.bincount(self.zone, minlength=len(ZONES)).astype(np.int64)
+        self.battery_sum = float(self.battery.sum())
+        self.fuel_sum = float(self.fuel.sum())
+        self.version += 1
+
+    def _set_status(self, indices: np.ndarray, status, now: float):
+        """Coloca ``indices`` em ``status`` e sorteia quanto tempo ficam nele."""
+        if not len(indices):
+            return
+        self.status_totals -= np.bincount(self.status[indices], minlength=len(STATUSES))
+        self.status[indices] = status
+        new = self.status[indices]
+        self.status_totals += np.bincount(new, minlength=len(STATUSES))
+        self.next_change[indices] = now + self.rng.exponential(DWELL_S[new])
+        self.changes.append((indices, now, new))
+        self.version += 1
+
+    def advance_to(self, now: float, indices: Optional[np.ndarray] = None):
+        """Integra consumo, recarga e deslocamento até ``now`` (da frota toda ou só de ``indices``)."""
+        idx = np.arange(len(self)) if indices is None else indices
+        dt = now - self.updated_at[idx]
+        self.updated_at[idx] = now
+        self.now = max(self.now, now)
+        self.version += 1
+        rng = self.rng
+        status = self.status[idx]
+        in_use = status == EM_USO
+        moving, dt_moving = idx[in_use], dt[in_use]
+        k = len(moving)
+        if k:
+            before = self.battery[moving]
+            battery = np.maximum(0.0, before - BATTERY_DRAIN_PER_S * dt_moving * rng.uniform(0.5, 1.5, k))
+            self.battery[moving] = battery
+            self.battery_sum += float((battery - before).sum())
+            before = self.fuel[moving]
+            fuel = np.maximum(0.0, before - FUEL_DRAIN_PER_S * dt_moving * rng.uniform(0.5, 1.5, k))
+            self.fuel[moving] = fuel
+            self.fuel_sum += float((fuel - before).sum())
+            # Simular movimento
+            step = MOVE_PX * np.sqrt(dt_moving)
+            self.x[moving] = np.clip(self.x[moving] + np.rint(rng.normal(0.0, step)), *YARD_X)
+            self.y[moving] = np.clip(self.y[moving] + np.rint(rng.normal(0.0, step)), *YARD_Y)
+            self.odometer[moving] += rng.uniform(10.0, 40.0, k) * dt_moving / 3600.0
+            # Bateria baixa: vai recarregar
+            self._set_status(moving[battery <= LOW_BATTERY], CARREGANDO, now)
+        on_charger = status == CARREGANDO
+        charging = idx[on_charger]
+        if len(charging):
+            before = self.battery[charging]
+            battery = np.minimum(100.0, before + CHARGE_PER_S * dt[on_charger])
+            self.battery[charging] = battery
+            self.battery_sum += float((battery - before).sum())
+            # Recarga completa: volta a ficar disponível
+            self._set_status(charging[battery >= 100.0], DISPONIVEL, now)
+
+    def transition(self, now: float) -> np.ndarray:
+        """Troca o status das motos cuja permanência venceu; retorna seus índices."""
+        due = np.flatnonzero(self.next_change <= now)
+        if len(due):
+            # Só as motos que vão mudar precisam estar em dia antes da troca
+            self.advance_to(now, due)
+            due = due[self.next_change[due] <= now]
+            u = self.rng.random(len(due))
+            new = np.minimum((u[:, None] >= _CUMULATIVE[self.status[due]]).sum(axis=1), len(STATUSES) - 1)
+            self._set_status(due, new.astype(np.int8), now)
+            entering = due[new == MANUTENCAO]
+            self.last_maintenance[entering] = now
+        return due
+
+    def pop_changes(self):
+        """Trocas de status desde a última chamada, como colunas (timestamp, moto, status)."""
+        if not self.changes:
+            return None
+        changes, self.changes = self.changes, []
+        motos = np.concatenate([idx for idx, _, _ in changes])
+        timestamps = np.concatenate([np.full(len(idx), now) for idx, now, _ in changes])
+        statuses = np.concatenate([status for _, _, status in changes])
+        return {'timestamp': timestamps, 'moto': motos, 'status': statuses}
+
+    def next_due(self) -> float:
+        """Horário simulado da próxima troca de status agendada."""
+        return float(self.next_change.min()) if len(self) else float('inf')
+
+    def sample_sensors(self):
+        """Leituras instantâneas (temperatura do motor, velocidade) para a telemetria."""
+        n = len(self)
+        self.engine_temp = self.rng.integers(80, 121, n, dtype=np.int16)
+        speed = self.rng.integers(0, 61, n, dtype=np.int16)
+        self.speed = np.where(self.status == EM_USO, speed, 0).astype(np.int16)
+
+    def readings(self, timestamp: float) -> Dict:
+        """Leituras deste tick em colunas de MESSAGE_DTYPE (uma mensagem IoT por moto).
+
+        As colunas apontam para o estado da frota: valem até o próximo evento.
+        """
+        self.sample_sensors()
+        return {
+            'timestamp': timestamp,
+            'moto': np.arange(len(self), dtype=np.int32),
+            'status': self.status,
+            'zone': self.zone,
+            'battery': self.battery,
+            'fuel': self.fuel,
+            'x': self.x,
+            'y': self.y,
+            'engine_temp': self.engine_temp,
+            'speed': self.speed,
+        }
+
+    def status_counts(self) -> Dict[str, int]:
+        return {STATUSES[i]: int(c) for i, c in enumerate(self.status_totals) if c}
+
+    def summary(self) -> Dict:
+        """Agregados da frota em O(1), a partir dos contadores incrementais."""
+        n = len(self)
+        return {
+            'version': self.version,
+            'total': n,
+            'active': n - int(self.status_totals[MANUTENCAO]),
+            'status_counts': self.status_counts(),
+            'zone_counts': {ZONES[i]: int(c) for i, c in enumerate(self.zone_totals) if c},
+            'avg_battery': self.battery_sum / n if n else 0.0,
+            'avg_fuel': self.fuel_sum / n if n else 0.0,
+        }
+
+
+def messages(rows: np.ndarray) -> List[Dict]:
+    """Mensagens IoT (formato ``moto_id`` + ``sensor_data``) de linhas MESSAGE_DTYPE, montadas sob demanda."""
+    columns = zip(rows['moto'].tolist(), rows['timestamp'].tolist(), rows['x'].tolist(), rows['y'].tolist(),
+                  rows['zone'].tolist(), np.round(rows['battery'], 1).tolist(), rows['status'].tolist(),
+                  np.round(rows['fuel'], 1).tolist(), rows['engine_temp'].tolist(), rows['speed'].tolist())
+    return [
+        {
+            'moto_id': moto_id(i),
+            'timestamp': datetime.fromtimestamp(ts).isoformat(),
+            'sensor_data': {
+                'gps': {'x': x, 'y': y, 'zone': ZONES[zone]},
+                'battery': battery,
+                'status': STATUSES[status],
+                'fuel': fuel,
+                'engine_temp': engine_temp,
+                'speed': speed,
+            },
+        }
+        for i, ts, x, y, zone, battery, status, fuel, engine_temp, speed in columns
+    ]
@@ -1,202 +1,359 @@
-import random
+import argparse
+import os
+import sys
 import time
 import json
+import queue
 import threading
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List
+import numpy as np
 import paho.mqtt.client as mqtt
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from simulation.clock import EventScheduler, SimulationClock
+from backend import wire
+from simulation.fleet import LOG_DTYPE, MESSAGE_DTYPE, STATUSES, FleetState, messages, moto_id
+from simulation.publisher import DEFAULT_BATCH_SIZE, DEFAULT_MAX_INFLIGHT, SensorPublisher, shared_client, to_rows
+from simulation.ringbuffer import ColumnRing
+from simulation.snapshot import FleetSnapshot, SnapshotBuffer
+
+DEFAULT_FLEET_SIZE = 15
+DEFAULT_UPDATE_INTERVAL = 2
+# Mensagens IoT e entradas de log mantidas em memória (as mais antigas são sobrescritas)
+DEFAULT_BUFFER_SIZE = 100000
+DEFAULT_LOG_SIZE = 1000
+# Menor intervalo simulado entre dois eventos de troca de status (agrupa motos com vencimento próximo)
+STATUS_RESOLUTION_S = 1.0
+# Mensagens e logs mais recentes copiados em cada snapshot publicado
+SNAPSHOT_MESSAGES = 1000
+
 class MottuIoTSimulator:
-    def __init__(self):
-        """Simulador de sensores IoT das motos Mottu"""
-        self.motos_fleet = self._generate_fleet_data()
+    def __init__(self, fleet_size: int = DEFAULT_FLEET_SIZE, seed=None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, log_size: int = DEFAULT_LOG_SIZE):
+        """Simulador de sensores IoT das motos Mottu (frota vetorizada em NumPy)"""
+        self.rng = np.random.default_rng(seed)
+        self.clock = SimulationClock()
+        self.fleet = FleetState(fleet_size, self.rng, now=self.clock.now())
         self.simulation_active = False
+        self._start_time = None
+        # Uma execução por vez; alterações pedidas durante a execução vão para a fila de comandos
+        self._run_lock = threading.Lock()
+        self._lifecycle = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._commands = queue.SimpleQueue()
         self.mqtt_client = None
-        self.simulation_data = []
-        
-    def _generate_fleet_data(self) -> List[Dict]:
-        """Gera dados simulados da frota de motos"""
-        fleet = []
-        statuses = ['disponivel', 'em_uso', 'manutencao', 'carregando']
-        models = ['Mottu Sport 110i', 'Mottu Urban', 'Mottu Delivery']
-        
-        for i in range(1, 16):  # 15 motos simuladas
-            moto = {
-                'id': f'MOTTU_{i:03d}',
-                'model': random.choice(models),
-                'status': random.choice(statuses),
-                'battery_level': random.randint(20, 100),
-                'position': {
-                    'x': random.randint(50, 750),  # Coordenadas do pátio
-                    'y': random.randint(100, 500),
-                    'zone': f'ZONA_{random.choice(["A", "B", "C"])}'
-                },
-                'last_maintenance': (datetime.now() - timedelta(days=random.randint(1, 30))).isoformat(),
-                'odometer': random.randint(1000, 15000),
-                'fuel_level': random.randint(30, 100)
-            }
-            fleet.append(moto)
-        
-        return fleet
-    
-    def simulate_real_time_data(self, duration_seconds: int = 300):
-        """Simula dados IoT em tempo real"""
-        self.simulation_active = True
-        start_time = time.time()
-        
-        print(f"🚀 Iniciando simulação IoT por {duration_seconds} segundos...")
-        
-        while self.simulation_active and (time.time() - start_time) < duration_seconds:
-            for moto in self.motos_fleet:
-                # Simular mudanças nos dados
-                self._update_moto_data(moto)
-                
-                # Criar mensagem IoT
-                iot_message = {
-                    'moto_id': moto['id'],
-                    'timestamp': datetime.now().isoformat(),
-                    'sensor_data': {
-                        'gps': moto['position'],
-                        'battery': moto['battery_level'],
-                        'status': moto['status'],
-                        'fuel': moto['fuel_level'],
-                        'engine_temp': random.randint(80, 120),
-                        'speed': random.randint(0, 60) if moto['status'] == 'em_uso' else 0
-                    }
-                }
-                
-                self.simulation_data.append(iot_message)
-                
-                # Simular envio MQTT (local)
-                self._publish_mqtt_message(iot_message)
+        self.mqtt_broker = None
+        self.publisher = None
+        # Buffers circulares colunares: uma linha por mensagem IoT / por troca de status
+        self.simulation_data = ColumnRing(buffer_size, MESSAGE_DTYPE)
+        self.logs = ColumnRing(log_size, LOG_DTYPE)
+        self.update_interval = DEFAULT_UPDATE_INTERVAL
+        # Resumo da frota e total de mensagens no tick anterior (base dos deltas)
+        self._previous = None
+        # Leitores (dashboard) só enxergam o snapshot publicado, nunca a frota em alteração
+        self.snapshots = SnapshotBuffer()
+        self._publish_snapshot()
+
+    @property
+    def total_messages(self) -> int:
+        """Mensagens geradas desde o último reset (inclusive as que já saíram do buffer)"""
+        return self.simulation_data.total
+
+    @property
+    def motos_fleet(self) -> List[Dict]:
+        """Visão em dicionários da frota"""
+        return self.snapshot().view('dicts')
+
+    def snapshot(self) -> FleetSnapshot:
+        """Último estado publicado da frota (imutável; leitura sem lock de qualquer thread)"""
+        return self.snapshots.front
+
+    def _publish_snapshot(self, force: bool = True):
+        if force or self.snapshots.due():
+            self.snapshots.publish(self.fleet, total_messages=self.total_messages, previous=self._previous,
+                                   messages=self.simulation_data.tail(SNAPSHOT_MESSAGES),
+                                   logs=self.logs.tail())
+
+    def _command(self, action):
+        """Aplica ``action`` na frota pela thread dona dela.
+
+        Sem execução em andamento aplica aqui mesmo; durante a execução
+        enfileira, e a thread do simulador aplica entre dois eventos.
+        """
+        self._commands.put(action)
+        if self._run_lock.acquire(blocking=False):
+            try:
+                self._apply_commands()
+            finally:
+                self._run_lock.release()
+
+    def _apply_commands(self):
+        applied = False
+        while True:
+            try:
+                action = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            action()
+            applied = True
+        if applied:
+            self._publish_snapshot()
+
+    def set_clock(self, mode: str = 'realtime', speed: float = 1.0, start: float = None):
+        """Define o relógio: 'realtime', 'scaled' (speed x tempo real) ou 'fast' (sem espera)"""
+        clock = SimulationClock(mode, speed, start)
+
+        def apply():
+            self.clock = clock
+            if start is not None:
+                # Desloca a frota inteira para a nova origem do tempo simulado
+                shift = start - self.fleet.now
+                self.fleet.now = start
+                self.fleet.updated_at += shift
+                self.fleet.next_change += shift
+                self.fleet.last_maintenance += shift
+        self._command(apply)
+
+    def _tick(self, now: float) -> Dict:
+        """Evento de telemetria: avança a frota até ``now`` e registra as leituras"""
+        self._previous = (self.fleet.summary(), self.total_messages)
+        self.fleet.advance_to(now)
+        readings = self.fleet.readings(now)
+        self.simulation_data.extend(**readings)
+        self._log_changes()
+        return readings
+
+    def _log_changes(self):
+        changes = self.fleet.pop_changes()
+        if changes is not None:
+            self.logs.extend(**changes)
+
+    def _telemetry_event(self, now: float) -> float:
+        self._apply_commands()
+        readings = self._tick(now)
+        self._publish_mqtt_message(readings)
+        # Fora do tempo real os ticks são mais rápidos que qualquer leitor: publica no máximo a cada MIN_INTERVAL_S
+        self._publish_snapshot(force=self.clock.mode == 'realtime')
+        return now + self.update_interval
+
+    def _status_event(self, now: float) -> float:
+        self._apply_commands()
+        self.fleet.transition(now)
+        self._log_changes()
+        self._publish_snapshot(force=self.clock.mode == 'realtime')
+        return max(self.fleet.next_due(), now + STATUS_RESOLUTION_S)
+
+    def simulate_real_time_data(self, duration_seconds: int = 300, stop: threading.Event = None):
+        """Simula ``duration_seconds`` segundos de operação no ritmo do relógio configurado
+
+        Bloqueia até terminar ou até ``stop`` (ou stop_simulation) ser acionado;
+        se outra execução já estiver em andamento, retorna sem fazer nada.
+        """
+        stop = stop or threading.Event()
+        if not self._run_lock.acquire(blocking=False):
+            print("⚠️ Simulação IoT já em execução")
+            return
+        try:
+            self._stop = stop
+            self.simulation_active = not stop.is_set()
+            self._start_time = time.time()
+            self._apply_commands()
+            self.clock.restart()
+            start = self.clock.now()
             
-            time.sleep(2)  # Atualizar a cada 2 segundos
-        
-        print("✅ Simulação IoT finalizada")
+            print(f"🚀 Iniciando simulação IoT por {duration_seconds} segundos (relógio {self.clock.mode})...")
+            
+            # Eventos discretos: leituras periódicas e trocas de status no vencimento de cada moto
+            scheduler = EventScheduler(self.clock)
+            scheduler.at(start, self._telemetry_event)
+            scheduler.at(max(self.fleet.next_due(), start), self._status_event)
+            scheduler.run(start + duration_seconds, active=lambda: not stop.is_set())
+            self.fleet.advance_to(self.clock.now())
+            
+            print("✅ Simulação IoT finalizada")
+        finally:
+            self.simulation_active = False
+            self._apply_commands()
+            self._publish_snapshot()
+            self._run_lock.release()
     
-    def _update_moto_data(self, moto: Dict):
-        """Atualiza dados simulados da moto"""
-        # Pequenas variações realistas
-        if moto['status'] == 'em_uso':
-            moto['battery_level'] = max(10, moto['battery_level'] - random.randint(0, 2))
-            moto['fuel_level'] = max(5, moto['fuel_level'] - random.randint(0, 1))
-            # Simular movimento
-            moto['position']['x'] += random.randint(-10, 10)
-            moto['position']['y'] += random.randint(-10, 10)
-        elif moto['status'] == 'carregando':
-            moto['battery_level'] = min(100, moto['battery_level'] + random.randint(1, 3))
-        
-        # Mudança aleatória de status (5% chance)
-        if random.random() < 0.05:
-            statuses = ['disponivel', 'em_uso', 'manutencao', 'carregando']
-            moto['status'] = random.choice(statuses)
+    def get_recent_messages(self, limit: int = 100) -> List[Dict]:
+        """Últimas mensagens IoT publicadas no snapshot (até SNAPSHOT_MESSAGES)"""
+        return messages(self._tail(self.snapshot().messages, limit))
+
+    @staticmethod
+    def _tail(rows, limit: int):
+        return rows[len(rows) - max(0, min(limit, len(rows))):]
     
+    def _get_publisher(self):
+        """Publicador MQTT configurado, conectando na primeira vez (None = só local)"""
+        if self.publisher is None and self.mqtt_broker and not self._mqtt_failed:
+            try:
+                self.mqtt_client = shared_client(self.mqtt_broker, self.mqtt_port, self._mqtt_options['max_inflight'])
+            except OSError as e:
+                print(f"⚠️ MQTT indisponível em {self.mqtt_broker}:{self.mqtt_port} ({e}); dados ficam só locais")
+                self._mqtt_failed = True
+                return None
+            options = {k: v for k, v in self._mqtt_options.items() if k != 'max_inflight'}
+            self.publisher = SensorPublisher(self.mqtt_client, self.mqtt_topic, **options)
+        return self.publisher
+
     def _publish_mqtt_message(self, message: Dict):
-        """Simula publicação MQTT (apenas local para demonstração)"""
-        # Para demonstração, apenas armazena localmente
-        # Em produção, publicaria via MQTT real
-        pass
+        """Publica via MQTT as leituras de um tick (se configure_mqtt foi chamado)"""
+        publisher = self._get_publisher()
+        if publisher is not None:
+            publisher.publish(to_rows(message))
     
     def get_current_fleet_status(self) -> Dict:
         """Retorna status atual da frota"""
-        status_summary = {}
-        for moto in self.motos_fleet:
-            status = moto['status']
-            status_summary[status] = status_summary.get(status, 0) + 1
-        
+        snapshot = self.snapshot()
         return {
-            'fleet_summary': status_summary,
-            'total_motos': len(self.motos_fleet),
-            'motos_data': self.motos_fleet,
+            'fleet_summary': dict(snapshot.summary['status_counts']),
+            'total_motos': snapshot.summary['total'],
+            'motos_data': snapshot.view('dicts'),
             'last_update': datetime.now().isoformat()
         }
     
     def stop_simulation(self):
-        """Para a simulação"""
+        """Para a simulação (a thread encerra no próximo evento ou checagem do relógio)"""
+        self._stop.set()
         self.simulation_active = False
     
     def start_simulation(self):
         """Inicia a simulação IoT"""
-        if not self.simulation_active:
+        with self._lifecycle:
+            running = self._run_lock.locked() or (self._thread is not None and self._thread.is_alive())
+            if running and not self._stop.is_set():
+                return
+            # Parada pedida e ainda não concluída: espera a execução anterior sair da frota
+            if self._thread is not None:
+                self._thread.join()
+            with self._run_lock:
+                pass
+            stop = self._stop = threading.Event()
             self.simulation_active = True
             # Iniciar em thread separada para não bloquear
-            threading.Thread(target=self.simulate_real_time_data, daemon=True).start()
+            self._thread = threading.Thread(target=self.simulate_real_time_data, kwargs={'stop': stop}, daemon=True)
+            self._thread.start()
     
     def is_running(self) -> bool:
         """Verifica se a simulação está ativa"""
         return self.simulation_active
     
     def reset_simulation(self):
-        """Reseta a simulação"""
-        self.simulation_active = False
-        self.motos_fleet = self._generate_fleet_data()
-        self.simulation_data = []
+        """Reseta a simulação (para a execução em andamento e espera ela terminar)"""
+        with self._lifecycle:
+            self.stop_simulation()
+            with self._run_lock:
+                self.fleet = FleetState(len(self.fleet), self.rng, now=self.clock.now())
+                self.simulation_data.clear()
+                self.logs.clear()
+                self._previous = None
+                self._publish_snapshot()
     
     def get_simulation_status(self) -> Dict:
         """Retorna status detalhado da simulação"""
-        if not hasattr(self, '_start_time'):
-            self._start_time = time.time()
-        
-        active_motos = len([m for m in self.motos_fleet if m['status'] != 'manutencao'])
-        avg_battery = sum(m['battery_level'] for m in self.motos_fleet) / len(self.motos_fleet)
+        snapshot = self.snapshot()
+        summary = snapshot.summary
+        total_messages = snapshot.total_messages
+        # Deltas em relação ao tick anterior
+        previous, previous_messages = snapshot.previous
+        running, started = self.simulation_active, self._start_time
         
         return {
-            'running': self.simulation_active,
-            'active_motorcycles': active_motos,
-            'total_messages': len(self.simulation_data),
-            'avg_battery': avg_battery,
-            'uptime_seconds': int(time.time() - self._start_time) if self.simulation_active else 0,
-            'delta_motorcycles': 0,  # Para compatibilidade com métricas
-            'delta_messages': 0,
-            'delta_battery': 0
+            'running': running,
+            'active_motorcycles': summary['active'],
+            'total_messages': total_messages,
+            'avg_battery': summary['avg_battery'],
+            'uptime_seconds': int(time.time() - started) if running and started else 0,
+            'version': snapshot.version,
+            'delta_motorcycles': summary['active'] - previous['active'],
+            'delta_messages': total_messages - previous_messages,
+            'delta_battery': round(summary['avg_battery'] - previous['avg_battery'], 2),
+            'mqtt': self.publisher.stats() if self.publisher is not None else None
         }
     
     def get_motorcycles_data(self) -> List[Dict]:
         """Retorna dados atuais das motos"""
-        formatted_data = []
-        for moto in self.motos_fleet:
-            formatted_data.append({
-                'moto_id': moto['id'],
-                'model': moto['model'],
-                'battery_level': moto['battery_level'],
-                'fuel_level': moto['fuel_level'],
-                'status': moto['status'],
-                'zone': moto['position']['zone'],
-                'x': moto['position']['x'],
-                'y': moto['position']['y']
-            })
-        return formatted_data
+        return self.snapshot().view('rows')
     
-    def configure_mqtt(self, broker: str, port: int, topic: str):
-        """Configura parâmetros MQTT"""
-        self.mqtt_broker = broker
-        self.mqtt_port = port
-        self.mqtt_topic = topic
+    def configure_mqtt(self, broker: str, port: int, topic: str, qos: int = 0,
+                       batch_size: int = DEFAULT_BATCH_SIZE, max_rate: float = None,
+                       max_inflight: int = DEFAULT_MAX_INFLIGHT, wire_format: str = wire.JSON):
+        """Configura parâmetros MQTT (a conexão é aberta no próximo envio)
+
+        ``batch_size`` leituras por mensagem, ``max_rate`` mensagens/s no máximo
+        e até ``max_inflight`` mensagens aguardando o broker.
+        """
+        def apply():
+            self.mqtt_broker = broker
+            self.mqtt_port = port
+            self.mqtt_topic = topic
+            self._mqtt_options = {'qos': qos, 'batch_size': batch_size, 'max_rate': max_rate,
+                                  'max_inflight': max_inflight, 'wire_format': wire_format}
+            self._mqtt_failed = False
+            self.publisher = None
+        self._command(apply)
     
     def set_fleet_size(self, size: int):
-        """Define tamanho da frota"""
-        if size != len(self.motos_fleet):
-            self.motos_fleet = self._generate_fleet_data()[:size]
+        """Define tamanho da frota (mantém as motos existentes e gera as novas)"""
+        def apply():
+            if size != len(self.fleet):
+                self.fleet.resize(size)
+        self._command(apply)
     
     def set_update_interval(self, interval: int):
         """Define intervalo de atualização"""
         self.update_interval = interval
     
     def get_recent_logs(self, limit: int = 10) -> List[Dict]:
-        """Retorna logs recentes da simulação"""
-        if not hasattr(self, '_logs'):
-            self._logs = []
-        
-        # Gerar alguns logs exemplo se não tiver
-        if not self._logs:
-            for i in range(5):
-                self._logs.append({
-                    'timestamp': datetime.now().strftime('%H:%M:%S'),
-                    'message': f'Moto MOTTU_{i+1:03d} atualizou status'
-                })
-        
-        return self._logs[-limit:]
+        """Retorna logs recentes da simulação (trocas de status, da mais antiga à mais nova)"""
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(ts).strftime('%H:%M:%S'),
+                'message': f'Moto {moto_id(moto)} mudou para {STATUSES[status]}'
+            }
+            for ts, moto, status in self._tail(self.snapshot().logs, limit).tolist()
+        ]
     
     def clear_logs(self):
         """Limpa logs da simulação"""
-        self._logs = []
+        self._command(self.logs.clear)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera telemetria simulada da frota Mottu em tempo acelerado')
+    parser.add_argument('--motos', type=int, default=1000, help='tamanho da frota')
+    parser.add_argument('--days', type=float, default=1.0, help='dias simulados')
+    parser.add_argument('--interval', type=float, default=60.0, help='segundos simulados entre leituras')
+    parser.add_argument('--clock', choices=['realtime', 'scaled', 'fast'], default='fast')
+    parser.add_argument('--speed', type=float, default=60.0, help='multiplicador do tempo real (clock=scaled)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--mqtt-host', default=None, help='publica as leituras neste broker (gerador de carga)')
+    parser.add_argument('--mqtt-port', type=int, default=1883)
+    parser.add_argument('--topic', default='mottu/sensors')
+    parser.add_argument('--qos', type=int, default=0, choices=[0, 1, 2])
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH_SIZE, help='leituras por mensagem MQTT')
+    parser.add_argument('--rate', type=float, default=None, help='máximo de mensagens MQTT por segundo')
+    parser.add_argument('--inflight', type=int, default=DEFAULT_MAX_INFLIGHT, help='janela de mensagens em voo')
+    parser.add_argument('--format', choices=[wire.JSON, wire.MSGPACK], default=wire.JSON)
+    args = parser.parse_args()
+
+    simulator = MottuIoTSimulator(args.motos, seed=args.seed)
+    simulator.set_clock(args.clock, args.speed, start=time.time() - args.days * 86400)
+    simulator.set_update_interval(args.interval)
+    if args.mqtt_host:
+        simulator.configure_mqtt(args.mqtt_host, args.mqtt_port, args.topic, qos=args.qos, batch_size=args.batch,
+                                 max_rate=args.rate, max_inflight=args.inflight, wire_format=args.format)
+    wall = time.perf_counter()
+    simulator.simulate_real_time_data(args.days * 86400)
+    wall = time.perf_counter() - wall
+    print(f"📊 {simulator.total_messages} leituras de {args.motos} motos em {args.days} dia(s) simulado(s)"
+          f" em {wall:.1f}s ({simulator.total_messages / wall:,.0f} leituras/s)")
+    print(f"📊 Status final: {simulator.get_current_fleet_status()['fleet_summary']}")
+    if simulator.publisher is not None:
+        simulator.mqtt_client.close()
+        print(f"📡 MQTT: {simulator.publisher.stats()}")
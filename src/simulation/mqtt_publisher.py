@@ -1,26 +1,219 @@
-import time
+"""Asyncio fan-out publisher of simulated sensors (load generator for mottu/sensors).
+
+Every sensor is its own task on one event loop, publishing every 1/--rate
+seconds with a random phase and +/- --jitter spread per interval, so
+thousands of sensors produce a steady stream instead of synchronized bursts.
+The sensors share a small pool of --connections paho clients whose sockets
+are driven by the same loop (add_reader/add_writer, no network threads).
+
+Every --report-interval seconds it prints the achieved messages per second
+and publish latency: from the publish() call until paho reports the message
+written to the socket (QoS 0) or acknowledged by the broker (QoS 1/2).
+
+Usage:
+  python src/simulation/mqtt_publisher.py --sensors 5000 --rate 1 --format msgpack
+"""
+
+import argparse
+import asyncio
 import json
+import os
 import random
+import sys
+import time
+
 import paho.mqtt.client as mqtt
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import wire
+
 BROKER = "localhost"
 PORT = 1883
 TOPIC = "mottu/sensors"
+# Payload encoding: 'json' or 'msgpack' (see backend/wire.py)
+WIRE_FORMAT = os.environ.get('MOTTU_WIRE_FORMAT', wire.JSON)
+STATUSES = ['ok', 'idle', 'moving']
+
+
+class LoopConnection:
+    """A paho client whose network I/O runs on the asyncio event loop."""
+
+    def __init__(self, loop, client_id, stats):
+        self.loop = loop
+        self.stats = stats
+        self.connected = asyncio.Event()
+        self.sent_at = {}
+        self._misc = None
+        self._publishing = None
+        client = self.client = mqtt.Client(client_id=client_id)
+        client.on_connect = self._on_connect
+        client.on_publish = self._on_publish
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = lambda c, u, sock: loop.add_writer(sock, c.loop_write)
+        client.on_socket_unregister_write = lambda c, u, sock: loop.remove_writer(sock)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connected.set()
+        else:
+            print("Connection refused by broker:", mqtt.connack_string(rc))
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.connected.clear()
+        if self._misc is not None:
+            self._misc.cancel()
+
+    async def _misc_loop(self):
+        # Keepalive pings and retries, once a second
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _on_publish(self, client, userdata, mid):
+        t0 = self.sent_at.pop(mid, None)
+        if t0 is None and self._publishing is not None:
+            # QoS 0 packets can be written before publish() has even returned the mid
+            t0, self._publishing = self._publishing, None
+        if t0 is not None:
+            self.stats.completed(time.perf_counter() - t0)
 
-def main():
-    client = mqtt.Client()
-    client.connect(BROKER, PORT, 60)
+    async def connect(self, host, port):
+        self.client.connect(host, port, 60)
+        await asyncio.wait_for(self.connected.wait(), 10)
+
+    def publish(self, topic, payload, qos) -> bool:
+        self._publishing = time.perf_counter()
+        info = self.client.publish(topic, payload, qos)
+        if self._publishing is not None and info.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.sent_at[info.mid] = self._publishing
+        self._publishing = None
+        return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self):
+        self.client.disconnect()
+
+
+class PublisherStats:
+    """Per-interval throughput and publish latency; reset at every report."""
+
+    def __init__(self):
+        self.totals = {'published': 0, 'completed': 0, 'failed': 0, 'late': 0}
+        self._reset()
+
+    def _reset(self):
+        self.window_start = time.time()
+        self.published = 0
+        self.latencies = []
+
+    def sent(self, ok):
+        if ok:
+            self.published += 1
+            self.totals['published'] += 1
+        else:
+            self.totals['failed'] += 1
+
+    def completed(self, latency):
+        self.totals['completed'] += 1
+        self.latencies.append(latency)
+
+    def report(self) -> dict:
+        elapsed = max(time.time() - self.window_start, 1e-9)
+        latencies = sorted(self.latencies)
+        out = {
+            'msgs_per_s': round(self.published / elapsed, 1),
+            'latency_ms_p50': _percentile_ms(latencies, 0.5),
+            'latency_ms_p99': _percentile_ms(latencies, 0.99),
+            'latency_ms_max': _percentile_ms(latencies, 1.0),
+            **self.totals,
+        }
+        self._reset()
+        return out
+
+
+def _percentile_ms(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000.0, 2)
+
+
+async def run_sensor(index, conn, args, stats):
+    """One simulated sensor: a slowly draining battery wandering around the yard."""
+    loop = asyncio.get_running_loop()
+    rng = random.Random(index)
+    topic = wire.topic_for(args.topic, args.format)
+    sensor_id = f'sim{index:05d}'
+    period = 1.0 / args.rate
+    lat, lon = -23.55 + rng.random() * 0.001, -46.63 + rng.random() * 0.001
+    battery = rng.uniform(30, 100)
+    # Random phase so the fleet does not publish in lockstep
+    await asyncio.sleep(rng.random() * period)
+    next_at = loop.time()
     while True:
+        lat += rng.uniform(-1e-5, 1e-5)
+        lon += rng.uniform(-1e-5, 1e-5)
+        battery = max(0.0, battery - rng.random() * 0.01)
         payload = {
             'timestamp': time.time(),
-            'sensor_id': 'sim01',
-            'gps': {'lat': -23.55 + random.random()*0.001, 'lon': -46.63 + random.random()*0.001},
-            'battery': random.randint(30, 100),
-            'status': random.choice(['ok', 'idle', 'moving'])
+            'sensor_id': sensor_id,
+            'gps': {'lat': lat, 'lon': lon},
+            'battery': round(battery, 2),
+            'status': rng.choice(STATUSES),
         }
-        client.publish(TOPIC, json.dumps(payload))
-        print("published simulated sensor:", payload)
-        time.sleep(1)
+        if conn.connected.is_set():
+            stats.sent(conn.publish(topic, wire.encode(payload, args.format), args.qos))
+        else:
+            stats.sent(False)
+        next_at += period * (1.0 + rng.uniform(-args.jitter, args.jitter))
+        delay = next_at - loop.time()
+        if delay < 0:
+            # The loop is saturated: count it and resynchronize instead of bursting to catch up
+            stats.totals['late'] += 1
+            next_at = loop.time()
+            delay = 0
+        await asyncio.sleep(delay)
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    stats = PublisherStats()
+    conns = [LoopConnection(loop, f'mottu-sim-{os.getpid()}-{i}', stats) for i in range(args.connections)]
+    await asyncio.gather(*(c.connect(args.mqtt_host, args.mqtt_port) for c in conns))
+    print(f"Connected {len(conns)} client(s) to {args.mqtt_host}:{args.mqtt_port};"
+          f" {args.sensors} sensors at {args.rate} msg/s each on {wire.topic_for(args.topic, args.format)}")
+    sensors = [loop.create_task(run_sensor(i, conns[i % len(conns)], args, stats)) for i in range(args.sensors)]
+    started = time.time()
+    try:
+        while not args.duration or time.time() - started < args.duration:
+            await asyncio.sleep(args.report_interval)
+            print(json.dumps(stats.report()), flush=True)
+    finally:
+        for task in sensors:
+            task.cancel()
+        await asyncio.gather(*sensors, return_exceptions=True)
+        for conn in conns:
+            conn.disconnect()
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Publish simulated sensor telemetry from many sensors')
+    parser.add_argument('--sensors', type=int, default=1000, help='number of simulated sensors')
+    parser.add_argument('--rate', type=float, default=1.0, help='messages per second per sensor')
+    parser.add_argument('--jitter', type=float, default=0.1, help='relative spread of each interval (0-1)')
+    parser.add_argument('--connections', type=int, default=4, help='broker connections shared by the sensors')
+    parser.add_argument('--format', choices=[wire.JSON, wire.MSGPACK], default=WIRE_FORMAT, help='payload encoding')
+    parser.add_argument('--qos', type=int, default=0, choices=[0, 1, 2])
+    parser.add_argument('--topic', default=TOPIC)
+    parser.add_argument('--mqtt_host', default=BROKER)
+    parser.add_argument('--mqtt_port', type=int, default=PORT)
+    parser.add_argument('--report-interval', type=float, default=5.0, help='seconds between stats lines')
+    parser.add_argument('--duration', type=float, default=0, help='stop after this many seconds (0: run forever)')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
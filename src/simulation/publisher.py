@@ -0,0 +1,193 @@
+"""Publicação MQTT em lote das leituras do simulador.
+
+Todas as instâncias que apontam para o mesmo broker compartilham uma única
+conexão paho (``shared_client``), cujo loop de rede roda em thread própria:
+``publish`` só enfileira e retorna, e uma janela de mensagens em voo
+(semáforo liberado no ``on_publish``) segura o produtor quando o broker não
+acompanha — por no máximo ``timeout`` segundos; depois disso as mensagens do
+tick são descartadas e contadas, para uma conexão travada não parar a
+simulação. Numa queda de conexão a janela é zerada, pois os ``on_publish``
+das mensagens QoS 0 perdidas nunca chegam. Cada mensagem leva as leituras de até ``batch_size`` motos — o
+tópico de sensores do backend aceita uma lista de leituras por mensagem — e
+``max_rate`` limita mensagens por segundo, para usar o simulador como
+gerador de carga controlado.
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import wire
+from simulation.fleet import MESSAGE_DTYPE, messages
+
+DEFAULT_TOPIC = 'mottu/sensors'
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_INFLIGHT = 1000
+# Espera máxima por vaga na janela antes de descartar uma mensagem
+DEFAULT_PUBLISH_TIMEOUT = 5.0
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class SharedClient:
+    """Conexão paho com janela limitada de mensagens em voo."""
+
+    def __init__(self, broker: str, port: int, max_inflight: int = DEFAULT_MAX_INFLIGHT, client=None):
+        self.broker = broker
+        self.port = port
+        self.window = threading.BoundedSemaphore(max_inflight)
+        self.max_inflight = max_inflight
+        self.completed = 0
+        self.resets = 0
+        if client is None:
+            client = mqtt.Client()
+            client.max_inflight_messages_set(max_inflight)
+            client.on_publish = self._on_publish
+            client.on_disconnect = self._on_disconnect
+            client.connect(broker, port, 60)
+            client.loop_start()
+        else:
+            # Cliente já pronto (ex.: broker em processo nos testes)
+            client.on_publish = self._on_publish
+            client.on_disconnect = self._on_disconnect
+        self.client = client
+
+    def _on_publish(self, client, userdata, mid):
+        self.completed += 1
+        try:
+            self.window.release()
+        except ValueError:
+            pass  # publicação que já tinha falhado e foi reenviada depois
+
+    def _on_disconnect(self, client, userdata, rc):
+        # Mensagens QoS 0 perdidas na queda nunca confirmam: sem isso suas vagas vazariam
+        self.resets += 1
+        while True:
+            try:
+                self.window.release()
+            except ValueError:
+                break
+
+    def in_flight(self) -> int:
+        return self.max_inflight - self.window._value
+
+    def reserve(self, timeout: Optional[float] = None) -> bool:
+        """Espera uma vaga na janela (até ``timeout``); False se ela não abriu a tempo."""
+        return self.window.acquire(timeout=timeout if timeout is not None else -1)
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, timeout: Optional[float] = None) -> bool:
+        """Enfileira uma mensagem; espera vaga na janela (até ``timeout``) e retorna False se não couber ou falhar."""
+        if not self.reserve(timeout):
+            return False
+        return self.send(topic, payload, qos)
+
+    def send(self, topic: str, payload: bytes, qos: int = 0) -> bool:
+        """Enfileira uma mensagem numa vaga já reservada (liberada de volta se o envio falhar)."""
+        info = self.client.publish(topic, payload, qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.window.release()
+            return False
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Espera as mensagens em voo (até ``timeout``) e desconecta."""
+        deadline = time.monotonic() + timeout
+        while self.in_flight() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.client.loop_stop()
+        self.client.disconnect()
+        with _clients_lock:
+            if _clients.get((self.broker, self.port)) is self:
+                del _clients[(self.broker, self.port)]
+
+
+def shared_client(broker: str, port: int, max_inflight: int = DEFAULT_MAX_INFLIGHT) -> SharedClient:
+    """A conexão compartilhada com ``broker:port`` (criada na primeira chamada)."""
+    with _clients_lock:
+        client = _clients.get((broker, port))
+        if client is None:
+            client = _clients[(broker, port)] = SharedClient(broker, port, max_inflight)
+        return client
+
+
+def to_rows(columns: Dict) -> np.ndarray:
+    """Colunas de um tick (FleetState.readings) como linhas MESSAGE_DTYPE."""
+    rows = np.empty(len(columns['moto']), dtype=MESSAGE_DTYPE)
+    for name in MESSAGE_DTYPE.names:
+        rows[name] = columns[name]
+    return rows
+
+
+class SensorPublisher:
+    """Publica leituras do simulador em lotes, com QoS, limite de taxa e janela de envio."""
+
+    def __init__(self, client: SharedClient, topic: str = DEFAULT_TOPIC, qos: int = 0,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_rate: Optional[float] = None,
+                 wire_format: str = wire.JSON, timeout: float = DEFAULT_PUBLISH_TIMEOUT):
+        self.client = client
+        self.topic = wire.topic_for(topic, wire_format)
+        self.qos = qos
+        self.batch_size = max(1, batch_size)
+        self.max_rate = max_rate
+        self.wire_format = wire_format
+        self.timeout = timeout
+        self._next_send = 0.0
+        self._started = None
+        self.stats_data = {'messages': 0, 'readings': 0, 'bytes': 0, 'failed': 0, 'dropped': 0}
+
+    def _pace(self):
+        """Limitador de taxa: espaça as mensagens em 1/max_rate segundos."""
+        if not self.max_rate:
+            return
+        now = time.monotonic()
+        if self._next_send > now:
+            time.sleep(self._next_send - now)
+            now = self._next_send
+        self._next_send = now + 1.0 / self.max_rate
+
+    def publish(self, rows: np.ndarray) -> int:
+        """Publica linhas MESSAGE_DTYPE em mensagens de ``batch_size`` leituras; retorna quantas mensagens saíram."""
+        if self._started is None:
+            self._started = time.monotonic()
+        sent = 0
+        s = self.stats_data
+        starts = range(0, len(rows), self.batch_size)
+        for n, start in enumerate(starts):
+            if not self.client.reserve(self.timeout):
+                # Janela cheia além do timeout: descarta o resto do tick em vez de esperar de novo
+                dropped = len(starts) - n
+                s['dropped'] += dropped
+                print(f"⚠️ MQTT: janela de envio cheia por {self.timeout}s; {dropped} mensagem(ns) descartada(s)")
+                break
+            batch = rows[start:start + self.batch_size]
+            readings = messages(batch)
+            payload = wire.encode(readings if self.batch_size > 1 else readings[0], self.wire_format)
+            self._pace()
+            if self.client.send(self.topic, payload, self.qos):
+                sent += 1
+                s['messages'] += 1
+                s['readings'] += len(batch)
+                s['bytes'] += len(payload)
+            else:
+                s['failed'] += 1
+        return sent
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        s = self.stats_data
+        return {
+            **s,
+            'messages_per_s': round(s['messages'] / elapsed, 1) if elapsed else 0.0,
+            'readings_per_s': round(s['readings'] / elapsed, 1) if elapsed else 0.0,
+            'in_flight': self.client.in_flight(),
+            'completed': self.client.completed,
+            'window_resets': self.client.resets,
+        }
@@ -0,0 +1,55 @@
+"""Buffer circular colunar de capacidade fixa.
+
+Guarda registros num array estruturado do NumPy pré-alocado: gravar um tick
+inteiro é uma ou duas cópias de fatia, a memória nunca passa de
+``capacity`` linhas e os registros mais antigos são sobrescritos. ``total``
+conta tudo o que já foi gravado, inclusive o que saiu do buffer.
+"""
+
+import numpy as np
+
+
+class ColumnRing:
+    def __init__(self, capacity: int, dtype):
+        if capacity <= 0:
+            raise ValueError('capacity deve ser positiva')
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.head = 0   # próxima posição de escrita
+        self.size = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def extend(self, **columns):
+        """Grava ``n`` registros; cada coluna é um escalar ou um array de tamanho ``n``."""
+        n = max((np.size(v) for v in columns.values() if np.ndim(v)), default=1)
+        self.total += n
+        skip = max(0, n - self.capacity)   # só as últimas ``capacity`` linhas cabem
+        count = n - skip
+        first = min(count, self.capacity - self.head)
+        for name, values in columns.items():
+            column = self.data[name]
+            if np.ndim(values):
+                values = values[skip:]
+                column[self.head:self.head + first] = values[:first]
+                column[:count - first] = values[first:]
+            else:
+                column[self.head:self.head + first] = values
+                column[:count - first] = values
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.capacity, self.size + count)
+
+    def tail(self, limit: int = None) -> np.ndarray:
+        """Cópia dos ``limit`` registros mais recentes (todos, se None), do mais antigo ao mais novo."""
+        n = self.size if limit is None else max(0, min(limit, self.size))
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.data[start:start + n].copy()
+        return np.concatenate([self.data[start:], self.data[:self.head]])
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+        self.total = 0
@@ -0,0 +1,77 @@
+"""Snapshots imutáveis da frota para leitores concorrentes.
+
+Só a thread do simulador altera ``FleetState``. Depois de cada tick ela
+monta no buffer de trás um ``FleetSnapshot`` — cópia somente leitura das
+colunas, resumo, deltas do tick e cauda dos buffers de mensagens e logs —
+e o publica trocando uma única referência (atribuição atômica no CPython).
+Leitores (sessões do Streamlit) pegam o snapshot da frente sem lock e
+trabalham nele até o fim: nunca veem um tick pela metade e nunca seguram a
+simulação. O buffer de trás é sempre novo em vez de reciclado, para que um
+leitor lento continue com um snapshot íntegro enquanto segurar a referência.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from simulation.fleet import FleetState, FleetViews
+
+# Colunas copiadas da frota (as usadas pelas visões do dashboard)
+COLUMNS = ('status', 'model', 'zone', 'battery', 'fuel', 'x', 'y', 'odometer', 'last_maintenance')
+# Menor intervalo de parede entre publicações (no relógio 'fast' há milhares de ticks por segundo)
+MIN_INTERVAL_S = 0.05
+
+
+def _frozen(values: np.ndarray) -> np.ndarray:
+    values = values.copy()
+    values.flags.writeable = False
+    return values
+
+
+class FleetSnapshot(FleetViews):
+    """Estado da frota congelado num tick; ``version`` cresce a cada publicação."""
+
+    def __init__(self, fleet: FleetState, version: int, total_messages: int = 0,
+                 previous: Optional[Tuple[Dict, int]] = None,
+                 messages: Optional[np.ndarray] = None, logs: Optional[np.ndarray] = None):
+        self.version = version
+        self.timestamp = fleet.now
+        for name in COLUMNS:
+            setattr(self, name, _frozen(getattr(fleet, name)))
+        self.summary = fleet.summary()
+        self.total_messages = total_messages
+        # Resumo e total de mensagens no tick anterior (base dos deltas)
+        self.previous = previous or (self.summary, total_messages)
+        self.messages = _frozen(messages) if messages is not None else None
+        self.logs = _frozen(logs) if logs is not None else None
+        self._views = {}
+
+    def view(self, kind: str) -> List[Dict]:
+        """Visão por moto ('dicts' ou 'rows'), montada uma vez por snapshot."""
+        data = self._views.get(kind)
+        if data is None:
+            # Dois leitores podem montar a mesma visão ao mesmo tempo; o resultado é idêntico
+            data = self._views[kind] = self.to_dicts() if kind == 'dicts' else self.to_rows()
+        return data
+
+
+class SnapshotBuffer:
+    """Buffer duplo: o simulador monta o snapshot de trás e o troca pelo da frente."""
+
+    def __init__(self, min_interval: float = MIN_INTERVAL_S):
+        self.min_interval = min_interval
+        self.front = None
+        self.version = 0
+        self._published_at = float('-inf')
+
+    def due(self) -> bool:
+        return time.monotonic() - self._published_at >= self.min_interval
+
+    def publish(self, fleet: FleetState, **extra) -> FleetSnapshot:
+        """Publica o estado atual de ``fleet`` (só a thread do simulador chama)."""
+        back = FleetSnapshot(fleet, self.version + 1, **extra)
+        self.front = back
+        self.version = back.version
+        self._published_at = time.monotonic()
+        return back
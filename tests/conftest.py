@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The packages live under src/ and import each other as ``backend.*`` / ``simulation.*``
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Module-level default paths (database, shards, TSDB, yard snapshot) derive from this,
+# so point it away from the working tree before anything imports backend.storage
+os.environ.setdefault('MOTTU_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='mottu-tests-'), 'detections.db'))
@@ -0,0 +1,51 @@
+import json
+import time
+
+import paho.mqtt.client as mqtt
+from fastapi.testclient import TestClient
+
+from backend import api, wire
+from backend.shards import ShardSet
+from backend.telemetry import TelemetryIngest
+from backend.tsdb import TelemetryTSDB
+
+
+class StubClient:
+    def __init__(self):
+        self.topics = []
+
+    def subscribe(self, topics):
+        self.topics.extend(topic for topic, _ in topics)
+
+
+def _message(topic, payload):
+    msg = mqtt.MQTTMessage(topic=topic.encode())
+    msg.payload = json.dumps(payload).encode()
+    return msg
+
+
+def test_worker_mode_keeps_sensor_telemetry_in_the_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'MQTT_IN_API', False)
+    monkeypatch.setattr(api, 'start_mqtt_loop', lambda: None)
+    monkeypatch.setattr(api, 'shards', ShardSet(api.on_commit, shard_dir=str(tmp_path / 'shards'),
+                                                default_path=str(tmp_path / 'detections.db'), retention=False))
+    monkeypatch.setattr(api, 'telemetry', TelemetryIngest(tsdb=TelemetryTSDB(str(tmp_path / 'tsdb'))))
+
+    with TestClient(api.app) as client:
+        stub = StubClient()
+        api.on_connect(stub, None, None, 0)
+        # Detection topics belong to the ingest workers; sensor readings still come here
+        assert set(stub.topics) == {api.MQTT_SENSORS_TOPIC, api.MQTT_SENSORS_TOPIC + wire.TOPIC_SUFFIX}
+
+        now = time.time()
+        readings = [{'sensor_id': 'moto-1', 'timestamp': now - 1, 'battery': 80},
+                    {'sensor_id': 'moto-1', 'timestamp': now, 'battery': 79}]
+        api.on_message(None, None, _message(api.MQTT_SENSORS_TOPIC, readings))
+        for _ in range(100):
+            latest = client.get('/telemetry/moto-1/latest')
+            if latest.status_code == 200:
+                break
+            time.sleep(0.05)
+        assert latest.json()['battery'] == 79
+        assert client.get('/telemetry/moto-1').json()['items'][-1]['battery'] == 79
+        assert client.get('/telemetry/moto-1/series').json()['battery'] == [80, 79]
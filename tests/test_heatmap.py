@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from backend.heatmap import HeatmapCache
+from backend.storage import AsyncDetectionStore
+
+
+def _frame(timestamp, seq):
+    return {'timestamp': timestamp, 'camera': 'cam1', 'seq': seq,
+            'detections': [{'track_id': str(seq), 'centroid': [100, 100]}]}
+
+
+def test_frames_ahead_of_the_clock_are_kept_by_live_updates(tmp_path):
+    async def run():
+        store = AsyncDetectionStore(str(tmp_path / 'detections.db'))
+        cached = HeatmapCache(store)
+        now = time.time()
+        await store.insert_payloads([_frame(now - 20, 0), _frame(now - 10, 1)])
+        assert (await cached.get(now, 3600))['total'] == 2
+
+        # A camera clock half a second ahead of the server's
+        live = [_frame(time.time() + 0.5, 2)]
+        acks, _ = await store.insert_payloads(live)
+        cached.apply_batch(live, acks)
+
+        later = time.time() + 1
+        fresh = await HeatmapCache(store).get(later, 3600)
+        assert (await cached.get(later, 3600))['total'] == fresh['total'] == 3
+        await store.write_engine.dispose()
+        await store.read_engine.dispose()
+
+    asyncio.run(run())
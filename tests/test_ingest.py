@@ -0,0 +1,53 @@
+import asyncio
+
+from backend.ingest import BatchWriter
+from backend.shards import ShardSet
+
+
+def test_bad_item_only_fails_itself():
+    batches = []
+
+    async def write_batch(payloads):
+        batches.append(list(payloads))
+        if 'bad' in payloads:
+            raise ValueError('cannot store bad')
+        return [p.upper() for p in payloads]
+
+    async def run():
+        # A generous linger so all three land in the same first batch
+        writer = BatchWriter(write_batch, max_delay=0.05)
+        writer.start()
+        results = await asyncio.gather(*(writer.write(p) for p in ('a', 'bad', 'c')), return_exceptions=True)
+        await writer.stop()
+        return results, writer.stats()
+
+    results, stats = asyncio.run(run())
+    assert batches[0] == ['a', 'bad', 'c']
+    assert results[0] == 'A' and results[2] == 'C'
+    assert isinstance(results[1], ValueError)
+    assert stats['persisted'] == 2 and stats['errors'] == 1
+
+
+def test_replayed_key_is_answered_without_a_write(tmp_path):
+    frame = {'timestamp': 1700000000.0, 'camera': 'cam1', 'branch': None, 'seq': 1, 'idempotency_key': 'edge-1:1',
+             'detections': [{'track_id': '1', 'centroid': [10, 20]}]}
+
+    async def run():
+        shards = ShardSet(lambda *args: None, shard_dir=str(tmp_path / 'shards'),
+                          default_path=str(tmp_path / 'detections.db'), retention=False)
+        shards.start()
+        shard = shards.get(None)
+        first = await shard.write(dict(frame))
+        replay = await shard.write(dict(frame))
+        queued = shard.submit(dict(frame))
+        writer_stats = shard.writer.stats()
+        frames = await shard.store.read(lambda conn: conn.exec_driver_sql('SELECT COUNT(*) FROM frames').scalar())
+        await shards.stop()
+        return first, replay, queued, shard.recent.stats(), writer_stats, frames
+
+    first, replay, queued, recent, writer_stats, frames = asyncio.run(run())
+    assert first[1] and replay == (first[0], False)
+    assert not queued
+    assert recent['hits'] == 2
+    # Only the first copy reached the writer
+    assert writer_stats['received'] == 1 and frames == 1
@@ -0,0 +1,118 @@
+import json
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from backend import wire
+from simulation import publisher
+from simulation.fleet import FleetState
+from simulation.publisher import SensorPublisher, SharedClient, to_rows
+
+
+class StubClient:
+    """Stands in for paho: records publishes and acknowledges them at once (or fails every ``fail_every``-th).
+
+    With ``ack=False`` nothing is ever acknowledged, like QoS 0 messages lost in a reconnect.
+    """
+
+    def __init__(self, fail_every=0, ack=True):
+        self.fail_every = fail_every
+        self.ack = ack
+        self.on_publish = None
+        self.on_disconnect = None
+        self.sent = []
+        self.calls = 0
+
+    def publish(self, topic, payload, qos=0):
+        self.calls += 1
+        info = mqtt.MQTTMessageInfo(self.calls)
+        if self.fail_every and self.calls % self.fail_every == 0:
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+            return info
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        self.sent.append((topic, payload, qos))
+        if self.ack:
+            self.on_publish(self, None, info.mid)
+        return info
+
+
+def _rows(n):
+    fleet = FleetState(n, np.random.default_rng(1), now=1700000000.0)
+    return to_rows(fleet.readings(1700000000.0))
+
+
+def test_batches_carry_batch_size_readings():
+    stub = StubClient()
+    pub = SensorPublisher(SharedClient('stub', 0, client=stub), topic='mottu/sensors', qos=1, batch_size=10)
+
+    assert pub.publish(_rows(25)) == 3
+    payloads = [json.loads(payload) for _, payload, _ in stub.sent]
+    assert [len(p) for p in payloads] == [10, 10, 5]
+    assert payloads[0][0]['moto_id'] == 'MOTTU_001' and 'sensor_data' in payloads[0][0]
+    assert {(topic, qos) for topic, _, qos in stub.sent} == {('mottu/sensors', 1)}
+    assert pub.stats()['messages'] == 3 and pub.stats()['readings'] == 25
+
+
+def test_batch_size_one_sends_single_readings():
+    stub = StubClient()
+    pub = SensorPublisher(SharedClient('stub', 0, client=stub), batch_size=1, wire_format=wire.MSGPACK)
+
+    assert pub.publish(_rows(4)) == 4
+    decoded = [wire.decode(payload, topic=topic) for topic, payload, _ in stub.sent]
+    assert all(isinstance(d, dict) for d in decoded)
+    assert [d['moto_id'] for d in decoded] == ['MOTTU_001', 'MOTTU_002', 'MOTTU_003', 'MOTTU_004']
+    assert {topic for topic, _, _ in stub.sent} == {wire.topic_for('mottu/sensors', wire.MSGPACK)}
+
+
+def test_failed_publishes_are_counted_and_release_the_window():
+    stub = StubClient(fail_every=2)
+    client = SharedClient('stub', 0, max_inflight=2, client=stub)
+    pub = SensorPublisher(client, batch_size=1)
+
+    # With a window of 2, a leaked slot per failure would block well before 10 messages
+    assert pub.publish(_rows(10)) == 5
+    stats = pub.stats()
+    assert stats['failed'] == 5 and stats['messages'] == 5
+    assert stats['in_flight'] == 0 and stats['completed'] == 5
+
+
+def test_max_rate_spaces_messages(monkeypatch):
+    sleeps = []
+    clock = [1000.0]
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(publisher.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(publisher.time, 'sleep', fake_sleep)
+    pub = SensorPublisher(SharedClient('stub', 0, client=StubClient()), batch_size=1, max_rate=50)
+
+    assert pub.publish(_rows(5)) == 5
+    assert len(sleeps) == 4
+    assert np.allclose(sleeps, 1 / 50)
+
+
+def test_full_window_drops_the_rest_of_the_tick_after_the_timeout():
+    stub = StubClient(ack=False)
+    pub = SensorPublisher(SharedClient('stub', 0, max_inflight=2, client=stub), batch_size=1, timeout=0.05)
+
+    started = time.monotonic()
+    assert pub.publish(_rows(5)) == 2
+    # One bounded wait for the whole tick, not one per message
+    assert time.monotonic() - started < 1.0
+    stats = pub.stats()
+    assert stats['messages'] == 2 and stats['dropped'] == 3 and stats['in_flight'] == 2
+
+
+def test_disconnect_frees_slots_that_will_never_be_acknowledged():
+    stub = StubClient(ack=False)
+    client = SharedClient('stub', 0, max_inflight=2, client=stub)
+    pub = SensorPublisher(client, batch_size=1, timeout=0.05)
+    assert pub.publish(_rows(2)) == 2 and client.in_flight() == 2
+
+    stub.on_disconnect(stub, None, mqtt.MQTT_ERR_CONN_LOST)
+    assert client.in_flight() == 0
+    assert pub.publish(_rows(2)) == 2
+    assert pub.stats()['dropped'] == 0 and pub.stats()['window_resets'] == 1
@@ -0,0 +1,38 @@
+import asyncio
+
+from backend.partitions import DAY_SECONDS, day_of, list_partitions
+from backend.retention import RetentionJob
+from backend.storage import AsyncDetectionStore, query_rollups
+
+
+def _frame(timestamp, key):
+    return {'timestamp': timestamp, 'camera': 'cam1', 'idempotency_key': key,
+            'detections': [{'track_id': key, 'centroid': [10, 20], 'zone': 'A', 'confidence': 0.5}]}
+
+
+def test_retention_drops_only_expired_days_and_their_rollups(tmp_path):
+    now = 20000 * DAY_SECONDS + 12 * 3600
+    stamps = {'old': now - 10 * DAY_SECONDS, 'edge': now - 8 * DAY_SECONDS, 'recent': now - DAY_SECONDS}
+
+    async def run():
+        store = AsyncDetectionStore(str(tmp_path / 'detections.db'))
+        await store.insert_payloads([_frame(ts, key) for key, ts in stamps.items()])
+        job = RetentionJob(store, raw_days=7, minute_days=7)
+        await job.run_once(now=now)
+        days = await store.read(list_partitions)
+        minutes = await store.query_rollups(granularity='minute')
+        hours = await store.read(query_rollups, granularity='hour')
+        keys = await store.read(lambda conn: conn.exec_driver_sql('SELECT idempotency_key FROM frame_keys').all())
+        # A second run finds nothing left to expire
+        await job.run_once(now=now)
+        stats = job.stats()
+        await store.close()
+        return days, minutes, hours, keys, stats
+
+    days, minutes, hours, keys, stats = asyncio.run(run())
+    assert days == [day_of(stamps['recent'])]
+    assert [r['bucket'] for r in minutes] == [int(stamps['recent'] // 60) * 60]
+    # Hour rollups outlive the raw rows
+    assert len(hours) == 3
+    assert keys == [('recent',)]
+    assert stats['partitions_dropped'] == 2 and stats['runs'] == 2
@@ -0,0 +1,46 @@
+from backend.partitions import DAY_SECONDS
+from backend.storage import DetectionStore
+
+
+def _frame(timestamp, seq, detections=1):
+    return {'timestamp': timestamp, 'camera': 'cam1', 'seq': seq,
+            'detections': [{'track_id': f'{seq}-{n}', 'centroid': [10, 20], 'zone': 'A'}
+                           for n in range(detections)]}
+
+
+def _pages(store, **filters):
+    rows, cursor = store.query_detections(**filters)
+    pages = [rows]
+    while cursor is not None:
+        rows, cursor = store.query_detections(cursor=cursor, **filters)
+        pages.append(rows)
+    return [row for page in pages for row in page]
+
+
+def test_pages_keep_rows_at_a_day_boundary(tmp_path):
+    store = DetectionStore(str(tmp_path / 'detections.db'))
+    midnight = 20000 * DAY_SECONDS
+    # Several detections stamped exactly at UTC midnight, the first instant of their day
+    # partition, so a page can end in the middle of them
+    store.insert_payloads([_frame(midnight - 10, 0, 2), _frame(midnight, 1, 5), _frame(midnight + 10, 2, 2)])
+    expected = sorted(store.query_detections(limit=100)[0], key=lambda r: (r['timestamp'], r['id']))
+    assert len(expected) == 9
+
+    for limit in range(1, 9):
+        assert _pages(store, limit=limit) == expected
+        assert _pages(store, limit=limit, descending=True) == expected[::-1]
+    store.close()
+
+
+def test_replayed_key_with_a_new_timestamp_is_stored_once(tmp_path):
+    store = DetectionStore(str(tmp_path / 'detections.db'))
+    midnight = 20000 * DAY_SECONDS
+    first = dict(_frame(midnight - 1, 0), idempotency_key='edge-7:42')
+    # The retry crosses midnight, so it routes to the next day's partition
+    retry = dict(_frame(midnight + 5, 0), idempotency_key='edge-7:42')
+
+    [(frame_id, created)], _ = store.insert_payloads([first])
+    assert created
+    assert store.insert_payloads([retry])[0] == [(frame_id, False)]
+    assert store.count_frames() == 1
+    store.close()
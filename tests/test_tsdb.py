@@ -0,0 +1,32 @@
+import numpy as np
+
+from backend.tsdb import decode_chunk, encode_chunk
+
+NAN = np.nan
+
+
+def test_chunk_roundtrip_keeps_gaps_and_absent_columns():
+    ts = np.array([1700000000.0, 1700000001.0, 1700000002.5, 1700000010.0, 1700000010.25])
+    columns = {
+        'battery': np.array([NAN, 81.25, NAN, 80.5, NAN]),
+        'speed': np.array([12.0, 13.5, 13.5, NAN, 0.0]),
+        'lat': np.array([-23.5505199, -23.5505201, -23.5505300, -23.5505300, -23.5506]),
+        'fuel': np.full(5, NAN),
+    }
+
+    out_ts, out = decode_chunk(encode_chunk(ts, columns))
+    np.testing.assert_array_equal(out_ts, ts)
+    for metric in ('battery', 'speed', 'lat'):
+        np.testing.assert_allclose(out[metric], columns[metric], rtol=0, atol=1e-7)
+        assert np.array_equal(np.isnan(out[metric]), np.isnan(columns[metric]))
+    # All-NaN and missing columns are stored as absent
+    assert 'fuel' not in out and 'engine_temp' not in out and 'lon' not in out
+
+
+def test_chunk_decode_reads_only_requested_metrics():
+    ts = np.array([10.0])
+    columns = {'battery': np.array([50.0]), 'speed': np.array([NAN])}
+
+    out_ts, out = decode_chunk(encode_chunk(ts, columns), metrics=['battery'])
+    assert out_ts.tolist() == [10.0]
+    assert list(out) == ['battery'] and out['battery'].tolist() == [50.0]
@@ -0,0 +1,52 @@
+import pytest
+
+from backend import wire
+
+msgpack = pytest.importorskip('msgpack')
+
+
+def _roundtrip(payload):
+    return wire.decode(wire.encode(payload, wire.MSGPACK), topic=wire.topic_for('mottu/detections', wire.MSGPACK))
+
+
+def test_frame_without_id_or_zone_roundtrips_unchanged():
+    frame = {'timestamp': 1700000000.25, 'camera': 'cam1', 'seq': 7, 'detections': [
+        {'bbox': [10, 20, 110, 220], 'centroid': [60, 120], 'class': 'motorcycle', 'confidence': 0.9125},
+        {'bbox': [300, 40, 380, 200], 'centroid': [340, 120], 'class': 'motorcycle', 'confidence': 0.5},
+    ]}
+    decoded = _roundtrip(frame)
+    assert decoded == frame
+    assert all('id' not in d and 'zone' not in d for d in decoded['detections'])
+
+
+def test_detector_frame_roundtrips_unchanged():
+    frame = {'timestamp': 1700000000.5, 'camera': 'cam1', 'seq': 8, 'detections': [
+        {'id': 3, 'bbox': [10, 20, 110, 220], 'centroid': [60, 120], 'class': None, 'confidence': None},
+        {'id': 4, 'bbox': [1, 2, 3, 4], 'centroid': [2, 3], 'class': 'person', 'confidence': 0.75},
+    ]}
+    assert _roundtrip(frame) == frame
+
+
+def test_detections_with_different_fields_roundtrip_unchanged():
+    frame = {'timestamp': 1700000001.0, 'detections': [
+        {'id': 1, 'bbox': [0, 0, 10, 10], 'zone': 'A'},
+        {'bbox': [5, 5, 15, 15]},
+    ]}
+    assert _roundtrip(frame) == frame
+
+
+def test_frame_batch_and_empty_frame_roundtrip_unchanged():
+    frames = [{'timestamp': 1.0, 'detections': []},
+              {'timestamp': 2.0, 'detections': [{'id': 9, 'bbox': [1, 2, 3, 4]}]}]
+    assert _roundtrip(frames) == frames
+
+
+@pytest.mark.parametrize('packed', [
+    {'_v': 1},
+    {'_v': 1, 'n': 2, 'box': ['i', b'\x01\x00']},
+    {'_v': 1, 'n': 1, 'box': ['i', b'\x00' * 16], 'cf': b'\x01'},
+    {'_v': 1, 'n': 'x', 'box': 5},
+])
+def test_malformed_packed_frame_is_a_value_error(packed):
+    with pytest.raises(ValueError, match='malformed packed frame'):
+        wire.decode(msgpack.packb(packed, use_bin_type=True), content_type='application/x-msgpack')